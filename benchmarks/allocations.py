@@ -0,0 +1,123 @@
+""" Measures the memory used by each physics object, and the memory allocated
+during each call to `Body.move_and_slide`, using tracemalloc. No window is
+created, so this can run on a machine without a display.
+
+Each measurement has a budget in bytes, see `BUDGETS`. If any is exceeded
+(e.g. the physics objects lose their slots, or `move_and_slide` starts
+allocating more vectors) the script exits with an error.
+
+Run from the project root with:
+
+    python -m benchmarks.allocations
+
+NOTE: This needs Python 3.9 or newer, for `tracemalloc.reset_peak`.
+
+Functions:
+
+    measure_object_size
+    measure_move_and_slide
+    run
+    check
+"""
+
+import pyglet
+# Don't create a hidden window (and GL context) on import
+pyglet.options["shadow_window"] = False
+
+from src.aabb import AABB  # noqa: E402
+from src.body import Body  # noqa: E402
+from src.object2d import Object2D  # noqa: E402
+from src.space import Space  # noqa: E402
+from src.tiles import merge_tiles  # noqa: E402
+
+from pyglet.math import Vec2  # noqa: E402
+
+import tracemalloc  # noqa: E402
+from typing import Callable, Dict, List  # noqa: E402
+
+# The most bytes each measurement may take, with some room for differences
+# between Python versions. An instance dictionary alone is over 100 bytes.
+BUDGETS = {
+    "object2d_bytes": 112,
+    "aabb_bytes": 144,
+    "body_bytes": 160,
+    "move_and_slide_peak_bytes": 1024,
+}
+
+
+def measure_object_size(
+    create: Callable[[], object],
+    count: int = 10000
+) -> float:
+    """ Gets the average number of bytes used by each object returned by
+    `create`, including its instance dictionary (if it has one).
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [create() for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # Don't count the list holding the objects
+    del objects
+    return (after - before) / count - 8
+
+
+def measure_move_and_slide(calls: int = 1000) -> float:
+    """ Gets the average peak number of bytes allocated during a single
+    `Body.move_and_slide` call, for a body sliding along a wall.
+    """
+    space = Space()
+    # A floor to slide along, with a wall at the end
+    floor = {(x, 0) for x in range(32)}
+    wall = {(31, y) for y in range(8)}
+    space.load_static(merge_tiles(floor | wall, 16))
+
+    body = Body(8, 16, 12, 8)
+    space.add(body)
+    velocity = Vec2(1.5, -1)
+
+    # Warm up, so any caches are already filled
+    for _ in range(10):
+        body.move_and_slide(space, velocity)
+    body.position = Vec2(8, 16)
+
+    tracemalloc.start()
+    total = 0
+    for _ in range(calls):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        body.move_and_slide(space, velocity)
+        total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+
+    return total / calls
+
+
+def run() -> Dict[str, float]:
+    """ Runs every measurement, returning the results in bytes. """
+    return {
+        "object2d_bytes": measure_object_size(lambda: Object2D(1, 2)),
+        "aabb_bytes": measure_object_size(lambda: AABB(1, 2, 3, 4)),
+        "body_bytes": measure_object_size(lambda: Body(1, 2, 3, 4)),
+        "move_and_slide_peak_bytes": measure_move_and_slide(),
+    }
+
+
+def check(results: Dict[str, float]) -> List[str]:
+    """ Gets a description of each measurement over its budget. """
+    return [
+        f"{name}: {results[name]:.1f} bytes is over the budget of {budget}"
+        for name, budget in BUDGETS.items()
+        if results[name] > budget
+    ]
+
+
+if __name__ == "__main__":
+    results = run()
+    for name, value in results.items():
+        print(f"{name}: {value:.1f} (budget {BUDGETS[name]})")
+
+    failures = check(results)
+    if failures:
+        raise SystemExit("\n".join(failures))
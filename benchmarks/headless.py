@@ -0,0 +1,78 @@
+""" Measures how many ticks per second a headless game can run, with the
+player following a scripted route around the test room. No window or GL
+context is created, so this can run on a machine without a display.
+
+The same script is run twice, and the player must end up in the same place
+both times, as a basic check that headless games are deterministic.
+
+Run from the project root with:
+
+    python -m benchmarks.headless
+
+Functions:
+
+    create_script
+    run
+"""
+
+import pyglet
+# Don't create a hidden window (and GL context) on import
+pyglet.options["shadow_window"] = False
+
+from src.game_manager import GameManager  # noqa: E402
+from src.scripted_input import ScriptedInput  # noqa: E402
+
+from pyglet.window import key  # noqa: E402
+
+import argparse  # noqa: E402
+from time import perf_counter  # noqa: E402
+from typing import Dict  # noqa: E402
+
+
+def create_script(ticks: int) -> ScriptedInput:
+    """ Creates a script walking the player in a square (into the test
+    room's wall and back), dashing at the start of each side.
+    """
+    script = ScriptedInput()
+    side = 90  # Ticks spent walking along each side
+    directions = (key.D, key.W, key.A, key.S)
+    for start in range(0, ticks, side):
+        direction = directions[start // side % len(directions)]
+        script.hold(start, start + side, direction)
+        # Dash a few ticks in, once the player is moving
+        script.press(start + 2, key.SPACE).release(start + 3, key.SPACE)
+    return script
+
+
+def run(ticks: int = 10000) -> Dict[str, float]:
+    """ Runs the script in a new headless game, returning the ticks per
+    second and the player's final position.
+    """
+    game = GameManager()
+    script = create_script(ticks)
+
+    start = perf_counter()
+    script.run(game, ticks)
+    elapsed = perf_counter() - start
+
+    return {
+        "ticks_per_sec": ticks / elapsed,
+        "x": game.player.x,
+        "y": game.player.y,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--ticks", type=int, default=10000,
+        help="number of ticks to run"
+    )
+    options = parser.parse_args()
+
+    first = run(options.ticks)
+    second = run(options.ticks)
+    print(f"ticks_per_sec: {first['ticks_per_sec']:.0f}")
+    print(f"final position: ({first['x']}, {first['y']})")
+    if (first["x"], first["y"]) != (second["x"], second["y"]):
+        raise SystemExit("Two runs of the same script gave different results")
@@ -0,0 +1,194 @@
+""" Connects hundreds of simulated clients to a server on localhost, each
+sending a tick of random input every timestep and acknowledging the
+snapshots it receives. The players are spread over a large area, so each
+client is only sent the players near it (see `InterestManager`). Then it
+reports the server's metrics and what the clients received. No window or GL
+context is created.
+
+By default the server is run in this process (sharing its event loop, and
+so its CPU, with the clients). Pass `--port` to test a server started
+separately with `python server.py` instead, whose metrics it prints itself.
+
+Run from the project root with:
+
+    python -m benchmarks.load_test
+
+Classes:
+
+    SimulatedClient
+
+Functions:
+
+    run
+"""
+
+import pyglet
+# Don't create a hidden window (and GL context) on import
+pyglet.options["shadow_window"] = False
+
+from src import network  # noqa: E402
+from src.server import Server  # noqa: E402
+from src.snapshot import NO_BASELINE, SnapshotReceiver  # noqa: E402
+
+from pyglet.window import key  # noqa: E402
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import random  # noqa: E402
+from time import perf_counter  # noqa: E402
+from typing import Dict, List, Optional, Tuple  # noqa: E402
+
+# The directions a simulated client can hold
+DIRECTIONS = ((), (key.W,), (key.A,), (key.S,), (key.D,), (key.W, key.D))
+
+
+class SimulatedClient(asyncio.DatagramProtocol):
+    """ A client sending random input, which wanders in a new direction
+    (and dashes) every so often.
+    """
+
+    transport: Optional[asyncio.DatagramTransport] = None
+
+    def __init__(self, address: Tuple[str, int], seed: int):
+        """ Initialise a client of the server at the given address. """
+        self.address = address
+        self.rng = random.Random(seed)
+        self.receiver = SnapshotReceiver()
+        self.entity_id: Optional[int] = None
+        self.sequence = 0
+        self.held: Dict[int, bool] = {}
+        self.bytes_in = 0
+        self.snapshots = 0
+
+    def connection_made(self, transport: asyncio.BaseTransport):
+        """ Called once the socket is open. """
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, address: Tuple[str, int]):
+        """ Called for every datagram received. """
+        self.bytes_in += len(data)
+        message_type = network.get_message_type(data)
+        if message_type == network.WELCOME:
+            self.entity_id, _ = network.decode_welcome(data)
+        elif message_type == network.UPDATE:
+            _, snapshot = network.decode_update(data)
+            if self.receiver.receive(snapshot) is not None:
+                self.snapshots += 1
+
+    def error_received(self, error: Exception):
+        """ Called when a send or receive fails, the next one may not. """
+
+    def send_input(self):
+        """ Sends the next tick of input. """
+        pressed = []
+        if self.rng.random() < 0.02:
+            self.held = {
+                symbol: True for symbol in self.rng.choice(DIRECTIONS)
+            }
+            pressed.append(key.SPACE)
+        latest = self.receiver.latest
+        self.transport.sendto(network.encode_input(
+            self.sequence, self.held, pressed,
+            latest.tick if latest is not None else NO_BASELINE
+        ), self.address)
+        self.sequence += 1
+
+
+async def run(
+    clients: int = 200,
+    seconds: float = 10.0,
+    host: str = "127.0.0.1",
+    port: Optional[int] = None,
+    spread: float = 4000.0
+) -> Dict[str, float]:
+    """ Runs the load test, returning the server's metrics (if it was run in
+    this process) and the clients' averages.
+    """
+    loop = asyncio.get_running_loop()
+
+    server: Optional[Server] = None
+    tasks: List[asyncio.Future] = []
+    server_transport = None
+    if port is None:
+        server = Server(spawn_spread=spread)
+        server_transport, _ = await loop.create_datagram_endpoint(
+            lambda: server, local_addr=(host, 0)
+        )
+        port = server_transport.get_extra_info("sockname")[1]
+        tasks.append(asyncio.ensure_future(server.run()))
+
+    simulated: List[SimulatedClient] = []
+    for i in range(clients):
+        _, client = await loop.create_datagram_endpoint(
+            lambda i=i: SimulatedClient((host, port), i),
+            local_addr=(host, 0)
+        )
+        simulated.append(client)
+
+    # Send every client's input once per timestep
+    timestep = Server.TIMESTEP
+    end = loop.time() + seconds
+    next_send = loop.time()
+    # Only measure the server once every client is connecting
+    if server is not None:
+        server.metrics.reset(perf_counter())
+    try:
+        while loop.time() < end:
+            for client in simulated:
+                client.send_input()
+            next_send += timestep
+            await asyncio.sleep(max(0.0, next_send - loop.time()))
+    finally:
+        for task in tasks:
+            task.cancel()
+        for client in simulated:
+            client.transport.close()
+        if server_transport is not None:
+            server_transport.close()
+
+    result: Dict[str, float] = {}
+    if server is not None:
+        result.update(server.metrics.report(len(server.clients)))
+    result["client_snapshots_per_sec"] = (
+        sum(client.snapshots for client in simulated) / clients / seconds
+    )
+    result["client_kbytes_in_per_sec"] = (
+        sum(client.bytes_in for client in simulated) / clients / seconds
+        / 1000
+    )
+    result["clients_welcomed"] = sum(
+        client.entity_id is not None for client in simulated
+    )
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--clients", type=int, default=200,
+        help="number of simulated clients"
+    )
+    parser.add_argument(
+        "--seconds", type=float, default=10.0,
+        help="how long to run for"
+    )
+    parser.add_argument(
+        "--host", default="127.0.0.1",
+        help="address of the server"
+    )
+    parser.add_argument(
+        "--port", type=int,
+        help="port of a server to test, instead of running one"
+    )
+    parser.add_argument(
+        "--spread", type=float, default=4000.0,
+        help="width of the square the players spawn in, in pixels"
+    )
+    options = parser.parse_args()
+
+    result = asyncio.run(run(
+        options.clients, options.seconds, options.host, options.port,
+        options.spread
+    ))
+    for name, value in result.items():
+        print(f"{name}: {value:.2f}")
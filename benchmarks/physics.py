@@ -0,0 +1,414 @@
+""" A headless micro-benchmark suite for the collision pipeline. No window or
+GL context is created, so this can run on a machine without a display.
+
+Each benchmark is run against a set of scenes, which vary the number of
+static boxes, the number of bodies, how densely the boxes are packed and how
+fast the bodies move. The work is split into ticks (one call per body, like a
+fixed update), and each result records the operations per second plus the
+percentiles of the time taken per tick.
+
+Run from the project root with:
+
+    python -m benchmarks.physics
+
+The results are written as JSON (to `bench_output.json` by default) and
+compared against `benchmarks/baseline.json`, printing how much each result
+has changed. After a change has been judged, store the new numbers with
+`--save-baseline`. Timings depend on the machine, so only compare results
+measured on the same one.
+
+Classes:
+
+    Scene
+
+Functions:
+
+    build_scene
+    get_velocities
+    time_ticks
+    bench_is_colliding_aabb
+    bench_get_broad_phase
+    bench_get_collision_data
+    bench_get_nearest_collision
+    bench_move_and_slide
+    run
+    compare
+    main
+"""
+
+import pyglet
+# Don't create a hidden window (and GL context) on import
+pyglet.options["shadow_window"] = False
+
+from src.aabb import AABB  # noqa: E402
+from src.body import Body  # noqa: E402
+from src.space import Space  # noqa: E402
+
+from pyglet.math import Vec2  # noqa: E402
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import platform  # noqa: E402
+import random  # noqa: E402
+from math import sqrt  # noqa: E402
+from pathlib import Path  # noqa: E402
+from time import perf_counter_ns  # noqa: E402
+from typing import (  # noqa: E402
+    Callable, Dict, List, NamedTuple, Optional, Tuple
+)
+
+# Where the stored baseline lives, next to this file
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+# Changes smaller than this fraction are treated as noise when comparing
+DEFAULT_TOLERANCE = 0.1
+
+# The size of the static boxes and the bodies, in pixels (the same as the
+# tiles and player in the game)
+BOX_SIZE = 30
+BODY_SIZE = 12
+
+# The distance moved per tick by each velocity distribution, in pixels.
+# `Player.SPEED` is 80 pixels per second, so it moves about 1.3 pixels per
+# fixed update, and its dash is roughly 4 times faster.
+SPEEDS = {
+    "still": 0.0,
+    "walk": 1.3,
+    "dash": 5.3,
+    "fast": 40.0,
+}
+
+
+class Scene(NamedTuple):
+    """ The parameters of a benchmark scene. """
+
+    name: str
+    # Number of static boxes
+    boxes: int
+    # Number of dynamic bodies
+    bodies: int
+    # Fraction of the room's area covered by static boxes
+    density: float
+    # One of `SPEEDS`, or "mixed" for a random choice per body
+    velocity: str
+
+
+SCENES = [
+    Scene("sparse_walk", boxes=100, bodies=20, density=0.05, velocity="walk"),
+    Scene("dense_walk", boxes=400, bodies=20, density=0.3, velocity="walk"),
+    Scene("dense_dash", boxes=400, bodies=20, density=0.3, velocity="dash"),
+    Scene("crowd", boxes=400, bodies=200, density=0.1, velocity="mixed"),
+    Scene("fast", boxes=400, bodies=20, density=0.3, velocity="fast"),
+]
+
+
+def build_scene(
+    scene: Scene,
+    seed: int = 0
+) -> Tuple[Space, List[Body], random.Random]:
+    """ Creates the space and bodies for a scene. Static boxes and bodies are
+    placed at random, using the seed so every run gets the same scene. Bodies
+    start clear of any static box.
+
+    Returns:
+
+        Tuple of the space, its bodies, and the random number generator
+        (for picking velocities).
+
+        Tuple[Space, List[Body], random.Random]
+    """
+    rng = random.Random(seed)
+
+    # Pick the room size so the boxes cover roughly `density` of it
+    size = sqrt(scene.boxes * BOX_SIZE ** 2 / scene.density)
+
+    space = Space()
+    space.load_static(
+        AABB(
+            rng.uniform(0, size - BOX_SIZE), rng.uniform(0, size - BOX_SIZE),
+            BOX_SIZE, BOX_SIZE
+        )
+        for _ in range(scene.boxes)
+    )
+
+    bodies: List[Body] = []
+    while len(bodies) < scene.bodies:
+        body = Body(
+            rng.uniform(0, size - BODY_SIZE), rng.uniform(0, size - BODY_SIZE),
+            BODY_SIZE, BODY_SIZE
+        )
+        if not any(
+            body.is_colliding_aabb(other) for other in space.query(body)
+        ):
+            space.add(body)
+            bodies.append(body)
+
+    return space, bodies, rng
+
+
+def get_velocities(
+    scene: Scene,
+    count: int,
+    rng: random.Random
+) -> List[Vec2]:
+    """ Picks a velocity (distance per tick) in a random direction for each
+    body, at the speed of the scene's velocity distribution.
+    """
+    velocities = []
+    for _ in range(count):
+        if scene.velocity == "mixed":
+            speed = SPEEDS[rng.choice(list(SPEEDS))]
+        else:
+            speed = SPEEDS[scene.velocity]
+        direction = Vec2(rng.uniform(-1, 1), rng.uniform(-1, 1))
+        velocities.append(direction.normalize().scale(speed))
+    return velocities
+
+
+def time_ticks(
+    tick: Callable[[], int],
+    ticks: int,
+    warmup: int = 50
+) -> Dict[str, float]:
+    """ Times each call to `tick`, which returns the number of operations it
+    did.
+
+    The operations per second are worked out from the median tick, rather
+    than the total time, so a few slow ticks (e.g. from garbage collection)
+    do not swing the result.
+
+    Returns:
+
+        Dictionary of the operations per second, and the mean and
+        percentiles of the time per tick in microseconds.
+
+        Dict[str, float]
+    """
+    for _ in range(warmup):
+        tick()
+
+    times: List[int] = []
+    operations = 0
+    for _ in range(ticks):
+        start = perf_counter_ns()
+        operations += tick()
+        times.append(perf_counter_ns() - start)
+
+    times.sort()
+    total = sum(times)
+
+    def percentile(fraction: float) -> float:
+        """ Gets a percentile of the tick times, in microseconds. """
+        index = min(len(times) - 1, round(fraction * (len(times) - 1)))
+        return times[index] / 1000
+
+    median = percentile(0.5)
+    return {
+        "ops_per_sec": operations / ticks / (median / 1e6) if median else 0.0,
+        "mean_us": total / len(times) / 1000,
+        "p50_us": percentile(0.5),
+        "p90_us": percentile(0.9),
+        "p99_us": percentile(0.99),
+        "max_us": times[-1] / 1000,
+    }
+
+
+# Each benchmark builds its scene, then returns a function doing one tick.
+# NOTE: Scenes are rebuilt for every benchmark, so one benchmark moving the
+#       bodies cannot change the results of another.
+
+def bench_is_colliding_aabb(scene: Scene) -> Callable[[], int]:
+    """ Tests every body against every box near it. """
+    space, bodies, _ = build_scene(scene)
+    pairs = [(body, other) for body in bodies for other in space.query(body)]
+
+    def tick() -> int:
+        for body, other in pairs:
+            body.is_colliding_aabb(other)
+        return len(pairs)
+    return tick
+
+
+def bench_get_broad_phase(scene: Scene) -> Callable[[], int]:
+    """ Gets the broad-phase box of every body. """
+    space, bodies, rng = build_scene(scene)
+    velocities = get_velocities(scene, len(bodies), rng)
+    moves = list(zip(bodies, velocities))
+
+    def tick() -> int:
+        for body, velocity in moves:
+            body.get_broad_phase(velocity)
+        return len(moves)
+    return tick
+
+
+def bench_get_collision_data(scene: Scene) -> Callable[[], int]:
+    """ Runs the swept collision test between every body and every box in
+    its broad-phase.
+    """
+    space, bodies, rng = build_scene(scene)
+    velocities = get_velocities(scene, len(bodies), rng)
+    tests = []
+    for body, velocity in zip(bodies, velocities):
+        x, y, w, h = body.get_broad_phase_rect(velocity.x, velocity.y)
+        for other in space.query_rect(x, y, w, h):
+            if other is not body:
+                tests.append((body, other, velocity))
+
+    def tick() -> int:
+        for body, other, velocity in tests:
+            body.get_collision_data(other, velocity)
+        return len(tests)
+    return tick
+
+
+def bench_get_nearest_collision(scene: Scene) -> Callable[[], int]:
+    """ Finds the nearest collision of every body. """
+    space, bodies, rng = build_scene(scene)
+    velocities = get_velocities(scene, len(bodies), rng)
+    moves = list(zip(bodies, velocities))
+
+    def tick() -> int:
+        for body, velocity in moves:
+            body.get_nearest_collision(space, velocity)
+        return len(moves)
+    return tick
+
+
+def bench_move_and_slide(scene: Scene) -> Callable[[], int]:
+    """ Moves and slides every body, like a fixed update. Each body picks a
+    new direction now and then, so bodies do not stay pressed into walls.
+    """
+    space, bodies, rng = build_scene(scene)
+    velocities = get_velocities(scene, len(bodies), rng)
+
+    def tick() -> int:
+        for i, body in enumerate(bodies):
+            if rng.random() < 0.05:
+                velocities[i] = get_velocities(scene, 1, rng)[0]
+            body.move_and_slide(space, velocities[i])
+        return len(bodies)
+    return tick
+
+
+BENCHMARKS: Dict[str, Callable[[Scene], Callable[[], int]]] = {
+    "is_colliding_aabb": bench_is_colliding_aabb,
+    "get_broad_phase": bench_get_broad_phase,
+    "get_collision_data": bench_get_collision_data,
+    "get_nearest_collision": bench_get_nearest_collision,
+    "move_and_slide": bench_move_and_slide,
+}
+
+
+def run(
+    ticks: int = 200,
+    scenes: List[Scene] = SCENES,
+    pattern: str = "",
+    rounds: int = 3
+) -> Dict[str, Dict[str, float]]:
+    """ Runs every benchmark against every scene, returning the results
+    keyed by "benchmark/scene". Only names containing `pattern` are run.
+
+    The whole suite is run several times, keeping the fastest round of each
+    benchmark. Anything else running on the machine can only slow a round
+    down, so the fastest round is the closest to the true speed.
+    """
+    results: Dict[str, Dict[str, float]] = {}
+    for _ in range(rounds):
+        for name, benchmark in BENCHMARKS.items():
+            for scene in scenes:
+                key = f"{name}/{scene.name}"
+                if pattern not in key:
+                    continue
+                result = time_ticks(benchmark(scene), ticks)
+                best = results.get(key)
+                if best is None or result["ops_per_sec"] > best["ops_per_sec"]:
+                    results[key] = result
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float = DEFAULT_TOLERANCE
+) -> List[str]:
+    """ Compares the operations per second of each result against the
+    baseline, returning a line for each. Changes larger than the tolerance
+    are marked as faster or slower.
+    """
+    lines = []
+    for key, result in results.items():
+        if key not in baseline:
+            lines.append(f"{key}: not in baseline")
+            continue
+
+        old = baseline[key]["ops_per_sec"]
+        new = result["ops_per_sec"]
+        change = new / old - 1 if old else 0.0
+        if change > tolerance:
+            verdict = "faster"
+        elif change < -tolerance:
+            verdict = "SLOWER"
+        else:
+            verdict = "same"
+        lines.append(f"{key}: {change:+.1%} ({verdict})")
+    return lines
+
+
+def main(args: Optional[List[str]] = None):
+    """ Runs the suite from the command line. """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--ticks", type=int, default=200,
+        help="ticks to time per benchmark"
+    )
+    parser.add_argument(
+        "--rounds", type=int, default=3,
+        help="times to run the suite, keeping the fastest round"
+    )
+    parser.add_argument(
+        "--filter", default="",
+        help="only run benchmarks whose name contains this"
+    )
+    parser.add_argument(
+        "--output", type=Path, default=Path("bench_output.json"),
+        help="where to write the results"
+    )
+    parser.add_argument(
+        "--baseline", type=Path, default=BASELINE_PATH,
+        help="the results to compare against"
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true",
+        help="store the results as the new baseline"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=DEFAULT_TOLERANCE,
+        help="ignore changes smaller than this fraction"
+    )
+    options = parser.parse_args(args)
+
+    results = run(
+        options.ticks, pattern=options.filter, rounds=options.rounds
+    )
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "ticks": options.ticks,
+        "rounds": options.rounds,
+        "results": results,
+    }
+
+    options.output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"Wrote {len(results)} results to {options.output}")
+
+    if options.save_baseline:
+        options.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Saved the baseline to {options.baseline}")
+    elif options.baseline.exists():
+        baseline = json.loads(options.baseline.read_text())["results"]
+        for line in compare(results, baseline, options.tolerance):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
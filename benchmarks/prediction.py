@@ -0,0 +1,244 @@
+""" Runs a client predicting its player's movement against a server, over a
+simulated network with latency, jitter and loss, and measures how often the
+prediction has to be corrected and what reconciling costs. Both run in this
+process, tick by tick, so no window, GL context or socket is created.
+
+Prints how many updates corrected the player, how many ticks each correction
+replayed (against how many replaying on every update would), and how long
+predicting and reconciling took.
+
+Run from the project root with:
+
+    python -m benchmarks.prediction
+
+Classes:
+
+    SimulatedLink
+
+Functions:
+
+    run
+"""
+
+import pyglet
+# Don't create a hidden window (and GL context) on import
+pyglet.options["shadow_window"] = False
+
+from src import network  # noqa: E402
+from src.game_manager import GameManager  # noqa: E402
+from src.player import Player  # noqa: E402
+from src.prediction import Predictor  # noqa: E402
+from src.server import Address, Server  # noqa: E402
+from src.snapshot import NO_BASELINE, SnapshotReceiver  # noqa: E402
+
+from pyglet.math import Vec2  # noqa: E402
+from pyglet.window import key  # noqa: E402
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import heapq  # noqa: E402
+import random  # noqa: E402
+from time import perf_counter  # noqa: E402
+from typing import Dict, List, Optional, Tuple  # noqa: E402
+
+# The client's address, as the server sees it
+CLIENT: Address = ("127.0.0.1", 1)
+
+# The directions the client can hold
+DIRECTIONS = ((), (key.W,), (key.A,), (key.S,), (key.D,), (key.W, key.D))
+
+
+class SimulatedLink:
+    """ One direction of a simulated network, also standing in for the
+    server's transport. Datagrams arrive a number of ticks after they are
+    sent (so can arrive out of order), or not at all.
+    """
+
+    def __init__(
+        self,
+        latency: int,
+        jitter: int,
+        loss: float,
+        rng: random.Random
+    ):
+        """ Initialise with the delay in ticks, the most extra ticks any
+        datagram is delayed by, and the fraction of datagrams dropped.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.rng = rng
+        self.tick = 0
+        # Datagrams on their way: (arrival tick, order sent, data)
+        self.queue: List[Tuple[int, int, bytes]] = []
+        self.sent = 0
+
+    def sendto(self, data: bytes, address: Optional[Address] = None):
+        """ Sends a datagram, which may be lost. """
+        self.sent += 1
+        if self.rng.random() < self.loss:
+            return
+        delay = self.latency + self.rng.randint(0, self.jitter)
+        heapq.heappush(self.queue, (self.tick + delay, self.sent, data))
+
+    def advance(self) -> List[bytes]:
+        """ Moves on to the next tick, returning the datagrams arriving. """
+        self.tick += 1
+        arrived = []
+        while self.queue and self.queue[0][0] <= self.tick:
+            arrived.append(heapq.heappop(self.queue)[2])
+        return arrived
+
+
+async def run(
+    ticks: int = 3600,
+    latency: float = 50.0,
+    jitter: float = 10.0,
+    loss: float = 0.05,
+    resend: int = network.MAX_EARLIER_INPUTS,
+    seed: int = 0
+) -> Dict[str, float]:
+    """ Runs the client and server for a number of ticks, with the given
+    one-way latency and jitter (in milliseconds) and fraction of datagrams
+    lost in each direction. Each input message resends up to `resend`
+    earlier inputs. Returns the number of updates and corrections,
+    the ticks replayed, and the time spent predicting and reconciling.
+    """
+    rng = random.Random(seed)
+    timestep = Server.TIMESTEP
+    latency_ticks = round(latency / 1000 / timestep)
+    jitter_ticks = round(jitter / 1000 / timestep)
+    upstream = SimulatedLink(latency_ticks, jitter_ticks, loss, rng)
+    downstream = SimulatedLink(latency_ticks, jitter_ticks, loss, rng)
+
+    server = Server()
+    server.connection_made(downstream)
+
+    # The client's game holds the same room as the server's, and only the
+    # predicted player
+    client_game = GameManager(local_player=False)
+    keys = key.KeyStateHandler()
+    predictor = Predictor(
+        Player(Vec2(0, 0), client_game.space, keys), keys, timestep
+    )
+    receiver = SnapshotReceiver()
+    entity_id: Optional[int] = None
+
+    held: Dict[int, bool] = {}
+    predict_time = reconcile_time = 0.0
+    correction_times: List[float] = []
+    updates = pending = 0
+    for _ in range(ticks):
+        # The client reads its input and moves straight away...
+        pressed = []
+        if rng.random() < 0.02:
+            held = {symbol: True for symbol in rng.choice(DIRECTIONS)}
+            pressed.append(key.SPACE)
+        start = perf_counter()
+        sequence = predictor.predict(held, pressed)
+        predict_time += perf_counter() - start
+        latest = receiver.latest
+        upstream.sendto(network.encode_input(
+            sequence, held, pressed,
+            latest.tick if latest is not None else NO_BASELINE,
+            predictor.get_earlier_inputs(resend)
+        ))
+
+        # ...while the server runs a tick on whatever input has arrived...
+        for data in upstream.advance():
+            server.datagram_received(data, CLIENT)
+        server.tick(timestep)
+
+        # ...and the client checks the updates that have arrived
+        for data in downstream.advance():
+            message_type = network.get_message_type(data)
+            if message_type == network.WELCOME:
+                entity_id, _ = network.decode_welcome(data)
+                continue
+            if message_type != network.UPDATE:
+                continue
+            last_sequence, snapshot_data = network.decode_update(data)
+            snapshot = receiver.receive(snapshot_data)
+            if snapshot is None or entity_id is None:
+                continue
+
+            start = perf_counter()
+            corrected = predictor.reconcile(
+                last_sequence, snapshot.entities[entity_id]
+            )
+            elapsed = perf_counter() - start
+            reconcile_time += elapsed
+            if corrected:
+                correction_times.append(elapsed)
+            updates += 1
+            # Replaying on every update would run every tick not simulated
+            pending += len(predictor.history)
+
+    if not loss and not jitter_ticks and predictor.corrections:
+        raise SystemExit(
+            f"{predictor.corrections} predictions were wrong without any"
+            " loss or jitter, the client and server have diverged"
+        )
+
+    correction_times.sort()
+    corrections = predictor.corrections
+    return {
+        "updates": updates,
+        "corrections": corrections,
+        "correction_percent": corrections / max(updates, 1) * 100,
+        "replayed_per_correction": predictor.replayed / max(corrections, 1),
+        "pending_per_update": pending / max(updates, 1),
+        "predict_us": predict_time / ticks * 1e6,
+        "reconcile_us": reconcile_time / max(updates, 1) * 1e6,
+        "correction_mean_us": (
+            sum(correction_times) / max(corrections, 1) * 1e6
+        ),
+        "correction_max_us": (
+            correction_times[-1] * 1e6 if correction_times else 0.0
+        ),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--ticks", type=int, default=3600,
+        help="number of ticks to run"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=50.0,
+        help="one-way latency, in milliseconds"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=10.0,
+        help="most extra latency of any datagram, in milliseconds"
+    )
+    parser.add_argument(
+        "--loss", type=float, default=0.05,
+        help="fraction of datagrams to drop, in each direction"
+    )
+    parser.add_argument(
+        "--resend", type=int, default=network.MAX_EARLIER_INPUTS,
+        help="most earlier inputs to resend with each input"
+    )
+    options = parser.parse_args()
+
+    result = asyncio.run(run(
+        options.ticks, options.latency, options.jitter, options.loss,
+        options.resend
+    ))
+    print(
+        f"corrections: {result['corrections']:.0f}/{result['updates']:.0f}"
+        f" updates ({result['correction_percent']:.1f}%)"
+    )
+    print(
+        f"replayed: {result['replayed_per_correction']:.1f} ticks/correction"
+        f" (replaying every update: {result['pending_per_update']:.1f}"
+        " ticks/update)"
+    )
+    print(f"predict: {result['predict_us']:.0f} us/tick")
+    print(f"reconcile: {result['reconcile_us']:.0f} us/update")
+    print(
+        f"correction: {result['correction_mean_us']:.0f} us mean,"
+        f" {result['correction_max_us']:.0f} us max"
+    )
@@ -0,0 +1,67 @@
+""" Plays a recorded replay back into a headless game as fast as possible,
+reporting the ticks per second and checking the game's state is
+bit-identical to the recording. No window or GL context is created.
+
+Record a replay by playing the game with:
+
+    python main.py --record my_replay.bin
+
+then, from the project root, play it back with:
+
+    python -m benchmarks.replay my_replay.bin
+
+The exit status is non-zero if the playback differed from the recording, so
+this can be used to check a change does not alter the physics.
+
+Functions:
+
+    run
+"""
+
+import pyglet
+# Don't create a hidden window (and GL context) on import
+pyglet.options["shadow_window"] = False
+
+from src.game_manager import GameManager  # noqa: E402
+from src.replay import Replay  # noqa: E402
+
+import argparse  # noqa: E402
+from time import perf_counter  # noqa: E402
+from typing import Dict, Optional  # noqa: E402
+
+
+def run(replay: Replay, verify: bool = True) -> Dict[str, Optional[float]]:
+    """ Plays the replay into a new headless game, returning the ticks per
+    second and the first tick that differed from the recording (if any).
+    """
+    game = GameManager()
+
+    start = perf_counter()
+    mismatch = replay.play(game, verify)
+    elapsed = perf_counter() - start
+
+    return {
+        "ticks_per_sec": game.tick / elapsed if elapsed else 0.0,
+        "mismatch": mismatch,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("path", help="the replay file to play")
+    parser.add_argument(
+        "--no-verify", action="store_true",
+        help="don't check the game against the recorded digests"
+    )
+    options = parser.parse_args()
+
+    replay = Replay.load(options.path)
+    result = run(replay, not options.no_verify)
+    print(f"ticks: {replay.length}")
+    print(f"ticks_per_sec: {result['ticks_per_sec']:.0f}")
+    if result["mismatch"] is not None:
+        raise SystemExit(
+            f"Playback differed from the recording by tick "
+            f"{result['mismatch']}"
+        )
+    print("Playback matched the recording")
@@ -0,0 +1,153 @@
+""" Sends delta-encoded snapshots of a crowd of wandering entities over a
+loopback UDP socket, and checks every snapshot the client decodes matches
+the one the server sent. Some datagrams can be dropped on purpose, to check
+the client recovers. No window or GL context is created.
+
+Prints the average size of each snapshot, sent in full and delta-encoded,
+and how long encoding and decoding took.
+
+Run from the project root with:
+
+    python -m benchmarks.snapshot
+
+Functions:
+
+    simulate
+    run
+"""
+
+import pyglet
+# Don't create a hidden window (and GL context) on import
+pyglet.options["shadow_window"] = False
+
+from src.snapshot import (  # noqa: E402
+    decode_ack, encode_ack, EntityState, Snapshot, SnapshotReceiver,
+    SnapshotSender
+)
+
+import argparse  # noqa: E402
+import random  # noqa: E402
+import socket  # noqa: E402
+from time import perf_counter  # noqa: E402
+from typing import Dict, Iterator, List  # noqa: E402
+
+# The largest datagram we expect to receive
+MAX_DATAGRAM = 65507
+
+
+def simulate(
+    entities: int,
+    ticks: int,
+    seed: int = 0
+) -> Iterator[Snapshot]:
+    """ Yields a snapshot of each tick of a crowd of entities, each walking
+    in a random direction (or standing still) for a while before changing.
+    """
+    rng = random.Random(seed)
+    states: List[EntityState] = [
+        EntityState(i, rng.randrange(2000), rng.randrange(2000), 0, 0, 1)
+        for i in range(entities)
+    ]
+    for tick in range(ticks):
+        for i, entity in enumerate(states):
+            vx, vy = entity.vx, entity.vy
+            # Change direction now and then, standing still half the time
+            if rng.random() < 0.02:
+                if rng.random() < 0.5:
+                    vx = vy = 0
+                else:
+                    vx, vy = rng.choice(((1, 0), (-1, 0), (0, 1), (0, -1)))
+            states[i] = EntityState(
+                entity.id,
+                entity.x + vx, entity.y + vy,
+                vx, vy,
+                1 if vx == vy == 0 else 2
+            )
+        yield Snapshot.from_entities(tick, states)
+
+
+def run(
+    entities: int = 200,
+    ticks: int = 600,
+    loss: float = 0.0,
+    seed: int = 0
+) -> Dict[str, float]:
+    """ Sends every tick's snapshot from a server socket to a client socket
+    on localhost, dropping a fraction of them (and of the client's
+    acknowledgements) before sending. Returns the average bytes per snapshot
+    (full and as sent), and the time spent encoding and decoding.
+    """
+    rng = random.Random(seed)
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+    client.bind(("127.0.0.1", 0))
+    server.settimeout(1)
+    client.settimeout(1)
+
+    sender = SnapshotSender()
+    receiver = SnapshotReceiver()
+    full_bytes = sent_bytes = 0
+    encode_time = decode_time = 0.0
+    decoded = 0
+    try:
+        for snapshot in simulate(entities, ticks, seed):
+            full_bytes += len(snapshot.encode())
+
+            start = perf_counter()
+            data = sender.encode(snapshot)
+            encode_time += perf_counter() - start
+            sent_bytes += len(data)
+            if rng.random() < loss:
+                continue
+            server.sendto(data, client.getsockname())
+
+            data, address = client.recvfrom(MAX_DATAGRAM)
+            start = perf_counter()
+            received = receiver.receive(data)
+            decode_time += perf_counter() - start
+            if received is None:
+                continue
+            if received != snapshot:
+                raise SystemExit(f"Snapshot {snapshot.tick} was corrupted")
+            decoded += 1
+
+            if rng.random() < loss:
+                continue
+            client.sendto(encode_ack(received.tick), address)
+            sender.acknowledge(decode_ack(server.recv(MAX_DATAGRAM)))
+    finally:
+        server.close()
+        client.close()
+
+    return {
+        "full_bytes_per_snapshot": full_bytes / ticks,
+        "sent_bytes_per_snapshot": sent_bytes / ticks,
+        "decoded": decoded,
+        "encode_us": encode_time / ticks * 1e6,
+        "decode_us": decode_time / max(decoded, 1) * 1e6,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--entities", type=int, default=200,
+        help="number of entities in each snapshot"
+    )
+    parser.add_argument(
+        "--ticks", type=int, default=600,
+        help="number of snapshots to send"
+    )
+    parser.add_argument(
+        "--loss", type=float, default=0.0,
+        help="fraction of datagrams to drop"
+    )
+    options = parser.parse_args()
+
+    result = run(options.entities, options.ticks, options.loss)
+    print(f"full: {result['full_bytes_per_snapshot']:.0f} bytes/snapshot")
+    print(f"sent: {result['sent_bytes_per_snapshot']:.0f} bytes/snapshot")
+    print(f"decoded: {result['decoded']}/{options.ticks} snapshots")
+    print(f"encode: {result['encode_us']:.0f} us/snapshot")
+    print(f"decode: {result['decode_us']:.0f} us/snapshot")
@@ -0,0 +1,117 @@
+""" Measures how long it takes to import the game, using Python's
+`-X importtime` option, in fresh interpreters so nothing is already
+imported. Also checks that importing loads no resources, as those are
+loaded on first use (see `src.resources`).
+
+By default the hidden window pyglet creates on import is disabled, as a
+headless server would, so this can run on a machine without a display.
+
+Run from the project root with:
+
+    python -m benchmarks.startup
+
+Functions:
+
+    measure_import
+    run
+"""
+
+import argparse
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Prints how many resources were loaded by the import, after it
+CHECK_RESOURCES = (
+    "from src import resources; print(len(resources.get_loaded()))"
+)
+
+
+def measure_import(
+    module: str,
+    shadow_window: bool = False
+) -> Tuple[Dict[str, int], int]:
+    """ Imports a module in a fresh interpreter, returning the cumulative
+    import time (in microseconds) of every module it imported, and how many
+    resources were loaded by the import.
+    """
+    code = "import pyglet; "
+    if not shadow_window:
+        code += "pyglet.options['shadow_window'] = False; "
+    code += f"import {module}; {CHECK_RESOURCES}"
+
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=True,
+    )
+
+    # Each line is "import time: self [us] | cumulative | imported package"
+    times: Dict[str, int] = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # The header
+        times[name.strip()] = int(cumulative)
+    return times, int(process.stdout.split()[-1])
+
+
+def run(
+    module: str = "src.application",
+    rounds: int = 5,
+    shadow_window: bool = False
+) -> Tuple[Dict[str, int], int]:
+    """ Imports the module several times, keeping the fastest time for each
+    module imported (other programs can only slow an import down). Returns
+    the times, and how many resources the imports loaded.
+    """
+    best: Dict[str, int] = {}
+    loaded = 0
+    for _ in range(rounds):
+        times, count = measure_import(module, shadow_window)
+        loaded = max(loaded, count)
+        for name, time in times.items():
+            if name not in best or time < best[name]:
+                best[name] = time
+    return best, loaded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--module", default="src.application",
+        help="module to import"
+    )
+    parser.add_argument(
+        "--rounds", type=int, default=5,
+        help="number of times to import, keeping the fastest"
+    )
+    parser.add_argument(
+        "--top", type=int, default=10,
+        help="number of the slowest game modules to list"
+    )
+    parser.add_argument(
+        "--shadow-window", action="store_true",
+        help="let pyglet create its hidden window, as the game does"
+    )
+    options = parser.parse_args()
+
+    times, loaded = run(options.module, options.rounds, options.shadow_window)
+    print(f"import {options.module}: {times[options.module] / 1000:.1f} ms")
+    if "pyglet" in times:
+        print(f"  of which pyglet: {times['pyglet'] / 1000:.1f} ms")
+
+    game_modules: List[Tuple[str, int]] = sorted(
+        (
+            (name, time) for name, time in times.items()
+            if name.startswith("src.")
+        ),
+        key=lambda item: -item[1]
+    )
+    for name, time in game_modules[:options.top]:
+        print(f"  {name}: {time / 1000:.1f} ms")
+
+    print(f"resources loaded by import: {loaded}")
+    if loaded:
+        raise SystemExit("Importing the game should not load any resources")
@@ -3,7 +3,21 @@ immediately if this file has been run directly.
 """
 from src.application import run
 
+import argparse
+
 # If running this file directly...
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--record", metavar="PATH",
+        help="record the game's input to a replay file"
+    )
+    parser.add_argument(
+        "--native-resolution", action="store_true",
+        help="draw the world at its native resolution and scale it up to "
+             "the window (toggle in game with F5)"
+    )
+    options = parser.parse_args()
+
     # ...launch the app!
-    run()
+    run(options.record, options.native_resolution)
@@ -0,0 +1,41 @@
+""" Dedicated server for the game, runs the game with no window and serves it
+to clients over UDP.
+"""
+import pyglet
+# Don't create a hidden window (and GL context) on import
+pyglet.options["shadow_window"] = False
+
+from src.server import serve, Server  # noqa: E402
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+
+# If running this file directly...
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--host", default="0.0.0.0",
+        help="address to listen on"
+    )
+    parser.add_argument(
+        "--port", type=int, default=7777,
+        help="UDP port to listen on"
+    )
+    parser.add_argument(
+        "--metrics-interval", type=float, default=5.0, metavar="SECONDS",
+        help="how often to print metrics, 0 to never print them"
+    )
+    parser.add_argument(
+        "--spawn-spread", type=float, default=0.0, metavar="PIXELS",
+        help="spread players over a square this wide, for load tests"
+    )
+    options = parser.parse_args()
+
+    # ...start serving!
+    try:
+        asyncio.run(serve(
+            options.host, options.port, options.metrics_interval,
+            Server(spawn_spread=options.spawn_spread)
+        ))
+    except KeyboardInterrupt:
+        pass
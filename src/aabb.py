@@ -14,8 +14,6 @@ from __future__ import annotations  # NOTE: This is necessary below Python 3.10
 # Import the previously defined `Object2D` class from the `object2d.py` file.
 from .object2d import Object2D
 
-# We perform some graphics handling here, so we need to import `pyglet` itself
-import pyglet
 # Use the `Vec2` class from pyglet's `math` module
 from pyglet.math import Vec2
 
@@ -32,8 +30,8 @@ class AABB(Object2D):
     # this in order to make it clear that it is a bitmask.
     DEFAULT_LAYER = 1 << 0
 
-    # The pyglet rect debug renderer, None until a debug rect is created
-    debug_rect: Optional[pyglet.shapes.Rectangle] = None
+    # See `Object2D`
+    __slots__ = ("w", "h", "layer")
 
     def __init__(
         self,
@@ -84,6 +82,22 @@ class AABB(Object2D):
             and self.global_y + self.h > other.global_y
         )
 
+    def is_colliding_rect(
+        self,
+        x: float, y: float, w: float, h: float
+    ) -> bool:
+        """ Check if this bounding box intersects with a rect in global space.
+        Does the same as `is_colliding_aabb`, without needing an `AABB`.
+        """
+        global_x = self.global_x
+        global_y = self.global_y
+        return (
+            global_x < x + w
+            and global_x + self.w > x
+            and global_y < y + h
+            and global_y + self.h > y
+        )
+
     def is_colliding_point(self, point: Vec2) -> bool:
         """ Check if this bounding box contains the given point. """
         return (
@@ -112,35 +126,20 @@ class AABB(Object2D):
             layer=self.layer
         )
 
-    def create_debug_rect(
+    def get_broad_phase_rect(
         self,
-        colour: Tuple[int, int, int] = (255, 255, 255),
-        batch: Optional[pyglet.graphics.Batch] = None,
-        group: Optional[pyglet.graphics.Group] = None
-    ):
-        """ Initialise a pyglet debug rect renderer. """
-        self.debug_rect = pyglet.shapes.Rectangle(
-            x=self.global_x,
-            y=self.global_y,
-            width=self.w,
-            height=self.h,
-            color=colour,
-            batch=batch,
-            group=group
+        vx: float,
+        vy: float
+    ) -> Tuple[float, float, float, float]:
+        """ Gets the broad phase for the bounding box as a rect in global
+        space: (x, y, width, height). This is used in the physics hot path, as
+        it does not need to create a new `AABB` like `get_broad_phase`.
+        """
+        global_x = self.global_x
+        global_y = self.global_y
+        return (
+            min(global_x, global_x + vx),
+            min(global_y, global_y + vy),
+            self.w + abs(vx),
+            self.h + abs(vy),
         )
-
-    def update_debug_rect(self):
-        """ Update the debug rect renderer. """
-        # NOTE: By calling _update_position manually we only need to update
-        #       vertex coordinates once.
-        self.debug_rect._x, self.debug_rect._y = self.global_position
-        self.debug_rect._width, self.debug_rect._height = self.extends
-        self.debug_rect._update_position()
-
-    # This is necessary to perform some basic cleanup when the AABB is removed
-    # from memory. If the debug rect is not None, we need to make sure we run
-    # `delete` to remove it from the graphics batch and make it "disappear".
-    def __del__(self):
-        """ Delete our renderer if it exists. """
-        if self.debug_rect is not None:
-            self.debug_rect.delete()
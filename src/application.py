@@ -12,14 +12,26 @@ Functions:
 
 from __future__ import annotations  # NOTE: This is necessary below Python 3.10
 
+from . import atlas, resources
+from .body import Body
+from .camera import Camera
 from .game_manager import GameManager  # Import our Game Manager class
+from .profiler import Profiler, ProfilerOverlay
+from .render_target import RenderTarget
+from .replay import Replay
+from .sprite_manager import ZSpriteManager
+from .zsprite import ZSprite, ZSpriteGroup
 
 import pyglet
 from pyglet import gl
 from pyglet.window import key
 from pyglet.math import Vec2
 
+import warnings
 from enum import auto, Enum
+from math import ceil
+from time import strftime
+from typing import Optional, Tuple
 
 
 class DeepProjection(pyglet.window.Projection):
@@ -45,6 +57,19 @@ class Application:
     # Set default size to a 720p window
     DEFAULT_WINDOW_SIZE = Vec2(1280, 720)
 
+    # Profiler hotkeys: toggle the overlay, and start/stop a trace
+    PROFILER_KEY = key.F3
+    TRACE_KEY = key.F4
+    # Toggles drawing the world at its native resolution, see `RenderTarget`
+    RENDER_MODE_KEY = key.F5
+    # Toggles drawing the physics space, see `DebugDraw`
+    DEBUG_DRAW_KEY = key.F6
+    # The profiler stage counting sprite GL state changes
+    STATE_STAGE = "Sprite state changes"
+    # Seconds per frame spent loading resources in the background while a
+    # menu is shown, so they are ready before the game starts
+    PRELOAD_BUDGET = 1/240
+
     # State machine
     class State(Enum):
         MAIN_MENU = auto()
@@ -63,24 +88,49 @@ class Application:
     game_manager: GameManager
     # settings_menu: SettingsMenu (unimplemented)
 
-    def __init__(self):
+    # The profiler, and its overlay (only created once first shown)
+    profiler: Profiler
+    profiler_overlay: Optional[ProfilerOverlay] = None
+    # The framebuffer the world is drawn into before being scaled up to the
+    # window, None when drawing straight to the window
+    render_target: Optional[RenderTarget] = None
+
+    def __init__(
+        self,
+        record_path: Optional[str] = None,
+        native_resolution: bool = False
+    ):
         """ Initialise the application: set up our window and graphics batch,
-        and schedule any methods.
+        and schedule any methods. If a record path is given, the game's input
+        is recorded and saved there as a `Replay` when the app closes.
+
+        With `native_resolution`, the world is drawn at the camera's
+        `VIEW_RESOLUTION` and then scaled up to fill the window, rather than
+        being drawn at the window's resolution.
         """
 
         # Create our window
         self.window = pyglet.window.Window(
             caption="Player Movement!",
             resizable=True,
-            vsync=False,
+            # Frames are interpolated between fixed updates, so we can wait
+            # for the display rather than drawing as fast as possible
+            vsync=True,
             width=self.DEFAULT_WINDOW_SIZE.x,
             height=self.DEFAULT_WINDOW_SIZE.y,
         )
         self.window.projection = DeepProjection()
 
+        # Pack (or load the cached) sprite atlas now the GL context exists,
+        # so the first entities created don't stall the first frame
+        atlas.get_atlas()
+
         # Push event handlers
         self.window.on_draw = self.on_draw
         self.window.on_key_press = self.on_key_press
+        # NOTE: This is pushed before the game manager's handlers, so it is
+        #       called after them and can override the size they are given.
+        self.window.push_handlers(on_resize=self.on_resize)
 
         # Register KeyStateHandler
         self.keys = key.KeyStateHandler()
@@ -90,16 +140,66 @@ class Application:
         # single draw-call per frame.
         self.batch = pyglet.graphics.Batch()
 
+        # Set up the profiler with the hot paths we want to time. Nothing is
+        # timed until it is enabled.
+        self.profiler = Profiler()
+        self.profiler.add_target(Application, "on_update")
+        self.profiler.add_target(GameManager, "on_fixed_update")
+        self.profiler.add_target(Body, "move_and_slide")
+        self.profiler.add_target(ZSprite, "_update_position")
+        self.profiler.add_target(ZSpriteManager, "flush")
+        self.profiler.add_target(pyglet.graphics.Batch, "draw")
+        # Each sprite group sets its GL state once per draw: sprites sharing
+        # a group (and so an atlas) save a state change each
+        self.profiler.add_target(ZSpriteGroup, "set_state", self.STATE_STAGE)
+        self.profiler.add_counter("Sprites drawn", self.count_sprites)
+        self.profiler.add_counter("Boxes in view", self.count_boxes_in_view)
+        self.profiler.add_counter(
+            "State changes saved",
+            lambda: max(
+                self.count_sprites()
+                - self.profiler.get_last_calls(self.STATE_STAGE),
+                0
+            )
+        )
+
+        if native_resolution:
+            self.set_native_resolution(True)
+
         # Set the application state
         self.current_state = Application.State.DEFAULT
 
+        # Start recording from the game's very first tick
+        self.record_path = record_path
+        if record_path is not None:
+            self.game_manager.recorder = Replay(
+                GameManager.FIXED_UPDATE_TIMESTEP
+            )
+
         # Schedule our update methods
         pyglet.clock.schedule(self.on_update)
 
     def on_draw(self):
         """ Called when the window needs to redraw. """
-        self.window.clear()  # Clear the screen
-        self.batch.draw()    # Draw the batch
+        if self.render_target is None:
+            self.window.clear()  # Clear the screen
+            self.batch.draw()    # Draw the batch
+        else:
+            # Draw the batch into the framebuffer...
+            self.render_target.bind(self.window.projection)
+            self.window.clear()
+            self.batch.draw()
+            self.render_target.unbind(self.window)
+            # ...then scale it up to fill the window
+            self.window.clear()
+            self.render_target.blit(*self.window.get_framebuffer_size(),
+                                    self.get_render_scale())
+
+        if self.profiler.enabled:
+            self.profiler.end_frame()
+            if self.profiler_overlay is not None:
+                self.profiler_overlay.update(self.window.height)
+                self.profiler_overlay.draw()
 
     def on_key_press(self, symbol: int, modifiers: int):
         """ Called every time the user presses a key on the keyboard. """
@@ -108,20 +208,174 @@ class Application:
             # Set window's fullscreen to the opposite of the current value
             self.window.set_fullscreen(not self.window.fullscreen)
 
+        # Profiler hotkeys
+        if symbol == self.PROFILER_KEY:
+            self.toggle_profiler()
+        elif symbol == self.TRACE_KEY:
+            self.toggle_trace()
+
+        if symbol == self.RENDER_MODE_KEY:
+            self.set_native_resolution(self.render_target is None)
+        elif (
+            symbol == self.DEBUG_DRAW_KEY
+            and self.current_state == Application.State.IN_GAME
+        ):
+            self.game_manager.debug_draw.toggle()
+
         # Send the event to the game manager
         if self.current_state == Application.State.IN_GAME:
             self.game_manager.on_key_press(symbol, modifiers)
 
+    def on_resize(self, width: int, height: int):
+        """ Called every time the window is resized. """
+        self.update_render_size()
+
     def on_update(self, dt: float):
         """ Called every frame, dt is the time passed since the last frame. """
         # Send the event to the game manager
         if self.current_state == Application.State.IN_GAME:
             self.game_manager.on_update(dt)
+        elif self.current_state is not None and resources.get_pending():
+            # Nothing much happens in menus, so load resources meanwhile
+            resources.preload(self.PRELOAD_BUDGET)
+
+    def get_render_scale(self) -> float:
+        """ Gets the scale from the world's native resolution to the
+        window's framebuffer, fitting `VIEW_RESOLUTION` inside it.
+        """
+        width, height = self.window.get_framebuffer_size()
+        return min(
+            width / Camera.VIEW_RESOLUTION.x,
+            height / Camera.VIEW_RESOLUTION.y
+        )
+
+    def get_render_size(self) -> Tuple[int, int]:
+        """ Gets the size to draw the world at natively: `VIEW_RESOLUTION`,
+        grown along one axis to match the window's aspect ratio. The camera
+        sees exactly as much of the world as it would drawing to the window.
+        """
+        width, height = self.window.get_framebuffer_size()
+        scale = self.get_render_scale()
+        if scale <= 0:
+            return 1, 1
+        return (
+            max(int(Camera.VIEW_RESOLUTION.x), ceil(width / scale)),
+            max(int(Camera.VIEW_RESOLUTION.y), ceil(height / scale)),
+        )
+
+    def update_render_size(self):
+        """ Resizes the framebuffer to match the window, and tells the game
+        the size it is drawn at. If the framebuffer can not be resized, the
+        world is drawn straight to the window instead.
+        """
+        if self.render_target is not None:
+            try:
+                self.render_target.resize(*self.get_render_size())
+            except gl.GLException as error:
+                self.fall_back_to_window(error)
+        if self.render_target is not None:
+            size = self.render_target.size
+        else:
+            size = self.window.get_size()
+        if self.current_state == Application.State.IN_GAME:
+            self.game_manager.on_resize(*size)
+
+    def set_native_resolution(self, enabled: bool):
+        """ Switches between drawing the world into a framebuffer at its
+        native resolution (if the driver supports it), and drawing it
+        straight to the window.
+        """
+        if enabled and self.render_target is None:
+            try:
+                self.render_target = RenderTarget(*self.get_render_size())
+            except gl.GLException as error:
+                self.fall_back_to_window(error)
+        elif not enabled and self.render_target is not None:
+            self.render_target.delete()
+            self.render_target = None
+        self.update_render_size()
+
+    def fall_back_to_window(self, error: gl.GLException):
+        """ Warns that the framebuffer failed, and draws the world straight
+        to the window from now on.
+        """
+        warnings.warn(
+            f"Drawing at the window's resolution: {error}", RuntimeWarning
+        )
+        if self.render_target is not None:
+            self.render_target.delete()
+            self.render_target = None
+
+    def count_sprites(self) -> int:
+        """ Counts the game's sprites, 0 when not in game. """
+        if self.current_state != Application.State.IN_GAME:
+            return 0
+        return len(self.game_manager.sprites.sprites)
+
+    def count_boxes_in_view(self) -> int:
+        """ Counts the boxes drawn in the camera's view, both culled and
+        filled in by the debug draw, 0 when not in game.
+        """
+        if self.current_state != Application.State.IN_GAME:
+            return 0
+        game_manager = self.game_manager
+        return (
+            game_manager.culler.shown_count
+            + game_manager.debug_draw.fill_count
+        )
+
+    def set_profiling(self, enabled: bool):
+        """ Enables or disables the profiler. """
+        # Bound methods taken before patching would skip the profiler's
+        # timers (or keep them after disabling), so take them again.
+        pyglet.clock.unschedule(self.on_update)
+        if enabled:
+            self.profiler.enable()
+        else:
+            self.profiler.disable()
+        pyglet.clock.schedule(self.on_update)
+        # The batch keeps bound group methods too, so rebuild its draw list
+        self.batch.invalidate()
+        if self.current_state == Application.State.IN_GAME:
+            self.game_manager.fixed_timestep.callback = (
+                self.game_manager.on_fixed_update
+            )
+
+    def toggle_profiler(self):
+        """ Shows or hides the profiler overlay, profiling while shown. """
+        if self.profiler_overlay is None:
+            self.profiler_overlay = ProfilerOverlay(self.profiler)
+            self.set_profiling(True)
+        else:
+            self.profiler_overlay = None
+            # Keep profiling if a trace is being recorded
+            if not self.profiler.tracing:
+                self.set_profiling(False)
+
+    def toggle_trace(self):
+        """ Starts recording a trace, or stops and saves the current one
+        to a timestamped file in the working directory, shown in the
+        profiler's overlay.
+        """
+        if not self.profiler.tracing:
+            self.set_profiling(True)
+            self.profiler.start_trace()
+        else:
+            path = strftime("trace-%Y%m%d-%H%M%S.json")
+            # The overlay shows where it was saved
+            self.profiler.stop_trace(path)
+            # Keep profiling if the overlay is still shown
+            if self.profiler_overlay is None:
+                self.set_profiling(False)
 
     def run(self):
         """ Fire 'er up! """
         pyglet.app.run()  # This just starts the event loop
 
+        # Save the recording once the window has closed
+        if self.record_path is not None:
+            self.game_manager.recorder.save(self.record_path)
+
     @property
     def current_state(self) -> Application.State:
         """ The current application state/focus. """
@@ -139,10 +393,14 @@ class Application:
                     keys=self.keys
                 )
                 self.window.push_handlers(self.game_manager)
+                self.update_render_size()
 
             # Kill the old state manager:
             if self.current_state == Application.State.IN_GAME:
                 self.window.remove_handlers(self.game_manager)
+                # Put back the collision methods it patches, and remove its
+                # filled boxes from the batch
+                self.game_manager.debug_draw.delete()
                 del self.game_manager
 
             # Apply the change
@@ -156,7 +414,7 @@ class Application:
         pyglet.clock.unschedule(self.on_update)
 
 
-def run():
+def run(record_path: Optional[str] = None, native_resolution: bool = False):
     """ Instantiates the Application class and runs the mainloop. """
-    app = Application()
+    app = Application(record_path, native_resolution)
     app.run()
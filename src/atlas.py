@@ -0,0 +1,268 @@
+""" Texture atlases shared by every sprite.
+
+Sprites can only be drawn together when they use the same texture, so every
+image under `sprites/` is packed into one (or, if they do not fit, a few)
+atlas pages at startup, letting a room full of entities be drawn with a
+single texture bind (and a single `ZSpriteGroup`).
+
+Packing means decoding every source image, which is slow, so the packed
+pages and an index of where each image went are cached on disk, under a hash
+of the sources. Later startups with the same sources just load the cache.
+
+Functions:
+
+    get_sources
+    pack
+    build
+    get_atlas
+    load_image
+"""
+
+from __future__ import annotations  # NOTE: This is necessary below Python 3.10
+
+import pyglet
+from pyglet.image.atlas import TextureBin
+
+import hashlib
+import json
+import math
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import zlib
+
+# The project's root directory, which resource names are relative to
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The directory (relative to the root) holding every sprite to pack
+SPRITE_DIRECTORY = "sprites"
+# Where packed atlases are cached
+CACHE_DIRECTORY = os.path.join(ROOT, ".cache", "atlas")
+
+# The largest size of each atlas page, a new one is started when it is full
+ATLAS_SIZE = 2048
+# Blank pixels left around each image, so neighbours never bleed into it
+BORDER = 1
+# Bump whenever the packing or cache layout changes, to invalidate caches
+VERSION = 1
+
+
+class Region(NamedTuple):
+    """ Where an image was packed: its page, and its rect on that page. """
+    page: int
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+class PackedAtlas(NamedTuple):
+    """ Packed atlas pages, as raw RGBA bytes (bottom row first, like
+    pyglet), and where each image is on them.
+    """
+    sizes: List[Tuple[int, int]]
+    pages: List[bytes]
+    regions: Dict[str, Region]
+
+
+# The shared textures and regions, created on first use as textures need a
+# GL context
+_pages: Optional[List[pyglet.image.Texture]] = None
+_regions: Dict[str, pyglet.image.TextureRegion] = {}
+# Holds any image loaded from outside the sprite directory
+_fallback: Optional[TextureBin] = None
+
+
+def get_sources(directory: str = SPRITE_DIRECTORY) -> List[str]:
+    """ Finds every PNG under a directory (relative to the root), returning
+    their resource names, sorted so packing is always the same.
+    """
+    names = []
+    for path, _, files in os.walk(os.path.join(ROOT, directory)):
+        for file in files:
+            if file.lower().endswith(".png"):
+                full_path = os.path.join(path, file)
+                name = os.path.relpath(full_path, ROOT)
+                names.append(name.replace(os.sep, "/"))
+    return sorted(names)
+
+
+def _hash_sources(names: List[str]) -> str:
+    """ Hashes the names and contents of the sources, along with the
+    packing settings.
+    """
+    digest = hashlib.sha256(
+        f"{VERSION}:{ATLAS_SIZE}:{BORDER}".encode()
+    )
+    for name in names:
+        digest.update(name.encode())
+        with open(os.path.join(ROOT, name), "rb") as file:
+            digest.update(hashlib.sha256(file.read()).digest())
+    return digest.hexdigest()[:16]
+
+
+def pack(names: List[str]) -> PackedAtlas:
+    """ Decodes the images and packs them into pages, using shelves: images
+    are placed left to right, tallest first, starting a new shelf above when
+    a row is full, and a new page when a page is full.
+    """
+    images = {}
+    for name in names:
+        image = pyglet.image.load(os.path.join(ROOT, name))
+        images[name] = image.get_image_data()
+
+    # Tallest first packs shelves tightly, ties broken by name
+    order = sorted(names, key=lambda name: (-images[name].height, name))
+
+    # Make pages wide enough for the widest image, and roughly square
+    area = sum(
+        (images[name].width + BORDER * 2) * (images[name].height + BORDER * 2)
+        for name in names
+    )
+    widest = max(
+        (images[name].width + BORDER * 2 for name in names), default=1
+    )
+    page_width = min(max(widest, math.ceil(math.sqrt(area))), ATLAS_SIZE)
+
+    # Place every image: (page, x, y) of the bottom-left corner
+    regions: Dict[str, Region] = {}
+    page_heights: List[int] = [0]
+    x = y = shelf_height = 0
+    for name in order:
+        image = images[name]
+        width = image.width + BORDER * 2
+        height = image.height + BORDER * 2
+        if width > ATLAS_SIZE or height > ATLAS_SIZE:
+            raise ValueError(f"{name} is too big for an atlas page")
+
+        # Start a new shelf when the row is full...
+        if x + width > page_width:
+            x = 0
+            y += shelf_height
+            shelf_height = 0
+        # ...and a new page when the page is full
+        if y + height > ATLAS_SIZE:
+            page_heights.append(0)
+            x = y = shelf_height = 0
+
+        regions[name] = Region(
+            len(page_heights) - 1,
+            x + BORDER, y + BORDER,
+            image.width, image.height
+        )
+        x += width
+        shelf_height = max(shelf_height, height)
+        page_heights[-1] = max(page_heights[-1], y + shelf_height)
+
+    # Copy every image's pixels into its page, row by row
+    sizes = [(page_width, max(height, 1)) for height in page_heights]
+    pages = [bytearray(width * height * 4) for width, height in sizes]
+    for name, region in regions.items():
+        pixels = images[name].get_data("RGBA", region.width * 4)
+        page = pages[region.page]
+        stride = sizes[region.page][0] * 4
+        row_size = region.width * 4
+        for row in range(region.height):
+            start = (region.y + row) * stride + region.x * 4
+            page[start:start + row_size] = (
+                pixels[row * row_size:(row + 1) * row_size]
+            )
+
+    return PackedAtlas(sizes, [bytes(page) for page in pages], regions)
+
+
+def _save(key: str, atlas: PackedAtlas):
+    """ Writes a packed atlas to the cache, replacing any older one. """
+    os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+    for file in os.listdir(CACHE_DIRECTORY):
+        os.remove(os.path.join(CACHE_DIRECTORY, file))
+
+    for i, page in enumerate(atlas.pages):
+        with open(os.path.join(CACHE_DIRECTORY, f"{key}-{i}.rgba"), "wb") \
+                as file:
+            file.write(zlib.compress(page))
+    with open(os.path.join(CACHE_DIRECTORY, f"{key}.json"), "w") as file:
+        json.dump({
+            "sizes": atlas.sizes,
+            "regions": {
+                name: list(region) for name, region in atlas.regions.items()
+            },
+        }, file)
+
+
+def _load(key: str) -> Optional[PackedAtlas]:
+    """ Reads a packed atlas from the cache, None if it is not cached. """
+    index_path = os.path.join(CACHE_DIRECTORY, f"{key}.json")
+    try:
+        with open(index_path) as file:
+            index = json.load(file)
+        pages = []
+        for i in range(len(index["sizes"])):
+            with open(os.path.join(CACHE_DIRECTORY, f"{key}-{i}.rgba"), "rb") \
+                    as file:
+                pages.append(zlib.decompress(file.read()))
+    except (OSError, ValueError, KeyError, zlib.error):
+        # Missing or damaged, so pack again
+        return None
+
+    return PackedAtlas(
+        [tuple(size) for size in index["sizes"]],
+        pages,
+        {name: Region(*region) for name, region in index["regions"].items()},
+    )
+
+
+def build(
+    directory: str = SPRITE_DIRECTORY,
+    use_cache: bool = True
+) -> Tuple[PackedAtlas, bool]:
+    """ Packs every sprite under the directory, or loads them from the cache
+    if the sources have not changed since they were last packed. Returns the
+    packed atlas, and whether it came from the cache. Needs no GL context.
+    """
+    names = get_sources(directory)
+    key = _hash_sources(names)
+    if use_cache:
+        atlas = _load(key)
+        if atlas is not None:
+            return atlas, True
+
+    atlas = pack(names)
+    if use_cache:
+        _save(key, atlas)
+    return atlas, False
+
+
+def get_atlas() -> List[pyglet.image.Texture]:
+    """ Gets the atlas page textures, building the atlas if needed. """
+    global _pages
+    if _pages is None:
+        atlas, _ = build()
+        _pages = [
+            pyglet.image.ImageData(width, height, "RGBA", page).get_texture()
+            for (width, height), page in zip(atlas.sizes, atlas.pages)
+        ]
+        for name, region in atlas.regions.items():
+            _regions[name] = _pages[region.page].get_region(
+                region.x, region.y, region.width, region.height
+            )
+    return _pages
+
+
+def load_image(name: str) -> pyglet.image.TextureRegion:
+    """ Gets an image's region of the atlas, by resource name (e.g.
+    "sprites/player.png"). Loading the same name again gives the same
+    region, so `ImageGrid`s and `Animation`s built from it all reference the
+    same atlas texture.
+
+    Images outside the sprite directory are loaded from `pyglet.resource`
+    into a separate shared atlas.
+    """
+    get_atlas()
+    image = _regions.get(name)
+    if image is None:
+        global _fallback
+        if _fallback is None:
+            _fallback = TextureBin(ATLAS_SIZE, ATLAS_SIZE)
+        with pyglet.resource.file(name) as file:
+            data = pyglet.image.load(name, file=file)
+        image = _regions[name] = _fallback.add(data, BORDER)
+    return image
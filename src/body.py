@@ -9,13 +9,19 @@ from __future__ import annotations  # NOTE: This is necessary below Python 3.10
 
 from .aabb import AABB
 from .collision import (CollisionData, get_axis_collision_distances,
-                        get_axis_collision_times, get_collision_normals)
+                        get_axis_collision_times, get_collision_data_batch,
+                        get_collision_normals)
 from .object2d import Object2D
 from .space import Space
 
+import numpy as np
 from pyglet.math import Vec2
 
-from typing import Optional
+from typing import List, Optional
+
+# A shared zero vector, so the hot path does not need to keep creating new
+# ones. `Vec2` is immutable, so it is safe to share.
+ZERO = Vec2(0, 0)
 
 
 class Body(AABB):
@@ -23,6 +29,21 @@ class Body(AABB):
     finding the nearest collision in the space, and resolving the collision.
     """
 
+    # The number of candidate boxes at which `get_nearest_collision` switches
+    # to the vectorised solver. Below this, numpy's overhead costs more than
+    # it saves.
+    BATCH_THRESHOLD = 16
+
+    # The default maximum number of times a body can bounce (slide) in one
+    # call to `move_and_slide`
+    MAX_BOUNCE = 3
+    # Continuous bodies move quickly, so may need more bounces to use up
+    # their velocity
+    CONTINUOUS_MAX_BOUNCE = 8
+
+    # See `Object2D`
+    __slots__ = ("mask", "continuous")
+
     def __init__(
         self,
         x: float,  # From `Object2D`
@@ -31,11 +52,18 @@ class Body(AABB):
         h: float,  # From `AABB`
         layer: int = AABB.DEFAULT_LAYER,  # From `AABB`
         mask: int = AABB.DEFAULT_LAYER,  # Use our default layer from before
-        parent: Optional[Object2D] = None  # From `Object2D`
+        parent: Optional[Object2D] = None,  # From `Object2D`
+        continuous: bool = False
     ):
+        """ Initialise with fields.
+        Continuous bodies use continuous collision detection: they walk their
+        path through the space cell by cell, which suits fast bodies such as
+        projectiles and dashes.
+        """
         super().__init__(x, y, w, h, layer, parent)  # Initialise AABB fields
 
         self.mask = mask
+        self.continuous = continuous
 
     def get_collision_data(self, other: AABB, velocity: Vec2) -> CollisionData:
         """ Get the collision data between this and another bounding box, using
@@ -51,7 +79,6 @@ class Body(AABB):
             self.global_y, self.h, velocity.y,
             other.global_y, other.h
         )
-        entry_distances = Vec2(x_entry_dist, y_entry_dist)
 
         # Get Collision Times
         x_entry_time, x_exit_time = get_axis_collision_times(
@@ -62,7 +89,6 @@ class Body(AABB):
             y_entry_dist, y_exit_dist,
             velocity.y
         )
-        entry_times = Vec2(x_entry_time, y_entry_time)
 
         # Use closest entry and furthest exit
         entry_time = max(x_entry_time, y_entry_time)
@@ -78,11 +104,11 @@ class Body(AABB):
             or entry_time > 1
         )
 
-        # Get collision normals
+        # Get collision normals, only creating the vectors if we need them
         normals = get_collision_normals(
-            entry_times,
-            entry_distances,
-        ) if collided else Vec2(0, 0)
+            Vec2(x_entry_time, y_entry_time),
+            Vec2(x_entry_dist, y_entry_dist),
+        ) if collided else ZERO
 
         # Return data
         return CollisionData(
@@ -99,34 +125,131 @@ class Body(AABB):
         velocity: Vec2,
     ) -> Optional[CollisionData]:
         """ Finds the nearest collision in the space, if any. """
-        broad_phase = self.get_broad_phase(velocity)
+        # Use the broad-phase rect directly, rather than creating an AABB
+        x, y, w, h = self.get_broad_phase_rect(velocity.x, velocity.y)
+
+        # Only look at the boxes near the broad-phase, as any others cannot
+        # possibly be reached this step, and check a collision is possible
+        mask = self.mask
+        candidates = [
+            other for other in space.query_rect(x, y, w, h)
+            if other is not self
+            and mask & other.layer
+            and other.is_colliding_rect(x, y, w, h)
+        ]
+
+        # With lots of candidates, it is faster to test them all at once
+        if len(candidates) >= self.BATCH_THRESHOLD:
+            return self.get_nearest_collision_batch(candidates, velocity)
+
         closest_data: Optional[CollisionData] = None
 
-        # Loop over every box in the space
-        for other in space:
-            # Check if a collision is possible
-            if other is not self and self.mask & other.layer and broad_phase.is_colliding_aabb(other):
-                # Get data
-                data = self.get_collision_data(other, velocity)
+        # Loop over every candidate
+        for other in candidates:
+            # Get data
+            data = self.get_collision_data(other, velocity)
+            if (
+                # No collision yet
+                closest_data is None
+                # New collision is nearer
+                or data.collision_time < closest_data.collision_time
+            ) and data.collided:  # Check there actually was a collision
+                closest_data = data
+
+        return closest_data
+
+    def get_nearest_collision_continuous(
+        self,
+        space: Space,
+        velocity: Vec2,
+    ) -> Optional[CollisionData]:
+        """ Finds the nearest collision in the space, if any, by walking the
+        path through the space cell by cell and stopping at the first hit.
+        The work done is proportional to the distance travelled, rather than
+        to the number of boxes in the whole broad-phase.
+        """
+        # The whole broad-phase is still used to rule out boxes that only
+        # touch the path, like `get_nearest_collision`
+        x, y, w, h = self.get_broad_phase_rect(velocity.x, velocity.y)
+        mask = self.mask
+
+        closest_data: Optional[CollisionData] = None
+        for _, end, boxes in space.walk_sweep(
+            self.global_x, self.global_y, self.w, self.h,
+            velocity.x, velocity.y
+        ):
+            for other in boxes:
                 if (
-                    # No collision yet
+                    other is self
+                    or not mask & other.layer
+                    or not other.is_colliding_rect(x, y, w, h)
+                ):
+                    continue
+
+                data = self.get_collision_data(other, velocity)
+                if data.collided and (
                     closest_data is None
-                    # New collision is nearer
                     or data.collision_time < closest_data.collision_time
-                ) and data.collided:  # Check there actually was a collision
+                ):
                     closest_data = data
 
+            # Nothing further along the path can be hit any sooner
+            if closest_data is not None and closest_data.collision_time <= end:
+                break
+
         return closest_data
 
+    def get_nearest_collision_batch(
+        self,
+        candidates: List[AABB],
+        velocity: Vec2,
+    ) -> Optional[CollisionData]:
+        """ Finds the nearest collision out of the candidates using the
+        vectorised solver. Gives exactly the same result as testing each
+        candidate in turn.
+        """
+        if not candidates:
+            return None
+
+        batch = get_collision_data_batch(
+            np.array((self.global_x, self.global_y)),
+            np.array((self.w, self.h)),
+            np.array((velocity.x, velocity.y)),
+            np.array([(box.global_x, box.global_y) for box in candidates]),
+            np.array([(box.w, box.h) for box in candidates]),
+        )
+
+        hits = np.flatnonzero(batch.collided)
+        if len(hits) == 0:
+            return None
+
+        # `argmin` picks the first of any equally near collisions, just like
+        # the loop in `get_nearest_collision`
+        nearest = hits[np.argmin(batch.collision_time[hits])]
+        x_normal, y_normal = batch.normals[nearest]
+        return CollisionData(
+            True,
+            float(batch.collision_time[nearest]),
+            Vec2(int(x_normal), int(y_normal)),
+        )
+
     def move(self, space: Space, velocity: Vec2) -> Vec2:
         """ Moves as far as possible in one iteration, returning the remaining
         velocity calculated using the slide method.
         """
-        nearest_collision = self.get_nearest_collision(space, velocity)
+        if self.continuous:
+            nearest_collision = self.get_nearest_collision_continuous(
+                space, velocity
+            )
+        else:
+            nearest_collision = self.get_nearest_collision(space, velocity)
+
         if nearest_collision is None:
-            self.position += velocity  # Move all the way
+            # Move all the way
+            self.x += velocity.x
+            self.y += velocity.y
 
-            new_velocity = Vec2(0, 0)  # No more velocity left over
+            new_velocity = ZERO  # No more velocity left over
         else:
             # Move to point of collision
             self.x += velocity.x * nearest_collision.collision_time
@@ -150,13 +273,24 @@ class Body(AABB):
         self,
         space: Space,
         velocity: Vec2,
-        max_bounce: int = 3,
+        max_bounce: Optional[int] = None,
     ):
         """ Repeatedly moves with the given velocity until it equals 0 or the
-        maximum bounces in one frame have been reached.
+        maximum bounces in one frame have been reached. By default this is
+        `MAX_BOUNCE`, or `CONTINUOUS_MAX_BOUNCE` for continuous bodies.
         """
+        if max_bounce is None:
+            if self.continuous:
+                max_bounce = self.CONTINUOUS_MAX_BOUNCE
+            else:
+                max_bounce = self.MAX_BOUNCE
+
         counter = 0
         # Move until velocity is zero
-        while velocity != Vec2(0, 0) and counter < max_bounce:
+        while velocity != ZERO and counter < max_bounce:
             velocity = self.move(space, velocity)
             counter += 1  # Increment max bounces counter
+
+        # Re-file ourselves in the space now that we have moved
+        if self in space:
+            space.move(self)
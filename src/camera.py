@@ -11,7 +11,7 @@ import pyglet
 from pyglet.graphics import Group
 from pyglet.math import Vec2
 
-from typing import Optional
+from typing import Optional, Tuple
 
 
 class Camera(Group):
@@ -55,6 +55,29 @@ class Camera(Group):
             self.window_size.y / self.VIEW_RESOLUTION.y
         )
 
+    def get_visible_rect(
+        self,
+        margin: float = 0
+    ) -> Tuple[float, float, float, float]:
+        """ Gets the area of the world shown on screen, grown by a margin on
+        every side, as a rect in global space: (x, y, width, height).
+
+        Before the window size is known nothing is shown, so the rect is
+        empty.
+        """
+        zoom = self.get_viewport_scale() * self.zoom
+        if zoom <= 0:
+            w = h = 0.0
+        else:
+            w = self.window_size.x / zoom
+            h = self.window_size.y / zoom
+        return (
+            self.position.global_x - w/2 - margin,
+            self.position.global_y - h/2 - margin,
+            w + margin * 2,
+            h + margin * 2,
+        )
+
     def set_state(self):
         """ Apply zoom and camera offset to view matrix. """
         # Calculate the total zoom amount
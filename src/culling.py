@@ -0,0 +1,115 @@
+""" Hides anything drawn outside of the camera's view.
+
+Classes:
+
+    Culler
+"""
+
+from __future__ import annotations  # NOTE: This is necessary below Python 3.10
+
+from .aabb import AABB
+from .camera import Camera
+from .space import Space
+
+from typing import Any, Dict, Iterable, List
+
+
+class Culler:
+    """ Hides the drawables (sprites, anything with a `visible` property)
+    attached to boxes in a physics space while they are outside the camera's
+    view, and shows them again once they come back into view.
+
+    Each update queries the space (its static index, its dynamic boxes and
+    the bodies of any attached `PhysicsWorld`) for the view, rather than
+    keeping an index of its own, so the cost scales with what is on screen
+    rather than with the size of the dungeon, and boxes are found wherever
+    the space has them filed. Only boxes entering or leaving the view have
+    their drawables changed.
+
+    NOTE: A box must be in the space to be found, so the drawables of a box
+    removed from the space stay hidden until it is removed here too.
+    """
+
+    # Anything this close to the view (in pixels) is still drawn, so sprites
+    # hanging over the edge of their box do not pop in and out
+    MARGIN = 32
+
+    def __init__(
+        self,
+        space: Space,
+        camera: Camera,
+        margin: float = MARGIN
+    ):
+        """ Initialise with the space holding the boxes, and the camera
+        whose view is drawn, with nothing to cull.
+        """
+        self.space = space
+        self.camera = camera
+        self.margin = margin
+        # The drawables of each box
+        self._drawables: Dict[AABB, List[Any]] = {}
+        # The boxes in view as of the last update
+        self._shown: Dict[AABB, None] = {}
+
+    def add(self, box: AABB, drawables: Iterable[Any]):
+        """ Culls the drawables by a box in the space, from the next
+        update. Adding a box again replaces its drawables.
+        """
+        self.remove(box)
+        self._drawables[box] = list(drawables)
+        # Drawables start shown, so the next update hides them if needed
+        self._shown[box] = None
+
+    def remove(self, box: AABB):
+        """ Stops culling the box's drawables, showing them again. Does
+        nothing if the box is not being culled.
+        """
+        drawables = self._drawables.pop(box, None)
+        if drawables is None:
+            return
+        if box in self._shown:
+            del self._shown[box]
+        else:
+            self._set_visible(drawables, True)
+
+    def clear(self):
+        """ Stops culling every box. """
+        for box in list(self._drawables):
+            self.remove(box)
+
+    def update(self):
+        """ Shows the drawables of every box now in view, and hides those of
+        every box no longer in view. Called every frame before drawing.
+        """
+        x, y, w, h = self.camera.get_visible_rect(self.margin)
+        drawables = self._drawables
+        shown: Dict[AABB, None] = {}
+        found = self.space.query_rect(x, y, w, h)
+        for box in found:
+            # Most boxes have nothing drawn, and the queries only narrow it
+            # down to nearby cells
+            if box in drawables and box.is_colliding_rect(x, y, w, h):
+                shown[box] = None
+
+        for box in self._shown:
+            if box not in shown:
+                self._set_visible(self._drawables[box], False)
+        for box in shown:
+            if box not in self._shown:
+                self._set_visible(self._drawables[box], True)
+        self._shown = shown
+
+    @staticmethod
+    def _set_visible(drawables: List[Any], visible: bool):
+        """ Shows or hides every drawable. """
+        for drawable in drawables:
+            drawable.visible = visible
+
+    def __len__(self) -> int:
+        """ The number of boxes being culled. """
+        return len(self._drawables)
+
+    @property
+    def shown_count(self) -> int:
+        """ The number of boxes in view as of the last update. """
+        return len(self._shown)
@@ -0,0 +1,327 @@
+""" Outlines of everything in the physics space, for debugging collisions,
+and the filled boxes drawn until there are sprites for them.
+
+Classes:
+
+    DebugDraw
+"""
+
+from __future__ import annotations  # NOTE: This is necessary below Python 3.10
+
+from .aabb import AABB
+from .body import Body
+from .patching import MethodPatches
+from .space import Space
+
+import numpy as np
+import pyglet
+from pyglet import gl
+
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# A colour: (red, green, blue)
+Colour = Tuple[int, int, int]
+# A rect in global space: (x, y, width, height)
+Rect = Tuple[float, float, float, float]
+
+
+class DebugDraw:
+    """ Draws the outline of every box in a `Space`, the broad-phase of every
+    body moved since the last frame, and the normal of every collision they
+    hit, all as lines in a single vertex list.
+
+    Every frame, the lines are worked out from the space's boxes in numpy
+    arrays and written into the vertex list at once, rather than updating a
+    shape per box.
+
+    While disabled, the vertex list is removed from the batch and the
+    collision methods are left alone, so it costs nothing. While enabled,
+    `Body`'s collision methods are wrapped to record each broad-phase and
+    collision. NOTE: Bodies in a `PhysicsWorld` move without these methods,
+    so only their boxes are drawn.
+
+    Boxes without sprites yet (a room's tiles, the player) are also filled
+    in, whether or not the debug draw is enabled, from a second vertex list
+    below the lines. Boxes which never move are only read when they are
+    given, and the rest are read every frame. Only the filled boxes in view
+    are written, so the vertex list holds what is on screen rather than the
+    whole room.
+    """
+
+    STATIC_COLOUR: Colour = (255, 160, 0)
+    DYNAMIC_COLOUR: Colour = (107, 248, 255)
+    WORLD_COLOUR: Colour = (255, 255, 0)
+    BROAD_PHASE_COLOUR: Colour = (255, 0, 255)
+    NORMAL_COLOUR: Colour = (255, 32, 32)
+    FILL_COLOUR: Colour = (255, 255, 255)
+    # How long to draw collision normals, in pixels
+    NORMAL_LENGTH = 8
+
+    # The collision methods wrapped while enabled
+    TARGETS = ("get_nearest_collision", "get_nearest_collision_continuous")
+
+    # The lines, None while disabled
+    vertex_list: Optional[pyglet.graphics.vertexdomain.VertexList] = None
+    # The filled boxes, as quads
+    fill_list: pyglet.graphics.vertexdomain.VertexList
+
+    def __init__(
+        self,
+        space: Space,
+        batch: pyglet.graphics.Batch,
+        group: Optional[pyglet.graphics.Group] = None
+    ):
+        """ Initialise a disabled debug draw for the space, with nothing
+        filled in, drawing to the batch (in the group, if given).
+        """
+        self.space = space
+        self.batch = batch
+        self.group = pyglet.graphics.OrderedGroup(1, parent=group)
+        self.fill_group = pyglet.graphics.OrderedGroup(0, parent=group)
+        self.enabled = False
+
+        # The patched collision methods, while enabled
+        self._patches = MethodPatches()
+        # Broad-phase rects (x, y, w, h) and collisions (x, y, normal x,
+        # normal y) recorded since the last frame...
+        self._broad_phases: List[Tuple[float, float, float, float]] = []
+        self._contacts: List[Tuple[float, float, float, float]] = []
+        # ...and those being drawn
+        self.broad_phases = np.zeros((0, 4))
+        self.contacts = np.zeros((0, 4))
+
+        # The space's static boxes as an array, and the index they came from
+        self._static_source = None
+        self._static_rects = np.zeros((0, 4))
+
+        # The filled boxes which never move, as rects and colours...
+        self._static_fills = np.zeros((0, 4))
+        self._static_fill_colours = np.zeros((0, 3), dtype=np.uint8)
+        # ...and those which do, with their colours
+        self._moving_fills: Dict[AABB, Colour] = {}
+        # The number of filled boxes in view as of the last update
+        self.fill_count = 0
+        self.fill_list = batch.add(
+            4, gl.GL_QUADS, self.fill_group, "v2f/stream", "c3B/stream"
+        )
+
+    def enable(self):
+        """ Starts drawing, and recording collisions. """
+        if self.enabled:
+            return
+        self.enabled = True
+        self.vertex_list = self.batch.add(
+            2, gl.GL_LINES, self.group, "v2f/stream", "c3B/stream"
+        )
+        for name in self.TARGETS:
+            self._patches.patch(Body, name, self._wrap)
+
+    def disable(self):
+        """ Stops drawing, putting the original collision methods back. """
+        if not self.enabled:
+            return
+        self.enabled = False
+        self.vertex_list.delete()
+        self.vertex_list = None
+        self._patches.restore()
+        self._broad_phases.clear()
+        self._contacts.clear()
+
+    def delete(self):
+        """ Disables the debug draw, and removes the filled boxes from the
+        batch. Call before the debug draw is dropped.
+        """
+        self.disable()
+        self.fill_list.delete()
+
+    def toggle(self):
+        """ Enables the debug draw if disabled, or disables it if enabled. """
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+
+    def fill_static(
+        self,
+        boxes: Iterable[AABB],
+        colour: Colour = FILL_COLOUR
+    ):
+        """ Replaces the filled boxes which never move, such as a room's
+        tiles.
+        """
+        self._static_fills = self._to_rects(boxes)
+        self._static_fill_colours = np.tile(
+            np.array(colour, dtype=np.uint8), (len(self._static_fills), 1)
+        )
+
+    def fill(self, box: AABB, colour: Colour = FILL_COLOUR):
+        """ Fills a box which moves, such as the player. """
+        self._moving_fills[box] = colour
+
+    def unfill(self, box: AABB):
+        """ Stops filling a box which moves. """
+        self._moving_fills.pop(box, None)
+
+    def _wrap(self, function: Callable) -> Callable:
+        """ Creates a wrapper recording the broad-phase and collision found
+        by a collision method.
+        """
+        broad_phases = self._broad_phases
+        contacts = self._contacts
+
+        @wraps(function)
+        def recorded(body: Body, space: Space, velocity, *args, **kwargs):
+            data = function(body, space, velocity, *args, **kwargs)
+            broad_phases.append(
+                body.get_broad_phase_rect(velocity.x, velocity.y)
+            )
+            if data is not None:
+                # Draw the normal from the middle of the body, where it hit
+                time = data.collision_time
+                contacts.append((
+                    body.global_x + velocity.x * time + body.w / 2,
+                    body.global_y + velocity.y * time + body.h / 2,
+                    data.normals.x,
+                    data.normals.y,
+                ))
+            return data
+
+        return recorded
+
+    @staticmethod
+    def _to_rects(boxes: Iterable[AABB]) -> np.ndarray:
+        """ Converts boxes into an array of rects: (x, y, w, h) """
+        return np.array(
+            [(box.global_x, box.global_y, box.w, box.h) for box in boxes]
+        ).reshape(-1, 4)
+
+    @staticmethod
+    def _outline(rects: np.ndarray) -> np.ndarray:
+        """ Gets the 4 lines around each rect, as 8 (x, y) points each. """
+        x1 = rects[:, 0]
+        y1 = rects[:, 1]
+        x2 = x1 + rects[:, 2]
+        y2 = y1 + rects[:, 3]
+        return np.stack((
+            x1, y1, x2, y1,
+            x2, y1, x2, y2,
+            x2, y2, x1, y2,
+            x1, y2, x1, y1,
+        ), axis=1).reshape(-1, 2)
+
+    @staticmethod
+    def _write(
+        vertex_list: pyglet.graphics.vertexdomain.VertexList,
+        vertices: np.ndarray,
+        colours: np.ndarray,
+        minimum: int
+    ):
+        """ Writes (x, y) vertices and their colours into a vertex list,
+        resizing it to fit. Vertex lists can not be empty, so any spare
+        vertices (at least `minimum`) are collapsed to a point.
+        """
+        count = max(len(vertices), minimum)
+        if count != vertex_list.get_size():
+            vertex_list.resize(count)
+        vertex_array = np.ctypeslib.as_array(vertex_list.vertices)
+        colour_array = np.ctypeslib.as_array(vertex_list.colors)
+        vertex_array[vertices.size:] = 0
+        colour_array[colours.size:] = 0
+        vertex_array[:vertices.size] = vertices.ravel()
+        colour_array[:colours.size] = colours.ravel()
+
+    def update(self, view: Optional[Rect] = None):
+        """ Rebuilds the filled boxes in view (all of them, if no view is
+        given) and, while enabled, the lines from the space and the
+        collisions recorded since the last frame. Call once per frame,
+        before drawing.
+        """
+        self._update_fills(view)
+        if self.enabled:
+            self._update_lines()
+
+    def _update_fills(self, view: Optional[Rect]):
+        """ Rebuilds the quads of the filled boxes in view. """
+        rects = np.concatenate(
+            (self._static_fills, self._to_rects(self._moving_fills))
+        )
+        colours = np.concatenate((
+            self._static_fill_colours,
+            np.array(
+                list(self._moving_fills.values()), dtype=np.uint8
+            ).reshape(-1, 3),
+        ))
+        if view is not None:
+            x, y, w, h = view
+            in_view = (
+                (rects[:, 0] <= x + w)
+                & (rects[:, 0] + rects[:, 2] >= x)
+                & (rects[:, 1] <= y + h)
+                & (rects[:, 1] + rects[:, 3] >= y)
+            )
+            rects = rects[in_view]
+            colours = colours[in_view]
+        self.fill_count = len(rects)
+
+        x1 = rects[:, 0]
+        y1 = rects[:, 1]
+        x2 = x1 + rects[:, 2]
+        y2 = y1 + rects[:, 3]
+        quads = np.stack((x1, y1, x2, y1, x2, y2, x1, y2), axis=1)
+        self._write(
+            self.fill_list,
+            quads.reshape(-1, 2),
+            np.repeat(colours, 4, axis=0),
+            4
+        )
+
+    def _update_lines(self):
+        """ Rebuilds the lines from the space and the collisions recorded
+        since the last frame.
+        """
+
+        # Keep showing the last collisions on frames without a fixed update
+        if self._broad_phases:
+            self.broad_phases = np.array(self._broad_phases).reshape(-1, 4)
+            self.contacts = np.array(self._contacts).reshape(-1, 4)
+            self._broad_phases.clear()
+            self._contacts.clear()
+
+        # Static boxes only change when they are re-baked
+        static_index = self.space.static_index
+        if static_index is not self._static_source:
+            self._static_source = static_index
+            self._static_rects = self._to_rects(static_index)
+
+        parts = [
+            (self._outline(self._static_rects), self.STATIC_COLOUR),
+            (
+                self._outline(self._to_rects(self.space.dynamic)),
+                self.DYNAMIC_COLOUR
+            ),
+        ]
+        for world in self.space.worlds:
+            n = world.count
+            rects = np.concatenate(
+                (world.positions[:n], world.extends[:n]), axis=1
+            )
+            parts.append((self._outline(rects), self.WORLD_COLOUR))
+        parts.append(
+            (self._outline(self.broad_phases), self.BROAD_PHASE_COLOUR)
+        )
+        normals = np.empty((len(self.contacts), 2, 2))
+        normals[:, 0] = self.contacts[:, :2]
+        normals[:, 1] = (
+            self.contacts[:, :2] + self.contacts[:, 2:] * self.NORMAL_LENGTH
+        )
+        parts.append((normals.reshape(-1, 2), self.NORMAL_COLOUR))
+
+        vertices = np.concatenate([points for points, _ in parts])
+        colours = np.concatenate([
+            np.tile(np.array(colour, dtype=np.uint8), (len(points), 1))
+            for points, colour in parts
+        ])
+
+        # Always keep one (empty) line
+        self._write(self.vertex_list, vertices, colours, 2)
@@ -0,0 +1,81 @@
+""" A fixed-timestep scheduler, to run physics at a steady rate no matter how
+fast frames are drawn.
+
+Classes:
+
+    FixedTimestep
+"""
+
+from __future__ import annotations  # NOTE: This is necessary below Python 3.10
+
+from typing import Callable
+
+
+class FixedTimestep:
+    """ Runs a callback at a fixed rate, driven by the time between frames.
+
+    Each frame's time is added to an accumulator, and the callback is run
+    once for every whole timestep in it, always being passed exactly the
+    timestep (so the physics never depends on how long a frame took). Time
+    left over carries on into the next frame.
+
+    If frames take so long that more than `max_steps` steps are needed, the
+    extra time is dropped and the game slows down. Otherwise, each step would
+    make the next frame slower still, needing even more steps: the "spiral
+    of death".
+
+    After advancing, `alpha` is how far (from 0 to 1) we are between the
+    last step and the next one. Drawing objects that far between their
+    positions at the last two steps keeps motion smooth, even when the
+    timestep does not line up with the frame rate.
+    """
+
+    # The default maximum number of steps to run per frame
+    DEFAULT_MAX_STEPS = 5
+
+    def __init__(
+        self,
+        callback: Callable[[float], None],
+        timestep: float,
+        max_steps: int = DEFAULT_MAX_STEPS
+    ):
+        """ Initialise with the callback to run, the time between each run,
+        and the maximum number of runs per frame.
+        """
+        self.callback = callback
+        # NOTE: The timestep can be changed at any time, e.g. to run the
+        #       physics less often when the game is under heavy load.
+        self.timestep = timestep
+        self.max_steps = max_steps
+
+        # Time waiting to be simulated
+        self.accumulator = 0.0
+        # Total time dropped because of the step limit
+        self.dropped_time = 0.0
+
+    def advance(self, dt: float) -> int:
+        """ Adds the frame's time to the accumulator, and runs every step
+        that is now due. Returns the number of steps run.
+        """
+        self.accumulator += dt
+
+        steps = 0
+        while self.accumulator >= self.timestep:
+            if steps == self.max_steps:
+                # Too far behind: drop the backlog, but keep the partial step
+                # so `alpha` stays correct
+                backlog = self.accumulator - self.accumulator % self.timestep
+                self.dropped_time += backlog
+                self.accumulator -= backlog
+                break
+
+            self.callback(self.timestep)
+            self.accumulator -= self.timestep
+            steps += 1
+
+        return steps
+
+    @property
+    def alpha(self) -> float:
+        """ How far through the current step we are, from 0 to 1. """
+        return self.accumulator / self.timestep
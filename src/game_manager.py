@@ -9,108 +9,312 @@ from __future__ import annotations
 
 # Import the components we need from earlier
 from .aabb import AABB
+from .culling import Culler
+from .debug_draw import DebugDraw
+from .fixed_timestep import FixedTimestep
+from .physics_world import PhysicsWorld
 from .player import Player
+from .replay import Replay
+from .snapshot import capture_player, Snapshot
 from .space import Space
+from .sprite_manager import ZSpriteManager
+from .tiles import merge_tiles, Tile, tiles_to_aabbs
 
 import pyglet  # Graphics rendering library
 from pyglet.math import Vec2  # 2D Vector class
 from pyglet.window import key  # Makes references to keys easier
 
+import hashlib
+import struct
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
 
 class GameManager:
     """ The game manager, controls all game processes - such as physics - and
     contains the dungeon itself along with any entities.
+
+    Fixed updates are run by a `FixedTimestep`, advanced by the time passed
+    to `on_update` each frame, and anything drawn is interpolated between
+    the last two fixed updates.
+
+    Without a batch, the game is headless: nothing is drawn, so the owner
+    calls `step` to advance the game one tick at a time, as fast as it
+    likes. Headless games need no window or GL context (set
+    `pyglet.options["shadow_window"] = False` before importing), and run
+    the same logic as a windowed game, so the same inputs always give the
+    same results.
+
+    A server's game has no local player, only remote players, so nothing
+    stands at the origin for them to see or collide with. It can not be
+    drawn, since there is no camera to draw from.
     """
 
     # The time between each fixed update function call
     FIXED_UPDATE_TIMESTEP = 1/60
+    # The most fixed updates to run in a single frame, see `FixedTimestep`
+    MAX_FIXED_UPDATES_PER_FRAME = 5
 
     # Physics Space
     space: Space
+    # Array-backed storage for large numbers of bodies (enemies, projectiles)
+    world: PhysicsWorld
+    # The merged static boxes of the current room
+    walls: List[AABB]
+    # The boxes filled in by the debug draw for the current room
+    debug_tiles: List[AABB]
+    # The number of fixed updates run so far
+    tick: int
+    # Runs the fixed updates due each frame
+    fixed_timestep: FixedTimestep
+    # Key presses waiting to be handled by the next tick
+    pending_presses: List[Tuple[int, int]]
+    # Records every tick's input while set, see `Replay`
+    recorder: Optional[Replay] = None
+    # Writes every changed sprite's vertices once per frame, None if headless
+    sprites: Optional[ZSpriteManager] = None
+    # The player controlled by this game's keys, entity 0, None on a server
+    player: Optional[Player] = None
+    # Players controlled over the network, by entity id
+    remote_players: Dict[int, Player]
+    # Hides anything outside the player's view, None if headless
+    culler: Optional[Culler] = None
+    # Fills in the room's tiles and the player, and outlines the physics
+    # space when enabled, None if headless
+    debug_draw: Optional[DebugDraw] = None
 
     def __init__(
         self,
-        batch: pyglet.graphics.Batch,  # The batch we need to draw to
-        keys: key.KeyStateHandler  # The window key handler
+        # The batch we need to draw to, None if headless
+        batch: Optional[pyglet.graphics.Batch] = None,
+        # The window key handler, a headless game creates its own to be
+        # scripted
+        keys: Optional[key.KeyStateHandler] = None,
+        # Whether to create a local player, a server's game has none
+        local_player: bool = True
     ):
-        """ Game Manager initialiser: schedule physics update method. """
+        """ Game Manager initialiser: set up the fixed timestep and the test
+        room.
+        """
+        if batch is not None and not local_player:
+            raise ValueError("A game without a local player can not be drawn")
 
+        if keys is None:
+            keys = key.KeyStateHandler()
         self.keys = keys  # Store a reference to the key handler
+        self.tick = 0
+        self.pending_presses = []
 
-        self.space = set()  # Initialise the physics space
+        self.space = Space()  # Initialise the physics space
+        # Initialise the physics world, attached to our space
+        self.world = PhysicsWorld(self.space)
+
+        # Sprites only update their vertices when the manager is flushed
+        if batch is not None:
+            self.sprites = ZSpriteManager()
 
         # Initialise the player in our testing environment
-        self.player = Player(Vec2(0, 0), self.space, self.keys, batch)
-
-        # Next we are going to define some boxes.
-        # These will be arranged end-to-end, so we need to know the size
-        # of each box.
-        box_size = 30
-        # The reason we do this is to check how smoothly the collision
-        # system works. In an ideal world, the player should be able to move
-        # against the seams of the boxes.
-        self.box_1 = AABB(125, 85, box_size, box_size)
-        self.box_1.create_debug_rect(
-            batch=batch,
-            group=self.player.camera  # Use the player's camera to display it
-        )
-        self.space.add(self.box_1)  # Add it to the physics space
-        # Define our next box...
-        self.box_2 = AABB(
-            # Place it on the right side of the first box
-            self.box_1.position.x + box_size,
-            self.box_1.position.y,
-            box_size,
-            box_size
-        )
-        self.box_2.create_debug_rect(
-            batch=batch,
-            group=self.player.camera
-        )
-        self.space.add(self.box_2)
-        # Define our third box...
-        self.box_3 = AABB(
-            # Place it on the right side of the second box
-            self.box_2.position.x + box_size,
-            self.box_2.position.y,
-            box_size,
-            box_size
-        )
-        self.box_3.create_debug_rect(
-            batch=batch,
-            group=self.player.camera
+        if local_player:
+            self.player = Player(
+                Vec2(0, 0), self.space, self.keys, batch, self.sprites
+            )
+
+        self.remote_players = {}
+
+        self.batch = batch
+        self.debug_tiles = []
+        if batch is not None:
+            # Only draw what the player's camera can see. NOTE: The camera
+            # follows the player, so only other boxes need culling.
+            self.culler = Culler(self.space, self.player.camera)
+            # Draw the boxes which have no sprites yet
+            self.debug_draw = DebugDraw(
+                self.space, batch, self.player.camera
+            )
+            self.debug_draw.fill(self.player, Player.DEBUG_COLOUR)
+
+        # Next we are going to load a test room: three tiles arranged
+        # end-to-end. The reason we do this is to check how smoothly the
+        # collision system works. In an ideal world, the player should be
+        # able to move against the seams of the tiles.
+        self.load_room(
+            {(0, 0), (1, 0), (2, 0)},
+            tile_size=30,
+            x=125, y=85,
+            keep_originals=True
         )
-        self.space.add(self.box_3)
 
         # Set up our physics update method
-        pyglet.clock.schedule_interval(
+        self.fixed_timestep = FixedTimestep(
             self.on_fixed_update,
-            self.FIXED_UPDATE_TIMESTEP
+            self.FIXED_UPDATE_TIMESTEP,
+            self.MAX_FIXED_UPDATES_PER_FRAME
         )
 
+    @property
+    def headless(self) -> bool:
+        """ Whether the game is running without any rendering. """
+        return self.batch is None
+
+    def load_room(
+        self,
+        tiles: Iterable[Tile],
+        tile_size: float,
+        x: float = 0,
+        y: float = 0,
+        keep_originals: bool = False
+    ):
+        """ Loads a room's solid tiles into the physics space.
+
+        The tiles are merged into as few boxes as practical before being
+        baked into the space's static index. If `keep_originals` is set, the
+        unmerged tile boxes are also kept (outside of the space) so that they
+        can be drawn for debugging.
+        """
+        # We read the tiles twice, so make sure we are not given an iterator
+        tiles = set(tiles)
+
+        # Merge the tiles and replace the old room's walls
+        self.walls = merge_tiles(tiles, tile_size, x, y)
+        self.space.load_static(self.walls)
+
+        # Choose which boxes to draw
+        if keep_originals:
+            self.debug_tiles = tiles_to_aabbs(tiles, tile_size, x, y)
+        else:
+            self.debug_tiles = self.walls
+        if self.debug_draw is not None:
+            self.debug_draw.fill_static(self.debug_tiles)
+
     def on_key_press(self, symbol: int, modifiers: int):
         """ Called every time the user presses a key on the keyboard. """
-        # Send the event to the player
-        self.player.on_key_press(symbol, modifiers)
+        # Hold on to the press until the next tick, so that every input is
+        # handled at a fixed point in the simulation (and can be recorded).
+        self.pending_presses.append((symbol, modifiers))
 
     def on_resize(self, width: float, height: float):
         """ Called every time the window is resized. """
         # Send the event to the player's camera
-        self.player.camera.on_window_resize(width, height)
+        if self.player is not None and self.player.camera is not None:
+            self.player.camera.on_window_resize(width, height)
 
     def on_update(self, dt: float):
         """ Called every frame, dt is time passed since last frame. """
+        # Run any fixed updates that are due...
+        self.fixed_timestep.advance(dt)
+        # ...then draw everything part of the way to the next one
+        self.on_interpolate(self.fixed_timestep.alpha)
+        # Hide whatever the camera can no longer see, now it has moved
+        if self.culler is not None:
+            self.culler.update()
+        if self.debug_draw is not None:
+            self.debug_draw.update(self.player.camera.get_visible_rect())
+        # Write every sprite moved this frame into the batch at once
+        if self.sprites is not None:
+            self.sprites.flush()
+
+    def on_interpolate(self, alpha: float):
+        """ Called every frame after any fixed updates, alpha is how far
+        through the current fixed update we are (from 0 to 1).
+        """
         # Send the event to the player
-        self.player.on_update(dt)
+        if self.player is not None:
+            self.player.on_interpolate(alpha)
 
     def on_fixed_update(self, dt: float):
         """ Physics update method, called at a fixed speed independant of
-        framerate.
+        framerate. This is one tick of the game: everything here must only
+        depend on the input, so the same input always gives the same game.
         """
-        # Send the event to the player
-        self.player.on_fixed_update(dt)
+        presses = self.pending_presses
+        self.pending_presses = []
+        if self.recorder is not None:
+            self.recorder.record_input(self.tick, self.keys, presses)
+
+        # Send the input to the player...
+        if self.player is not None:
+            for symbol, modifiers in presses:
+                self.player.on_key_press(symbol, modifiers)
+            self.player.on_update(dt)
+            # ...then move it
+            self.player.on_fixed_update(dt)
+        # Remote players have their input set before the tick, by the server
+        for player in self.remote_players.values():
+            player.on_update(dt)
+            player.on_fixed_update(dt)
+        # Move every body in the physics world at once
+        self.world.step(dt)
+        self.tick += 1
+
+        if self.recorder is not None:
+            self.recorder.record_digest(self)
+
+    def step(self, dt: float = FIXED_UPDATE_TIMESTEP):
+        """ Advances the game by exactly one tick, skipping the fixed
+        timestep. Used to drive headless games.
+        """
+        self.on_fixed_update(dt)
+
+    def add_remote_player(
+        self,
+        entity_id: int,
+        keys: Mapping[int, bool],
+        position: Vec2 = Vec2(0, 0)
+    ) -> Player:
+        """ Adds a player controlled over the network, reading its input
+        from the given keys. Remote players are headless: they are not drawn
+        by this game.
+        """
+        if entity_id == 0 or entity_id in self.remote_players:
+            raise ValueError(f"Entity {entity_id} is already a player")
+        player = Player(position, self.space, keys)
+        self.remote_players[entity_id] = player
+        return player
+
+    def remove_remote_player(self, entity_id: int):
+        """ Removes a player controlled over the network. """
+        player = self.remote_players.pop(entity_id)
+        player.space = None
 
-    def __del__(self):
-        """ Game Manager destructor. """
-        # Unschedule any scheduled methods
-        pyglet.clock.unschedule(self.on_fixed_update)
+    def get_players(self) -> Dict[int, Player]:
+        """ Gets every player by entity id, the local player (if there is
+        one) being 0.
+        """
+        players = {}
+        if self.player is not None:
+            players[0] = self.player
+        players.update(self.remote_players)
+        return players
+
+    def get_snapshot(self) -> Snapshot:
+        """ Gets a snapshot of every entity for sending to clients. """
+        return Snapshot.from_entities(self.tick, [
+            capture_player(entity_id, player)
+            for entity_id, player in self.get_players().items()
+        ])
+
+    def get_state_digest(self) -> bytes:
+        """ Gets a hash of the simulation's state, which is only the same
+        for two games if their states are bit-identical.
+        """
+        digest = hashlib.sha256()
+        digest.update(struct.pack("<Q", self.tick))
+        players = []
+        if self.player is not None:
+            players.append((0, self.player))
+        players.extend(sorted(self.remote_players.items()))
+        for entity_id, player in players:
+            digest.update(struct.pack(
+                "<H8dB",
+                entity_id,
+                player.x, player.y,
+                *player.input_vec, *player.dash_velocity,
+                player.dash_timer, player.dash_cooldown_timer,
+                player.state.value,
+            ))
+        n = self.world.count
+        for array in (
+            self.world.positions, self.world.extends, self.world.velocities,
+            self.world.layers, self.world.masks
+        ):
+            digest.update(array[:n].tobytes())
+        return digest.digest()
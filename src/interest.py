@@ -0,0 +1,106 @@
+""" Interest management: which entities each client needs to be sent.
+
+Classes:
+
+    InterestManager
+"""
+
+from __future__ import annotations  # NOTE: This is necessary below Python 3.10
+
+from .aabb import AABB
+from .camera import Camera
+from .space import Space
+
+from pyglet.math import Vec2
+
+from typing import Callable, Dict, Hashable, Mapping, Optional, Set
+
+# Gets the room a box is in
+RoomFunction = Callable[[AABB], Hashable]
+
+
+class InterestManager:
+    """ Works out each observer's interest set: the entities in the same
+    room as it, within a camera-sized area of interest around it. Only these
+    need to be sent in its snapshots, so the data sent to each client stays
+    the same as more players join elsewhere, rather than growing with the
+    number of players.
+
+    Entities are found by querying the `Space`'s dynamic boxes and the
+    bodies of any attached `PhysicsWorld` (enemies, projectiles), so only
+    the entities near the area are looked at. An entity only leaves an interest
+    set once it is `KEEP_MARGIN` pixels outside the area, so entities near
+    the edge do not keep being sent in full as they wander in and out.
+    """
+
+    # The size of the area of interest, what the camera shows plus some room
+    # for the view to move before the next snapshot arrives
+    AREA = Camera.VIEW_RESOLUTION + Vec2(64, 64)
+    # How far outside the area an entity must go before being left out
+    KEEP_MARGIN = 64
+
+    def __init__(
+        self,
+        space: Space,
+        area: Vec2 = AREA,
+        keep_margin: float = KEEP_MARGIN,
+        get_room: Optional[RoomFunction] = None
+    ):
+        """ Initialise with the space holding the entities, and a function
+        giving the room each entity is in (by default, they are all in the
+        same room).
+        """
+        self.space = space
+        self.area = area
+        self.keep_margin = keep_margin
+        self.get_room = get_room
+        # The interest set of each observer, as of its last update
+        self.interests: Dict[int, Set[int]] = {}
+
+    def update(
+        self,
+        observer_id: int,
+        observer: AABB,
+        entities: Mapping[AABB, int]
+    ) -> Set[int]:
+        """ Updates and returns an observer's interest set, out of the given
+        entities (boxes mapped to their ids). The observer is always
+        interested in itself.
+        """
+        previous = self.interests.get(observer_id, set())
+        # The area of interest, centred on the observer...
+        x = observer.global_x + observer.w / 2 - self.area.x / 2
+        y = observer.global_y + observer.h / 2 - self.area.y / 2
+        w, h = self.area
+        # ...and the larger area entities already in the set can stay in
+        margin = self.keep_margin
+        outer = (x - margin, y - margin, w + margin * 2, h + margin * 2)
+
+        room = self.get_room(observer) if self.get_room is not None else None
+        interest = {observer_id}
+        found = self.space.dynamic.query_rect(*outer)
+        for world in self.space.worlds:
+            found.extend(world.query_rect(*outer))
+        for box in found:
+            entity_id = entities.get(box)
+            if entity_id is None or entity_id in interest:
+                continue
+            if not box.is_colliding_rect(*outer):
+                continue
+            if entity_id not in previous and not box.is_colliding_rect(
+                x, y, w, h
+            ):
+                continue
+            if (
+                self.get_room is not None
+                and self.get_room(box) != room
+            ):
+                continue
+            interest.add(entity_id)
+
+        self.interests[observer_id] = interest
+        return interest
+
+    def forget(self, observer_id: int):
+        """ Forgets an observer that has left. """
+        self.interests.pop(observer_id, None)
@@ -0,0 +1,210 @@
+""" The messages sent between the server and its clients, each one a single
+UDP datagram.
+
+Clients send an `InputMessage` every tick: which keys are held and were
+pressed, numbered in sequence, along with the latest snapshot they have
+received (which acknowledges it). The inputs the server has not simulated
+yet are resent with it, in case they were lost. The server replies with a
+welcome until the client's first acknowledgement arrives, and an update
+every tick: the last input it has simulated, followed by a `Snapshot`.
+
+Classes:
+
+    InputMessage
+
+Functions:
+
+    get_message_type
+    to_bitmask
+    from_bitmask
+    encode_input
+    decode_input
+    encode_welcome
+    decode_welcome
+    encode_update
+    decode_update
+    encode_minimap
+    decode_minimap
+"""
+
+from __future__ import annotations  # NOTE: This is necessary below Python 3.10
+
+from .replay import TRACKED_KEYS
+from .snapshot import NO_BASELINE
+
+import struct
+from typing import (
+    Dict, Iterable, List, Mapping, NamedTuple, Sequence, Tuple
+)
+
+# The keys sent in input messages, as bits of a bitmask
+INPUT_KEYS = TRACKED_KEYS
+
+# The first two bytes of each message
+INPUT = b"NI"
+WELCOME = b"NW"
+UPDATE = b"NU"
+MINIMAP = b"NM"
+
+# The sequence number meaning no input has been simulated yet
+NO_SEQUENCE = 0xFFFFFFFF
+
+# Formats of each message, see `struct`
+_INPUT = struct.Struct("<2sIIBBB")
+_EARLIER_INPUT = struct.Struct("<BB")
+_WELCOME = struct.Struct("<2sHd")
+_UPDATE = struct.Struct("<2sI")
+_MINIMAP = struct.Struct("<2sIH")
+_MINIMAP_ENTRY = struct.Struct("<Hhh")
+
+# Mini-map positions are rounded to cells of this many pixels
+MINIMAP_CELL_SIZE = 8
+
+# The most earlier inputs resent with each input message
+MAX_EARLIER_INPUTS = 16
+
+
+class InputMessage(NamedTuple):
+    """ A client's input for one tick. """
+    # Counts up by one every tick
+    sequence: int
+    # The tick of the latest snapshot received, `NO_BASELINE` if none
+    ack: int
+    # Bitmasks of the keys held, and pressed this tick
+    held: int
+    pressed: int
+    # The bitmasks (held, pressed) of the ticks before, newest first
+    earlier: Tuple[Tuple[int, int], ...] = ()
+
+    def expand(self) -> List[InputMessage]:
+        """ Splits the message into one for each tick it holds, oldest
+        first.
+        """
+        messages = [
+            InputMessage(self.sequence - i, self.ack, held, pressed)
+            for i, (held, pressed) in enumerate(self.earlier, 1)
+            if self.sequence - i >= 0
+        ]
+        messages.reverse()
+        messages.append(self._replace(earlier=()))
+        return messages
+
+
+def get_message_type(data: bytes) -> bytes:
+    """ Gets which message a datagram holds: `INPUT`, `WELCOME` or
+    `UPDATE`.
+    """
+    return data[:2]
+
+
+def to_bitmask(keys: Mapping[int, bool]) -> int:
+    """ Gets the bitmask of the input keys which are set. """
+    bitmask = 0
+    for i, symbol in enumerate(INPUT_KEYS):
+        if keys.get(symbol, False):
+            bitmask |= 1 << i
+    return bitmask
+
+
+def from_bitmask(bitmask: int) -> List[int]:
+    """ Gets the input keys in a bitmask. """
+    return [
+        symbol for i, symbol in enumerate(INPUT_KEYS) if bitmask & 1 << i
+    ]
+
+
+def encode_input(
+    sequence: int,
+    held: Mapping[int, bool],
+    pressed: Iterable[int] = (),
+    ack: int = NO_BASELINE,
+    earlier: Sequence[Tuple[int, int]] = ()
+) -> bytes:
+    """ Encodes a tick of input: the held keys, and the keys pressed. The
+    bitmasks (held, pressed) of the ticks before can be resent too, newest
+    first, up to `MAX_EARLIER_INPUTS`.
+    """
+    earlier = earlier[:MAX_EARLIER_INPUTS]
+    return _INPUT.pack(
+        INPUT, sequence, ack,
+        to_bitmask(held), to_bitmask({symbol: True for symbol in pressed}),
+        len(earlier)
+    ) + b"".join(
+        _EARLIER_INPUT.pack(held, pressed) for held, pressed in earlier
+    )
+
+
+def decode_input(data: bytes) -> InputMessage:
+    """ Decodes a tick of input, raising `ValueError` if it is not one. """
+    if len(data) < _INPUT.size or get_message_type(data) != INPUT:
+        raise ValueError("Not an input message")
+    _, sequence, ack, held, pressed, count = _INPUT.unpack_from(data)
+    if len(data) != _INPUT.size + count * _EARLIER_INPUT.size:
+        raise ValueError("Input message is damaged")
+    earlier = tuple(_EARLIER_INPUT.iter_unpack(data[_INPUT.size:]))
+    return InputMessage(sequence, ack, held, pressed, earlier)
+
+
+def encode_welcome(entity_id: int, timestep: float) -> bytes:
+    """ Encodes a welcome, telling a client its entity and the timestep. """
+    return _WELCOME.pack(WELCOME, entity_id, timestep)
+
+
+def decode_welcome(data: bytes) -> Tuple[int, float]:
+    """ Decodes a welcome, returning the client's entity id and the
+    timestep. Raises `ValueError` if it is not a welcome.
+    """
+    if len(data) != _WELCOME.size or get_message_type(data) != WELCOME:
+        raise ValueError("Not a welcome message")
+    _, entity_id, timestep = _WELCOME.unpack(data)
+    return entity_id, timestep
+
+
+def encode_update(last_sequence: int, snapshot: bytes) -> bytes:
+    """ Encodes an update: the last input simulated, and an encoded
+    snapshot.
+    """
+    return _UPDATE.pack(UPDATE, last_sequence) + snapshot
+
+
+def decode_update(data: bytes) -> Tuple[int, bytes]:
+    """ Decodes an update, returning the last input simulated and the
+    encoded snapshot. Raises `ValueError` if it is not an update.
+    """
+    if len(data) < _UPDATE.size or get_message_type(data) != UPDATE:
+        raise ValueError("Not an update message")
+    _, last_sequence = _UPDATE.unpack_from(data)
+    return last_sequence, data[_UPDATE.size:]
+
+
+def encode_minimap(
+    tick: int,
+    positions: Iterable[Tuple[int, float, float]]
+) -> bytes:
+    """ Encodes a mini-map summary of entity positions: (id, x, y). The
+    positions are rounded to `MINIMAP_CELL_SIZE`.
+    """
+    entries = [
+        _MINIMAP_ENTRY.pack(
+            entity_id,
+            round(x / MINIMAP_CELL_SIZE), round(y / MINIMAP_CELL_SIZE)
+        )
+        for entity_id, x, y in positions
+    ]
+    return _MINIMAP.pack(MINIMAP, tick, len(entries)) + b"".join(entries)
+
+
+def decode_minimap(data: bytes) -> Tuple[int, Dict[int, Tuple[int, int]]]:
+    """ Decodes a mini-map summary, returning its tick and the position of
+    each entity, by id (in pixels, to the nearest cell). Raises `ValueError`
+    if it is not a mini-map summary.
+    """
+    if len(data) < _MINIMAP.size or get_message_type(data) != MINIMAP:
+        raise ValueError("Not a mini-map message")
+    _, tick, count = _MINIMAP.unpack_from(data)
+    if len(data) != _MINIMAP.size + count * _MINIMAP_ENTRY.size:
+        raise ValueError("Mini-map message is damaged")
+    positions = {}
+    for entity_id, x, y in _MINIMAP_ENTRY.iter_unpack(data[_MINIMAP.size:]):
+        positions[entity_id] = (x * MINIMAP_CELL_SIZE, y * MINIMAP_CELL_SIZE)
+    return tick, positions
@@ -13,29 +13,84 @@ from pyglet.math import Vec2
 # Import typing annotations that we will need:
 # - Optional: The type may be the specified type OR None.
 from typing import Optional
-# Import weakref tools, used to store parent objects later.
-from weakref import ref, ReferenceType as Ref
+# Import weakref tools, used to store parent and child objects later.
+from weakref import ref, ReferenceType as Ref, WeakSet
 
 
 # Define the Object 2D as a class
 class Object2D:
     """ An object in 2D space with an X and Y position. Supports parenting with
     global positioning.
+
+    The global position is cached, and only recalculated after the object or
+    one of its ancestors has moved. Each object keeps track of its children
+    so that moving it can mark their caches as out of date ("dirty").
     """
 
+    # Use slots rather than an instance dictionary, saving memory and making
+    # attribute access faster. `__weakref__` is needed so that objects can
+    # still be stored as weakrefs.
+    __slots__ = (
+        "_x", "_y",
+        "_parent", "_children",
+        "_global_x", "_global_y", "_dirty",
+        "__weakref__",
+    )
+
     # Store the parent as a weakref to avoid cyclic references
     # This is an issue that arises when two objects contain a reference to
     # each-other and stops them from being garbage-collected from memory.
-    _parent: Optional[Ref[Object2D]] = None
+    _parent: Optional[Ref[Object2D]]
+    # Children are stored in a weak set, so that a parent does not keep its
+    # children alive. This is None until the first child is added, as most
+    # objects never have any children.
+    _children: Optional[WeakSet[Object2D]]
+
+    # The cached global position, only valid while `_dirty` is False.
+    # NOTE: If an object is dirty, all of its descendants are dirty too, as
+    #       an object can only be cleaned after its parent has been.
+    _global_x: float
+    _global_y: float
+    _dirty: bool
 
     # `x` and `y` are floats to allow objects to travel in-between pixels, the parent
     # is optional.
     def __init__(self, x: float, y: float, parent: Optional[Object2D] = None):
         """ Initialise with local position and optionally a parent. """
+        self._parent = None
+        self._children = None
+        self._global_x = 0
+        self._global_y = 0
+        self._dirty = True
+
         self.x = x
         self.y = y
         self.parent = parent
 
+    # The local X position, marks the global position dirty when changed
+    @property
+    def x(self) -> float:
+        """ The local X position, relative to the parent. """
+        return self._x
+
+    @x.setter
+    def x(self, new_x: float):
+        """ Assigns the local X position, invalidating the global position. """
+        self._x = new_x
+        self._invalidate()
+
+    # Local Y position, see x.
+    @property
+    def y(self) -> float:
+        """ The local Y position, relative to the parent. """
+        return self._y
+
+    @y.setter
+    def y(self, new_y: float):
+        """ Assigns the local Y position, invalidating the global position. """
+        self._y = new_y
+        self._invalidate()
+
     # Create a helper property for accessing the position as a 2D vector
     @property
     def position(self) -> Vec2:
@@ -48,16 +103,43 @@ class Object2D:
         """ Assigns new position directly to local X and Y. """
         self.x, self.y = new_position
 
-    # Helper property to calculate the global X position of the object
+    def _invalidate(self):
+        """ Marks the cached global position of this object, and all of its
+        descendants, as dirty.
+        """
+        # Already dirty, so the descendants must be too
+        if self._dirty:
+            return
+        self._dirty = True
+        self._invalidate_children()
+
+    def _invalidate_children(self):
+        """ Marks the cached global position of every child as dirty. """
+        if self._children is not None:
+            for child in self._children:
+                child._invalidate()
+
+    def _update_global_position(self):
+        """ Recalculates the cached global position. """
+        global_x = self.x  # Start with local position
+        global_y = self.y
+        parent = self.parent
+        if parent is not None:
+            # Add parent's global position, which will recursively add its
+            # own parent's global position if it is also dirty.
+            global_x += parent.global_x
+            global_y += parent.global_y
+        self._global_x = global_x
+        self._global_y = global_y
+        self._dirty = False
+
+    # Helper property to get the global X position of the object
     @property
     def global_x(self) -> float:
         """ The global X position relative to world origin. """
-        global_x = self.x  # Start with local X
-        if self.parent is not None:
-            global_x += self.parent.global_x  # Add parent's global position
-        # Each parent will recursively add its own parent's global position,
-        # until there are no more parents.
-        return global_x
+        if self._dirty:
+            self._update_global_position()
+        return self._global_x
 
     # Helper method to set the X position, resulting in an intended global X.
     # This essentially works by doing the reverse of the getter method.
@@ -73,10 +155,9 @@ class Object2D:
     @property
     def global_y(self) -> float:
         """ The global Y position relative to world origin. """
-        y = self.y
-        if self.parent is not None:
-            y += self.parent.global_y
-        return y
+        if self._dirty:
+            self._update_global_position()
+        return self._global_y
 
     # Global Y position setter, see global_y.
     @global_y.setter
@@ -121,7 +202,32 @@ class Object2D:
         """ Assigns a new parent to the object, which may be None to parent the
         object to the world origin.
         """
+        # Leave the old parent's children
+        old_parent = self.parent
+        if old_parent is not None and old_parent._children is not None:
+            old_parent._children.discard(self)
+
         if new_parent is not None:
-            self._parent = ref(new_parent)  # Create new weakref
+            # Create new weakref. If the parent is deleted, our cached global
+            # position would include its position, so make sure it is marked
+            # dirty. The callback only holds a weakref to us, again to avoid
+            # cyclic references.
+            self_ref = ref(self)
+
+            def on_parent_deleted(_):
+                child = self_ref()
+                if child is not None:
+                    child._invalidate()
+
+            self._parent = ref(new_parent, on_parent_deleted)
+            new_parent._add_child(self)
         else:
             self._parent = None
+
+        self._invalidate()
+
+    def _add_child(self, child: Object2D):
+        """ Starts tracking a new child. """
+        if self._children is None:
+            self._children = WeakSet()
+        self._children.add(child)
@@ -0,0 +1,55 @@
+""" Temporarily replacing the methods of a class, e.g. to time or record
+every call to them, and putting the originals back afterwards.
+
+Classes:
+
+    MethodPatches
+"""
+
+from __future__ import annotations  # NOTE: This is necessary below Python 3.10
+
+from typing import Any, Callable, List, Tuple
+
+# Marks a method that was inherited rather than defined on the patched class
+_INHERITED = object()
+
+
+class MethodPatches:
+    """ A set of patched methods, which can all be restored at once.
+
+    Patching replaces the method on the class itself, so every instance
+    (and subclass) uses the wrapper until it is restored. NOTE: Bound
+    methods taken before patching still point at the original methods.
+    """
+
+    def __init__(self):
+        """ Initialise with nothing patched. """
+        # The original methods, in the order they were patched
+        self._originals: List[Tuple[type, str, Any]] = []
+
+    def patch(
+        self,
+        owner: type,
+        name: str,
+        wrap: Callable[[Callable], Callable]
+    ):
+        """ Replaces a method of a class with the wrapper returned by `wrap`,
+        given the current method.
+        """
+        original = owner.__dict__.get(name, _INHERITED)
+        self._originals.append((owner, name, original))
+        setattr(owner, name, wrap(getattr(owner, name)))
+
+    def restore(self):
+        """ Puts every original method back. """
+        # Restore in reverse, in case a method was patched twice
+        for owner, name, original in reversed(self._originals):
+            if original is _INHERITED:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self._originals.clear()
+
+    def __len__(self) -> int:
+        """ The number of methods patched. """
+        return len(self._originals)
@@ -0,0 +1,584 @@
+""" Structure-of-arrays physics storage, for simulating large numbers of
+bodies at once.
+
+Classes:
+
+    PhysicsWorld
+    WorldBody
+
+Functions:
+
+    expand_runs
+    get_overlapping_pairs
+"""
+
+from __future__ import annotations  # NOTE: This is necessary below Python 3.10
+
+from .aabb import AABB
+from .body import Body
+from .collision import get_collision_data_batch
+from .object2d import Object2D
+from .space import Space
+
+import numpy as np
+from pyglet.math import Vec2
+
+from typing import Dict, List, Optional, Tuple
+# Weakref for storing the world in each handle
+from weakref import ref, ReferenceType as Ref
+
+
+def expand_runs(
+    owners: np.ndarray,
+    firsts: np.ndarray,
+    lasts: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """ Expands runs of indices into individual (owner, index) pairs, for
+    example owners [0, 1], firsts [3, 7] and lasts [5, 8] give the pairs
+    (0, 3), (0, 4) and (1, 7). `lasts` are exclusive.
+    """
+    counts = np.maximum(lasts - firsts, 0)
+    run_starts = np.repeat(np.cumsum(counts) - counts, counts)
+    indices = (
+        np.repeat(firsts, counts)
+        + np.arange(counts.sum())
+        - run_starts
+    )
+    return np.repeat(owners, counts), indices
+
+
+def get_overlapping_pairs(
+    a_min: np.ndarray, a_max: np.ndarray,
+    b_min: np.ndarray, b_max: np.ndarray,
+    cell_size: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """ Vectorised broad-phase: finds every pair of an "a" box and a "b" box
+    that overlap, using the same test as `AABB.is_colliding_aabb`.
+
+    Each "b" box no larger than `cell_size` is filed under the grid cell
+    holding its bottom-left corner, and the boxes are sorted by cell (column,
+    then row). Every cell a "b" box could be filed under to overlap an "a"
+    box is then found with one binary search per column. Larger "b" boxes
+    (long merged walls) are rare, so are simply tested against every "a" box.
+
+    Parameters:
+
+        a_min: np.ndarray - Bottom-left corners of the "a" boxes, (K, 2).
+        a_max: np.ndarray - Top-right corners of the "a" boxes, (K, 2).
+        b_min: np.ndarray - Bottom-left corners of the "b" boxes, (M, 2).
+        b_max: np.ndarray - Top-right corners of the "b" boxes, (M, 2).
+        cell_size: float - The grid cell size, and the size above which a
+                           "b" box is tested against every "a" box.
+
+    Returns:
+
+        Tuple of the "a" and "b" indices of each overlapping pair.
+
+        Tuple[np.ndarray, np.ndarray]
+    """
+    # Rows are packed into the low 32 bits of each cell's key, offset so
+    # that negative rows still sort correctly.
+    stride = 1 << 32
+    offset = 1 << 31
+
+    sizes = b_max - b_min
+    is_small = (sizes <= cell_size).all(axis=1)
+    small = np.flatnonzero(is_small)
+    large = np.flatnonzero(~is_small)
+
+    # Sort the small boxes by cell
+    cells = np.floor(b_min[small] / cell_size).astype(np.int64)
+    keys = cells[:, 0] * stride + cells[:, 1] + offset
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    small = small[order]
+
+    # A small box filed one cell left of or below an "a" box can still reach
+    # into it, so search from one cell before the "a" box's first cell.
+    first_cells = np.floor(a_min / cell_size).astype(np.int64) - 1
+    last_cells = np.floor(a_max / cell_size).astype(np.int64)
+
+    # Search every column each "a" box covers
+    owners, columns = expand_runs(
+        np.arange(len(a_min)),
+        first_cells[:, 0],
+        last_cells[:, 0] + 1
+    )
+    firsts = np.searchsorted(
+        keys, columns * stride + first_cells[owners, 1] + offset, "left"
+    )
+    lasts = np.searchsorted(
+        keys, columns * stride + last_cells[owners, 1] + offset, "right"
+    )
+    rows, found = expand_runs(owners, firsts, lasts)
+    others = small[found]
+
+    # Add every pair with a large box
+    rows = np.concatenate((rows, np.repeat(np.arange(len(a_min)), len(large))))
+    others = np.concatenate((others, np.tile(large, len(a_min))))
+
+    # Finally, do the exact overlap test on every pair
+    overlapping = (
+        (a_min[rows, 0] < b_max[others, 0])
+        & (a_max[rows, 0] > b_min[others, 0])
+        & (a_min[rows, 1] < b_max[others, 1])
+        & (a_max[rows, 1] > b_min[others, 1])
+    )
+    return rows[overlapping], others[overlapping]
+
+
+class PhysicsWorld:
+    """ Stores the position, extents, velocity, layer and mask of every body
+    in contiguous numpy arrays (one row per body), so that every body can be
+    moved and slid in a single batched call per fixed update.
+
+    Bodies are accessed through `WorldBody` handles, which hold an index into
+    the arrays. World bodies have no parent, so their local and global
+    positions are the same.
+
+    The world collides its bodies against the boxes in its `Space` and
+    against each other. Once attached, the space's queries also return the
+    world's bodies, so ordinary `Body`s (such as the player) collide with
+    them too.
+    """
+
+    # How many bodies to make room for when the world is created
+    INITIAL_CAPACITY = 64
+    # How many bodies to test at once in `step`, to limit memory use
+    CHUNK_SIZE = 1024
+    # The cell size of the broad-phase grid. Boxes larger than this are
+    # tested against every body, see `get_overlapping_pairs`.
+    BROAD_PHASE_CELL_SIZE = 64
+
+    def __init__(
+        self,
+        space: Optional[Space] = None,
+        capacity: int = INITIAL_CAPACITY
+    ):
+        """ Initialise an empty world, attached to an optional space. """
+        # Number of bodies currently in the world
+        self.count = 0
+
+        # The arrays themselves, only the first `count` rows are in use
+        self.positions = np.zeros((capacity, 2))
+        self.extends = np.zeros((capacity, 2))
+        self.velocities = np.zeros((capacity, 2))
+        self.layers = np.zeros(capacity, dtype=np.int64)
+        self.masks = np.zeros(capacity, dtype=np.int64)
+
+        # The handle for each row
+        self.bodies: List[WorldBody] = []
+        # The handles which have children, which must be told when a step
+        # moves them
+        self.parent_bodies: Dict[WorldBody, None] = {}
+
+        # The static boxes we last converted to arrays, see
+        # `_get_space_arrays`
+        self._static_source = None
+        self._static_arrays = self._to_arrays([])
+
+        self.space = space
+        if space is not None:
+            space.attach_world(self)
+
+    def _grow(self):
+        """ Doubles the capacity of every array. """
+        capacity = len(self.positions) * 2
+        for name in ("positions", "extends", "velocities"):
+            array = np.zeros((capacity, 2))
+            array[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, array)
+        for name in ("layers", "masks"):
+            array = np.zeros(capacity, dtype=np.int64)
+            array[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, array)
+        # Every handle keeps a reference to the arrays, so give it the new ones
+        for body in self.bodies:
+            body._cache_arrays()
+
+    def add(self, body: WorldBody) -> int:
+        """ Adds a row for the handle, returning its index. """
+        if self.count == len(self.positions):
+            self._grow()
+
+        index = self.count
+        # Clear any values left over from a removed body
+        self.positions[index] = 0
+        self.extends[index] = 0
+        self.velocities[index] = 0
+        self.layers[index] = 0
+        self.masks[index] = 0
+
+        self.bodies.append(body)
+        self.count += 1
+        return index
+
+    def remove(self, body: WorldBody):
+        """ Removes a body from the world. The last row is moved into the
+        removed body's row to keep the arrays contiguous.
+        """
+        index = body.index
+        last = self.count - 1
+        if index < 0 or index >= self.count or self.bodies[index] is not body:
+            raise KeyError(body)
+
+        if index != last:
+            # Move the last row into the gap
+            for array in (
+                self.positions, self.extends, self.velocities,
+                self.layers, self.masks
+            ):
+                array[index] = array[last]
+            moved = self.bodies[last]
+            self.bodies[index] = moved
+            moved.index = index
+
+        self.bodies.pop()
+        self.count -= 1
+        self.parent_bodies.pop(body, None)
+        body.index = -1
+
+    @staticmethod
+    def _to_arrays(
+        boxes: List[AABB]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ Converts boxes into position, extents and layer arrays. """
+        positions = np.array(
+            [(box.global_x, box.global_y) for box in boxes]
+        ).reshape(-1, 2)
+        extends = np.array([(box.w, box.h) for box in boxes]).reshape(-1, 2)
+        layers = np.array([box.layer for box in boxes], dtype=np.int64)
+        return positions, extends, layers
+
+    def _get_space_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ Gets the position, extents and layer arrays of every box in the
+        space. The static boxes are only converted when they are re-baked.
+        """
+        if self.space is None:
+            return self._static_arrays
+
+        static_index = self.space.static_index
+        if static_index is not self._static_source:
+            self._static_source = static_index
+            self._static_arrays = self._to_arrays(list(static_index))
+
+        dynamic = list(self.space.dynamic)
+        if not dynamic:
+            return self._static_arrays
+
+        # Dynamic boxes move every tick, so are converted every time
+        dynamic_arrays = self._to_arrays(dynamic)
+        return tuple(
+            np.concatenate((static, moving))
+            for static, moving in zip(self._static_arrays, dynamic_arrays)
+        )
+
+    def query_rect(
+        self,
+        x: float, y: float, w: float, h: float
+    ) -> List[WorldBody]:
+        """ Gets every body touching the given rectangle, in global space. """
+        n = self.count
+        positions = self.positions[:n]
+        extends = self.extends[:n]
+        touching = np.flatnonzero(
+            (positions[:, 0] <= x + w)
+            & (positions[:, 0] + extends[:, 0] >= x)
+            & (positions[:, 1] <= y + h)
+            & (positions[:, 1] + extends[:, 1] >= y)
+        )
+        bodies = self.bodies
+        return [bodies[i] for i in touching]
+
+    def step(self, dt: float, max_bounce: int = 3):
+        """ Moves and slides every body by its velocity multiplied by `dt`.
+
+        This does the same as calling `Body.move_and_slide` on every body,
+        except that all bodies move at the same time: during each bounce
+        every body is tested against the positions the others had at the
+        start of that bounce.
+        """
+        n = self.count
+        if n == 0:
+            return
+
+        # Views of the rows in use
+        positions = self.positions[:n]
+        extends = self.extends[:n]
+        masks = self.masks[:n]
+        # The velocity still left to move this step
+        remaining = self.velocities[:n] * dt
+
+        space_positions, space_extends, space_layers = self._get_space_arrays()
+        # World bodies come after the space's boxes in the list of others
+        offset = len(space_positions)
+        other_extends = np.concatenate((space_extends, extends))
+        other_layers = np.concatenate((space_layers, self.layers[:n]))
+
+        for _ in range(max_bounce):
+            movers = np.flatnonzero((remaining != 0).any(axis=1))
+            if len(movers) == 0:
+                break
+
+            # Take a snapshot of where everything is at the start of the
+            # bounce.
+            other_positions = np.concatenate((space_positions, positions))
+
+            new_positions = positions.copy()
+            for start in range(0, len(movers), self.CHUNK_SIZE):
+                chunk = movers[start:start + self.CHUNK_SIZE]
+                self._move_chunk(
+                    chunk, offset,
+                    positions, extends, masks, remaining, new_positions,
+                    other_positions, other_extends, other_layers,
+                )
+            positions[:] = new_positions
+
+        # Mark the children of every body as dirty, as they may have moved
+        for body in self.parent_bodies:
+            body._invalidate_children()
+
+    def _move_chunk(
+        self,
+        chunk: np.ndarray,
+        offset: int,
+        positions: np.ndarray,
+        extends: np.ndarray,
+        masks: np.ndarray,
+        remaining: np.ndarray,
+        new_positions: np.ndarray,
+        other_positions: np.ndarray,
+        other_extends: np.ndarray,
+        other_layers: np.ndarray,
+    ):
+        """ Performs one bounce of `step` for a chunk of bodies. Writes the
+        moved positions into `new_positions` and the slid velocities into
+        `remaining`.
+        """
+        position = positions[chunk]
+        extent = extends[chunk]
+        velocity = remaining[chunk]
+
+        # Broad-phase, see `AABB.get_broad_phase`
+        broad_min = np.minimum(position, position + velocity)
+        broad_max = broad_min + extent + np.abs(velocity)
+        rows, others = get_overlapping_pairs(
+            broad_min, broad_max,
+            other_positions, other_positions + other_extends,
+            self.BROAD_PHASE_CELL_SIZE
+        )
+        # Check the layers, and stop bodies colliding with themselves
+        possible = (masks[chunk][rows] & other_layers[others]) != 0
+        possible &= others != offset + chunk[rows]
+        rows, others = rows[possible], others[possible]
+
+        # Only run the narrow-phase on the pairs that passed
+        data = get_collision_data_batch(
+            position[rows], extent[rows], velocity[rows],
+            other_positions[others], other_extends[others],
+        )
+        hit = np.flatnonzero(data.collided)
+        rows, others = rows[hit], others[hit]
+        times = data.collision_time[hit]
+        normals = data.normals[hit]
+
+        # Find the nearest collision for each body: sort by body, then time,
+        # then by the other box's index so ties are broken in the same order
+        # as `Body.get_nearest_collision`.
+        order = np.lexsort((others, times, rows))
+        hit_rows, first = np.unique(rows[order], return_index=True)
+        nearest = order[first]
+
+        # By default, move all the way with no velocity left over
+        time = np.ones(len(chunk))
+        normal = np.zeros((len(chunk), 2))
+        time[hit_rows] = times[nearest]
+        normal[hit_rows] = normals[nearest]
+        hit_mask = np.zeros(len(chunk), dtype=bool)
+        hit_mask[hit_rows] = True
+
+        # Move to the point of collision, see `Body.move`
+        moved = position + velocity * time[:, None]
+        new_positions[chunk] = np.where(
+            hit_mask[:, None],
+            moved,
+            position + velocity
+        )
+
+        # Slide along the surface we hit
+        dot_product = (
+            velocity[:, 0] * normal[:, 1]
+            + velocity[:, 1] * normal[:, 0]
+        ) * (1 - time)
+        remaining[chunk] = np.stack(
+            (dot_product * normal[:, 1], dot_product * normal[:, 0]),
+            axis=-1
+        )
+
+
+class WorldBody(Body):
+    """ A thin handle to a body stored in a `PhysicsWorld`.
+
+    It keeps the full `Body` interface, but its position, extents, velocity,
+    layer and mask are read from and written to the world's arrays.
+    """
+
+    __slots__ = (
+        "_world", "index",
+        "_positions", "_extends", "_velocities", "_layers", "_masks",
+    )
+
+    # Store the world as a weakref to avoid cyclic references
+    _world: Ref[PhysicsWorld]
+    # The body's row in the world's arrays, -1 once removed
+    index: int
+    # The world's arrays, kept here so reading a field does not have to
+    # dereference the world first, see `_cache_arrays`
+    _positions: np.ndarray
+    _extends: np.ndarray
+    _velocities: np.ndarray
+    _layers: np.ndarray
+    _masks: np.ndarray
+
+    def __init__(
+        self,
+        world: PhysicsWorld,
+        x: float,  # From `Object2D`
+        y: float,  # From `Object2D`
+        w: float,  # From `AABB`
+        h: float,  # From `AABB`
+        layer: int = AABB.DEFAULT_LAYER,  # From `AABB`
+        mask: int = AABB.DEFAULT_LAYER,  # From `Body`
+        parent: Optional[Object2D] = None  # From `Object2D`
+    ):
+        """ Add a row to the world, then initialise the `Body` fields (which
+        are written into the row).
+        """
+        if parent is not None:
+            raise ValueError("World bodies cannot have a parent")
+
+        self._world = ref(world)
+        self.index = world.add(self)
+        self._cache_arrays()
+
+        super().__init__(x, y, w, h, layer, mask, parent)
+
+    @property
+    def world(self) -> PhysicsWorld:
+        """ The world this body is stored in. """
+        return self._world()  # Dereference weakref
+
+    def _cache_arrays(self):
+        """ Keeps a reference to each of the world's arrays. Called again
+        by the world whenever it replaces them with larger ones.
+        """
+        world = self.world
+        self._positions = world.positions
+        self._extends = world.extends
+        self._velocities = world.velocities
+        self._layers = world.layers
+        self._masks = world.masks
+
+    def _add_child(self, child: Object2D):
+        """ Starts tracking a new child, and asks the world to tell it
+        whenever we are moved by a step.
+        """
+        super()._add_child(child)
+        self.world.parent_bodies[self] = None
+
+    # NOTE: World bodies have no parent, so their global position is just
+    #       their local position, read straight from the world. Nothing is
+    #       cached, so there is nothing to mark dirty except our children.
+    #       `ndarray.item` gives a Python float or int directly, which is
+    #       quicker than indexing and converting the numpy scalar.
+    @property
+    def x(self) -> float:
+        """ The body's local (and global) X position, stored in the world. """
+        return self._positions.item(self.index, 0)
+
+    @x.setter
+    def x(self, new_x: float):
+        """ Writes the body's local (and global) X position into the world. """
+        self._positions[self.index, 0] = new_x
+        self._invalidate_children()
+
+    @property
+    def y(self) -> float:
+        """ The body's local (and global) Y position, stored in the world. """
+        return self._positions.item(self.index, 1)
+
+    @y.setter
+    def y(self, new_y: float):
+        """ Writes the body's local (and global) Y position into the world. """
+        self._positions[self.index, 1] = new_y
+        self._invalidate_children()
+
+    @property
+    def global_x(self) -> float:
+        """ The body's global X position, the same as its local position. """
+        return self.x
+
+    @global_x.setter
+    def global_x(self, new_global_x: float):
+        """ Assigns the body's global X position. """
+        self.x = new_global_x
+
+    @property
+    def global_y(self) -> float:
+        """ The body's global Y position, the same as its local position. """
+        return self.y
+
+    @global_y.setter
+    def global_y(self, new_global_y: float):
+        """ Assigns the body's global Y position. """
+        self.y = new_global_y
+
+    @property
+    def w(self) -> float:
+        """ The body's width, stored in the world. """
+        return self._extends.item(self.index, 0)
+
+    @w.setter
+    def w(self, new_w: float):
+        """ Writes the body's width into the world. """
+        self._extends[self.index, 0] = new_w
+
+    @property
+    def h(self) -> float:
+        """ The body's height, stored in the world. """
+        return self._extends.item(self.index, 1)
+
+    @h.setter
+    def h(self, new_h: float):
+        """ Writes the body's height into the world. """
+        self._extends[self.index, 1] = new_h
+
+    @property
+    def layer(self) -> int:
+        """ The body's physics layer bitmask, stored in the world. """
+        return self._layers.item(self.index)
+
+    @layer.setter
+    def layer(self, new_layer: int):
+        """ Writes the body's physics layer bitmask into the world. """
+        self._layers[self.index] = new_layer
+
+    @property
+    def mask(self) -> int:
+        """ The body's physics mask bitmask, stored in the world. """
+        return self._masks.item(self.index)
+
+    @mask.setter
+    def mask(self, new_mask: int):
+        """ Writes the body's physics mask bitmask into the world. """
+        self._masks[self.index] = new_mask
+
+    @property
+    def velocity(self) -> Vec2:
+        """ The velocity the world will move this body by, per second. """
+        return Vec2(*self._velocities[self.index].tolist())
+
+    @velocity.setter
+    def velocity(self, new_velocity: Vec2):
+        """ Writes the body's velocity into the world. """
+        self._velocities[self.index] = tuple(new_velocity)
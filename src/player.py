@@ -3,15 +3,25 @@
 Classes:
 
     Player
+
+Functions:
+
+    load_sprite_sheet
+    load_image_grid
+    load_idle_animation
+    load_moving_animation
 """
 
 from __future__ import annotations  # NOTE: This is necessary below Python 3.10
 
 # Import all our classes and methods we need
-from . import weapons
+from . import atlas, resources, weapons
 from .body import Body
 from .camera import Camera
+from .object2d import Object2D
+from .resources import Resource
 from .space import Space
+from .sprite_manager import ZSpriteManager
 from .weapon import Weapon
 from .zsprite import ZSprite
 
@@ -28,19 +38,17 @@ from weakref import ref, ReferenceType as Ref
 
 
 class Player(Body):
-    """ A physics body controllable by the user. """
+    """ A physics body controllable by the user.
 
-    # Resources
-    SPRITE_SHEET = pyglet.resource.image("sprites/player.png")
-    IMG_GRID = pyglet.image.ImageGrid(SPRITE_SHEET, 2, 4)
-    IDLE = pyglet.image.Animation.from_image_sequence(
-        IMG_GRID[:2],  # Take a slice of the image grid
-        1/4,
-    )
-    MOVING = pyglet.image.Animation.from_image_sequence(
-        IMG_GRID[4:8],  # Take a slice of the image grid
-        1/8,
-    )
+    If no batch is given, the player is headless: it has no camera, sprite
+    or debug rect, and only runs its game logic.
+    """
+
+    # Resources, loaded on first use as they need a GL context
+    SPRITE_SHEET = Resource("player/sheet")
+    IMG_GRID = Resource("player/grid")
+    IDLE = Resource("player/idle")
+    MOVING = Resource("player/moving")
 
     # Define the player's physics layer
     LAYER = 1 << 1
@@ -69,8 +77,14 @@ class Player(Body):
     input_vec = Vec2(0, 0)
     dash_velocity = Vec2(0, 0)
 
-    # Sprite
-    sprite: ZSprite
+    # Camera and sprite, None if headless
+    camera: Optional[Camera] = None
+    sprite: Optional[ZSprite] = None
+    # Where the player is drawn, interpolated between the last two fixed
+    # updates. The camera follows this rather than the body itself.
+    render_anchor: Optional[Object2D] = None
+    # The global position at the start of the last fixed update
+    previous_position: Vec2
 
     # Weapon
     current_weapon: Weapon
@@ -83,10 +97,12 @@ class Player(Body):
         position: Vec2,
         space: Space,
         keys: key.KeyStateHandler,
-        batch: pyglet.graphics.Batch,
+        batch: Optional[pyglet.graphics.Batch] = None,
+        sprites: Optional[ZSpriteManager] = None,
     ):
-        """ Initialise with position, a physics space, a key handler and a
-        graphics batch.
+        """ Initialise with position, a physics space, a key handler, a
+        graphics batch (None if headless) and optionally a sprite manager to
+        update our sprites.
         """
         super().__init__(
             *position,
@@ -95,25 +111,23 @@ class Player(Body):
             mask=Body.DEFAULT_LAYER,
         )
 
-        # Create a camera object
-        self.camera = Camera(6, 6, 1, parent=self)
+        self.previous_position = self.global_position
 
-        # Create a debug rect, we will use this until we set-up sprites
-        self.create_debug_rect(
-            Player.DEBUG_COLOUR,
-            batch,
-            self.camera
-        )
+        if batch is not None:
+            # Create a render anchor and a camera object following it
+            self.render_anchor = Object2D(*self.global_position)
+            self.camera = Camera(6, 6, 1, parent=self.render_anchor)
 
-        # Create Sprite
-        self.sprite = ZSprite(
-            self.IDLE,
-            self.global_x + self.w/2,
-            self.global_y,
-            -self.global_y,
-            batch=batch, group=self.camera,
-            subpixel=True
-        )
+            # Create Sprite
+            self.sprite = ZSprite(
+                self.IDLE,
+                self.global_x + self.w/2,
+                self.global_y,
+                -self.global_y,
+                batch=batch, group=self.camera,
+                subpixel=True,
+                manager=sprites
+            )
 
         # Store space and key handler
         self.keys = keys
@@ -123,7 +137,8 @@ class Player(Body):
         self.current_weapon = weapons.Sword(
             batch,
             self.camera,
-            self
+            self,
+            sprites
         )
         self.current_weapon.position = (10, 8)
 
@@ -142,7 +157,9 @@ class Player(Body):
         return Vec2(vx, vy).normalize()
 
     def on_update(self, dt: float):
-        """ Called every frame. """
+        """ Called at the start of every tick, before `on_fixed_update`:
+        reads the input and updates the dash timers.
+        """
         if self.state == self.State.DASHING:
             # Count down on the dash timer
             self.dash_timer -= dt
@@ -162,17 +179,22 @@ class Player(Body):
 
     def on_fixed_update(self, dt: float):
         """ Called every physics update. """
+        # Remember where we started, to interpolate from
+        self.previous_position = self.global_position
+
         # Determine player speed
         input = self.input_vec
 
         # Flip sprite and weapon based on player movement.
         # This could be simplified, but this works for now.
         if self.input_vec.x > 0:
-            self.sprite.scale_x = 1
+            if self.sprite is not None:
+                self.sprite.scale_x = 1
             self.current_weapon.x = 10
             self.current_weapon.set_flipped(True)
         elif self.input_vec.x < 0:
-            self.sprite.scale_x = -1
+            if self.sprite is not None:
+                self.sprite.scale_x = -1
             self.current_weapon.x = 2
             self.current_weapon.set_flipped(False)
 
@@ -190,17 +212,33 @@ class Player(Body):
         self.move_and_slide(self.space, velocity)
         # ...align to pixel grid...
         self.global_position = round(self.global_position)
-        # ...and update our debug rect!
-        self.update_debug_rect()
-        self.sprite.update(
-            self.global_x + self.w/2,
-            self.global_y,
-            -self.global_y
-        )
+        # ...and keep the space up to date with our rounded position!
+        self.space.move(self)
 
         # Propagate fixed update to weapon
         self.current_weapon.on_fixed_update(dt)
 
+    def on_interpolate(self, alpha: float):
+        """ Called every frame after any fixed updates. Moves the render
+        anchor, sprite and weapon sprite to `alpha` of the way from our
+        previous position to our current one.
+        """
+        if self.render_anchor is None:
+            return
+
+        # Linearly interpolate between the two positions
+        previous_x, previous_y = self.previous_position
+        x = previous_x + (self.global_x - previous_x) * alpha
+        y = previous_y + (self.global_y - previous_y) * alpha
+        self.render_anchor.position = Vec2(x, y)
+
+        self.sprite.update(x + self.w/2, y, -y)
+        # The weapon is drawn offset by the same amount as we are
+        self.current_weapon.update_sprite(
+            x - self.global_x,
+            y - self.global_y
+        )
+
     def on_key_press(self, symbol: int, modifiers: int):
         """ Called every time the user presses a key. """
         can_dash = (
@@ -242,6 +280,8 @@ class Player(Body):
         if new_state != self._state:
             self._state = new_state
             # Update the sprite to match the state
+            if self.sprite is None:
+                return
             if new_state == Player.State.IDLE:
                 # Idle animation
                 self.sprite.image = self.IDLE
@@ -250,6 +290,35 @@ class Player(Body):
                 self.sprite.image = self.MOVING
 
 
-# Set the player's images to use a centered X position
-for img in Player.IMG_GRID:
-    img.anchor_x = img.width / 2
+@resources.register("player/sheet")
+def load_sprite_sheet() -> pyglet.image.AbstractImage:
+    """ Loads the player's sprite sheet. """
+    return atlas.load_image("sprites/player.png")
+
+
+@resources.register("player/grid")
+def load_image_grid() -> pyglet.image.ImageGrid:
+    """ Splits the player's sprite sheet into frames. """
+    grid = pyglet.image.ImageGrid(resources.get("player/sheet"), 2, 4)
+    # Set the player's images to use a centered X position
+    for img in grid:
+        img.anchor_x = img.width / 2
+    return grid
+
+
+@resources.register("player/idle")
+def load_idle_animation() -> pyglet.image.Animation:
+    """ Loads the player's idle animation. """
+    return pyglet.image.Animation.from_image_sequence(
+        resources.get("player/grid")[:2],  # Take a slice of the image grid
+        1/4,
+    )
+
+
+@resources.register("player/moving")
+def load_moving_animation() -> pyglet.image.Animation:
+    """ Loads the player's moving animation. """
+    return pyglet.image.Animation.from_image_sequence(
+        resources.get("player/grid")[4:8],  # Take a slice of the image grid
+        1/8,
+    )
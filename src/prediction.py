@@ -0,0 +1,222 @@
+""" Client-side prediction of the local player's movement, reconciled with
+the updates sent by the server.
+
+Classes:
+
+    PlayerState
+    PredictedTick
+    Predictor
+"""
+
+from __future__ import annotations  # NOTE: This is necessary below Python 3.10
+
+from . import network
+from .game_manager import GameManager
+from .player import Player
+from .snapshot import EntityState
+
+from pyglet.math import Vec2
+from pyglet.window import key
+
+from collections import deque
+from itertools import islice
+from typing import Deque, Iterable, List, Mapping, NamedTuple, Tuple
+
+
+class PlayerState(NamedTuple):
+    """ Everything a player's movement depends on, as of the end of a tick.
+    Restoring a state and running the same input from it always gives the
+    same result.
+    """
+    x: float
+    y: float
+    input_vec: Vec2
+    dash_velocity: Vec2
+    dash_timer: float
+    dash_cooldown_timer: float
+    state: Player.State
+
+    @classmethod
+    def capture(cls, player: Player) -> PlayerState:
+        """ Captures a player's state. """
+        return cls(
+            player.global_x, player.global_y,
+            player.input_vec, player.dash_velocity,
+            player.dash_timer, player.dash_cooldown_timer,
+            player.state,
+        )
+
+    def restore(self, player: Player):
+        """ Puts a player back into this state. """
+        player.global_position = Vec2(self.x, self.y)
+        player.input_vec = self.input_vec
+        player.dash_velocity = self.dash_velocity
+        player.dash_timer = self.dash_timer
+        player.dash_cooldown_timer = self.dash_cooldown_timer
+        player.state = self.state
+        # Keep the space up to date with where we have moved it
+        player.space.move(player)
+
+    def matches(self, entity: EntityState) -> bool:
+        """ Whether this state matches an entity's state in a snapshot, which
+        only holds its position (to the pixel) and its state.
+        """
+        return (
+            round(self.x) == entity.x
+            and round(self.y) == entity.y
+            and self.state.value == entity.state
+        )
+
+
+class PredictedTick(NamedTuple):
+    """ A tick of input run by the client ahead of the server, and the
+    player's state after it.
+    """
+    sequence: int
+    # Bitmasks of the keys held, and pressed, see `network.to_bitmask`
+    held: int
+    pressed: int
+    state: PlayerState
+
+
+class Predictor:
+    """ Moves the local player as soon as its input is read, rather than
+    waiting a round trip for the server to move it, then corrects it
+    whenever the server disagrees.
+
+    Each tick of input is numbered, run on the player straight away and
+    kept, along with the state it led to, in a ring buffer of the last
+    `HISTORY` ticks. Each update from the server holds the last input it
+    simulated and where the player ended up. The older ticks are dropped
+    from the buffer and, as long as the server's state matches the one
+    predicted for that input, nothing else happens. Both sides run the same
+    deterministic fixed step, so this is nearly every time.
+
+    When they do not match (usually because the server ran out of input and
+    kept the last keys held), the player is put back where the server says
+    and only the ticks the server has not simulated yet are replayed on top.
+    The timers and input the server does not send are kept from the
+    prediction. Resending those ticks with each input (see
+    `get_earlier_inputs`) means a lost input rarely causes one.
+    """
+
+    # The most ticks of input kept, two seconds at 60 ticks per second
+    HISTORY = 120
+    TIMESTEP = GameManager.FIXED_UPDATE_TIMESTEP
+
+    def __init__(
+        self,
+        player: Player,
+        keys: key.KeyStateHandler,
+        timestep: float = TIMESTEP,
+        history: int = HISTORY
+    ):
+        """ Initialise with the player to move and the key handler it reads
+        its input from, which only the predictor should set. The timestep
+        must be the server's (sent in its welcome).
+        """
+        self.player = player
+        self.keys = keys
+        self.timestep = timestep
+        # The ticks run which the server has not simulated yet, oldest first
+        self.history: Deque[PredictedTick] = deque(maxlen=history)
+        # The sequence number of the next tick of input
+        self.sequence = 0
+        # The last input the server simulated (-1 if none yet), and the
+        # player's state after it
+        self.acknowledged = -1
+        self.base = PlayerState.capture(player)
+        # The number of corrections made, and ticks replayed for them
+        self.corrections = 0
+        self.replayed = 0
+
+    def predict(
+        self,
+        held: Mapping[int, bool],
+        pressed: Iterable[int] = ()
+    ) -> int:
+        """ Runs a tick of input on the player: the keys held, and pressed
+        this tick. Returns the tick's sequence number, to send the input to
+        the server with.
+        """
+        sequence = self.sequence
+        self.sequence += 1
+        held_mask = network.to_bitmask(held)
+        pressed_mask = network.to_bitmask(
+            {symbol: True for symbol in pressed}
+        )
+        self.simulate(held_mask, pressed_mask)
+        self.history.append(PredictedTick(
+            sequence, held_mask, pressed_mask,
+            PlayerState.capture(self.player)
+        ))
+        return sequence
+
+    def get_earlier_inputs(
+        self,
+        limit: int = network.MAX_EARLIER_INPUTS
+    ) -> List[Tuple[int, int]]:
+        """ Gets the bitmasks (held, pressed) of the ticks before the
+        latest which the server has not simulated yet, newest first, to
+        resend in case they were lost (see `network.encode_input`).
+        """
+        earlier = []
+        for tick in islice(reversed(self.history), 1, limit + 1):
+            earlier.append((tick.held, tick.pressed))
+        return earlier
+
+    def simulate(self, held: int, pressed: int):
+        """ Runs one tick of input on the player, the same way the server
+        does (see `Server.tick`).
+        """
+        held_keys = network.from_bitmask(held)
+        for symbol in network.INPUT_KEYS:
+            self.keys[symbol] = symbol in held_keys
+        for symbol in network.from_bitmask(pressed):
+            self.player.on_key_press(symbol, 0)
+        self.player.on_update(self.timestep)
+        self.player.on_fixed_update(self.timestep)
+
+    def reconcile(self, last_sequence: int, entity: EntityState) -> bool:
+        """ Checks the prediction against an update from the server: the
+        last input it simulated (`network.NO_SEQUENCE` if none) and the
+        player's state in its snapshot. Returns whether the prediction was
+        wrong, and so the player was corrected.
+        """
+        if last_sequence == network.NO_SEQUENCE:
+            last_sequence = -1
+        if last_sequence < self.acknowledged:
+            return False  # An old update, arriving out of order
+
+        # Drop the ticks the server has simulated since the last update,
+        # keeping the state predicted after the last one
+        if last_sequence > self.acknowledged:
+            while self.history and self.history[0].sequence < last_sequence:
+                self.history.popleft()
+            if self.history and self.history[0].sequence == last_sequence:
+                self.base = self.history.popleft().state
+            self.acknowledged = last_sequence
+        # The server runs more ticks on the same input while it waits for
+        # the next one, so it can disagree even when no new input was
+        # simulated
+        if self.base.matches(entity):
+            return False
+
+        # Put the player back where the server says...
+        self.base = self.base._replace(
+            x=entity.x, y=entity.y, state=Player.State(entity.state)
+        )
+        self.base.restore(self.player)
+        self.player.previous_position = Vec2(
+            entity.x - entity.vx, entity.y - entity.vy
+        )
+        # ...then replay only the ticks the server has not simulated yet
+        for i, tick in enumerate(self.history):
+            self.simulate(tick.held, tick.pressed)
+            self.history[i] = tick._replace(
+                state=PlayerState.capture(self.player)
+            )
+
+        self.corrections += 1
+        self.replayed += len(self.history)
+        return True
@@ -0,0 +1,283 @@
+""" Lightweight profiling of the game's hot paths, with an in-game overlay
+and Chrome trace export.
+
+Classes:
+
+    Profiler
+    ProfilerOverlay
+"""
+
+from __future__ import annotations  # NOTE: This is necessary below Python 3.10
+
+from .patching import MethodPatches
+
+import pyglet
+
+from collections import deque
+from functools import wraps
+import json
+from time import perf_counter_ns
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+
+class Profiler:
+    """ Times every call to a set of target methods, keeping the total time
+    spent in each one per frame.
+
+    The targets are only wrapped with timers while the profiler is enabled,
+    and their original methods are put back when it is disabled, so it costs
+    nothing at all when switched off. NOTE: Bound methods taken before the
+    profiler is enabled (e.g. scheduled on the pyglet clock) still point at
+    the original methods, so must be taken again after enabling.
+
+    The per-frame totals (and call counts) of the last `history` frames are
+    kept in ring buffers, along with the time between frames and any
+    counters, values sampled once per frame (like the number of sprites
+    drawn). While tracing, every call is also recorded as a Chrome trace
+    event, which can be opened in `chrome://tracing` or
+    https://ui.perfetto.dev.
+    """
+
+    # The default number of frames to keep the timings of
+    DEFAULT_HISTORY = 240
+
+    def __init__(self, history: int = DEFAULT_HISTORY):
+        """ Initialise a disabled profiler with no targets. """
+        self.history = history
+        self.enabled = False
+
+        # The methods to time: (class, method name, stage name)
+        self._targets: List[Tuple[type, str, str]] = []
+        # The patched methods, while enabled
+        self._patches = MethodPatches()
+
+        # Time spent in each stage so far this frame, in nanoseconds
+        self._frame_totals: Dict[str, int] = {}
+        # Calls to each stage so far this frame
+        self._frame_calls: Dict[str, int] = {}
+        # Ring buffers of each stage's per-frame totals, in milliseconds
+        self.stages: Dict[str, Deque[float]] = {}
+        # Ring buffers of each stage's calls per frame
+        self.calls: Dict[str, Deque[int]] = {}
+        # The function sampled by each counter, and their ring buffers
+        self._counters: Dict[str, Callable[[], float]] = {}
+        self.counters: Dict[str, Deque[float]] = {}
+        # Ring buffer of the time between frames, in milliseconds
+        self.frame_times: Deque[float] = deque(maxlen=history)
+        self._last_frame: Optional[int] = None
+
+        # Recorded trace events, None when not tracing
+        self.trace: Optional[List[Dict[str, Any]]] = None
+        # The path and number of events of the last trace saved, if any
+        self.saved_trace: Optional[Tuple[str, int]] = None
+
+    def add_target(self, owner: type, name: str, stage: str = ""):
+        """ Times calls to a method of a class, reported under the stage name
+        (by default "Class.method").
+        """
+        stage = stage or f"{owner.__name__}.{name}"
+        self._targets.append((owner, name, stage))
+        self.stages[stage] = deque(maxlen=self.history)
+        self.calls[stage] = deque(maxlen=self.history)
+        self._frame_totals[stage] = 0
+        self._frame_calls[stage] = 0
+
+        # Patch straight away if we are already running
+        if self.enabled:
+            self._patch(owner, name, stage)
+
+    def add_counter(self, name: str, sample: Callable[[], float]):
+        """ Samples a value once per frame, at the end of the frame (after
+        the frame's stage totals are stored).
+        """
+        self._counters[name] = sample
+        self.counters[name] = deque(maxlen=self.history)
+
+    def _patch(self, owner: type, name: str, stage: str):
+        """ Replaces a method with a timed wrapper. """
+        self._patches.patch(
+            owner, name, lambda function: self._wrap(function, stage)
+        )
+
+    def _wrap(self, function: Callable, stage: str) -> Callable:
+        """ Creates a wrapper timing each call to a function. """
+        totals = self._frame_totals
+        calls = self._frame_calls
+
+        @wraps(function)
+        def timed(*args, **kwargs):
+            start = perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                end = perf_counter_ns()
+                totals[stage] += end - start
+                calls[stage] += 1
+                if self.trace is not None:
+                    self.trace.append({
+                        "name": stage,
+                        "ph": "X",  # A "complete" event, with a duration
+                        "ts": start / 1000,  # Microseconds
+                        "dur": (end - start) / 1000,
+                        "pid": 0,
+                        "tid": 0,
+                    })
+        return timed
+
+    def enable(self):
+        """ Starts timing every target. """
+        if self.enabled:
+            return
+        self.enabled = True
+        for owner, name, stage in self._targets:
+            self._patch(owner, name, stage)
+
+    def disable(self):
+        """ Stops timing, putting every original method back. """
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._patches.restore()
+        self._last_frame = None
+
+    def end_frame(self):
+        """ Stores this frame's totals in the ring buffers, ready for the
+        next frame. Call once per frame while enabled.
+        """
+        now = perf_counter_ns()
+        if self._last_frame is not None:
+            self.frame_times.append((now - self._last_frame) / 1e6)
+        self._last_frame = now
+
+        for stage, total in self._frame_totals.items():
+            self.stages[stage].append(total / 1e6)
+            self._frame_totals[stage] = 0
+        for stage, count in self._frame_calls.items():
+            self.calls[stage].append(count)
+            self._frame_calls[stage] = 0
+
+        for name, sample in self._counters.items():
+            self.counters[name].append(sample())
+
+    def get_average(self, stage: str) -> float:
+        """ Gets a stage's average time per frame, in milliseconds. """
+        times = self.stages[stage]
+        return sum(times) / len(times) if times else 0.0
+
+    def get_average_calls(self, stage: str) -> float:
+        """ Gets a stage's average number of calls per frame. """
+        calls = self.calls[stage]
+        return sum(calls) / len(calls) if calls else 0.0
+
+    def get_last_calls(self, stage: str) -> int:
+        """ Gets the number of calls to a stage in the last frame. """
+        calls = self.calls[stage]
+        return calls[-1] if calls else 0
+
+    def get_counter(self, name: str) -> float:
+        """ Gets a counter's average value. """
+        values = self.counters[name]
+        return sum(values) / len(values) if values else 0.0
+
+    def get_histogram(
+        self,
+        bin_size: float = 4.0,
+        bins: int = 8
+    ) -> List[int]:
+        """ Counts the recent frame times falling into each bin, each
+        `bin_size` milliseconds wide. The last bin also counts every longer
+        frame.
+        """
+        counts = [0] * bins
+        for time in self.frame_times:
+            counts[min(int(time / bin_size), bins - 1)] += 1
+        return counts
+
+    @property
+    def tracing(self) -> bool:
+        """ Whether calls are being recorded as trace events. """
+        return self.trace is not None
+
+    def start_trace(self):
+        """ Starts recording trace events, enabling the profiler if needed.
+        """
+        self.enable()
+        self.trace = []
+
+    def stop_trace(self, path: str) -> int:
+        """ Stops recording, and writes the events to a Chrome trace JSON
+        file. Returns the number of events written.
+        """
+        events = self.trace or []
+        self.trace = None
+        with open(path, "w") as file:
+            json.dump(
+                {"traceEvents": events, "displayTimeUnit": "ms"},
+                file
+            )
+        self.saved_trace = (path, len(events))
+        return len(events)
+
+
+class ProfilerOverlay:
+    """ Draws the profiler's average time and calls per stage, its
+    counters, the trace being recorded (or the last one saved), and a
+    histogram of frame times, as text in the top-left corner of the window.
+    """
+
+    # How wide each histogram bin is, in milliseconds, and how many there are
+    BIN_SIZE = 4.0
+    BINS = 8
+    # The length of the longest histogram bar, in characters
+    BAR_LENGTH = 30
+
+    def __init__(self, profiler: Profiler):
+        """ Initialise with the profiler to display. """
+        self.profiler = profiler
+        self.label = pyglet.text.Label(
+            "",
+            font_name="Courier New",
+            font_size=10,
+            x=10,
+            anchor_y="top",
+            multiline=True,
+            width=600,
+        )
+
+    def update(self, window_height: float):
+        """ Rebuilds the overlay's text from the latest timings. """
+        profiler = self.profiler
+        lines = []
+        for stage in profiler.stages:
+            lines.append(
+                f"{profiler.get_average(stage):7.3f} ms "
+                f"{profiler.get_average_calls(stage):7.1f} calls  {stage}"
+            )
+        for name in profiler.counters:
+            lines.append(f"{profiler.get_counter(name):10.1f}  {name}")
+        if profiler.tracing:
+            lines.append(f"Tracing: {len(profiler.trace)} events")
+        elif profiler.saved_trace is not None:
+            path, count = profiler.saved_trace
+            lines.append(f"Saved {count} trace events to {path}")
+
+        # Draw each bin as a bar, scaled to the biggest bin
+        lines.append("")
+        lines.append("Frame times:")
+        histogram = profiler.get_histogram(self.BIN_SIZE, self.BINS)
+        biggest = max(histogram) or 1
+        for i, count in enumerate(histogram):
+            low = i * self.BIN_SIZE
+            if i == self.BINS - 1:
+                name = f"{low:4.0f}+    ms"
+            else:
+                name = f"{low:4.0f}-{low + self.BIN_SIZE:<4.0f}ms"
+            bar = "#" * round(count / biggest * self.BAR_LENGTH)
+            lines.append(f"{name} {bar}")
+
+        self.label.text = "\n".join(lines)
+        self.label.y = window_height - 10
+
+    def draw(self):
+        """ Draws the overlay. """
+        self.label.draw()
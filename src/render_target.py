@@ -0,0 +1,130 @@
+""" An offscreen framebuffer to draw into, which can then be scaled up onto
+the window.
+
+Classes:
+
+    RenderTarget
+"""
+
+from __future__ import annotations  # NOTE: This is necessary below Python 3.10
+
+import pyglet
+from pyglet import gl
+
+from ctypes import byref
+from typing import Tuple
+
+
+class RenderTarget:
+    """ An offscreen framebuffer, with a colour and a depth buffer (sprites
+    are sorted by depth).
+
+    The world is drawn into it at a low resolution, then `blit` copies it to
+    the window in one pass, scaled up with nearest-neighbour filtering.
+    Only the small framebuffer is filled while drawing the world, so the
+    cost of drawing does not grow with the size of the window.
+
+    Creating or resizing one raises `GLException` if the driver can not
+    render to it. If creating it fails, its buffers are freed first.
+    """
+
+    width = 0
+    height = 0
+
+    def __init__(self, width: int, height: int):
+        """ Creates the framebuffer with the given size, in pixels. """
+        self.framebuffer = gl.GLuint()
+        gl.glGenFramebuffers(1, byref(self.framebuffer))
+        self.colour = gl.GLuint()
+        gl.glGenRenderbuffers(1, byref(self.colour))
+        self.depth = gl.GLuint()
+        gl.glGenRenderbuffers(1, byref(self.depth))
+
+        try:
+            self.resize(width, height)
+        except gl.GLException:
+            # Nothing else holds the buffers, so free them before giving up
+            self.delete()
+            raise
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """ The size of the framebuffer: (width, height) """
+        return self.width, self.height
+
+    def resize(self, width: int, height: int):
+        """ Resizes the buffers, does nothing if the size has not changed.
+        Anything drawn into them is lost.
+        """
+        width = max(1, width)
+        height = max(1, height)
+        if (width, height) == self.size:
+            return
+        self.width = width
+        self.height = height
+
+        # Resize each buffer...
+        for buffer, internal_format in (
+            (self.colour, gl.GL_RGBA8),
+            (self.depth, gl.GL_DEPTH_COMPONENT24),
+        ):
+            gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, buffer)
+            gl.glRenderbufferStorage(
+                gl.GL_RENDERBUFFER, internal_format, width, height
+            )
+        gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, 0)
+
+        # ...and (re)attach them to the framebuffer
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.framebuffer)
+        gl.glFramebufferRenderbuffer(
+            gl.GL_FRAMEBUFFER, gl.GL_COLOR_ATTACHMENT0,
+            gl.GL_RENDERBUFFER, self.colour
+        )
+        gl.glFramebufferRenderbuffer(
+            gl.GL_FRAMEBUFFER, gl.GL_DEPTH_ATTACHMENT,
+            gl.GL_RENDERBUFFER, self.depth
+        )
+        status = gl.glCheckFramebufferStatus(gl.GL_FRAMEBUFFER)
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+        if status != gl.GL_FRAMEBUFFER_COMPLETE:
+            raise gl.GLException(
+                f"Framebuffer is incomplete (status 0x{status:x})"
+            )
+
+    def bind(self, projection: pyglet.window.Projection):
+        """ Draws into the framebuffer from now on, using the projection
+        (usually the window's) to map its pixels one to one.
+        """
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.framebuffer)
+        projection.set(self.width, self.height, self.width, self.height)
+
+    def unbind(self, window: pyglet.window.Window):
+        """ Draws into the window again, restoring its projection. """
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+        window.projection.set(
+            window.width, window.height, *window.get_framebuffer_size()
+        )
+
+    def blit(self, width: int, height: int, scale: float):
+        """ Copies the framebuffer to the middle of the window's framebuffer
+        (with the given size), scaled up by a factor without smoothing.
+        """
+        scaled_width = round(self.width * scale)
+        scaled_height = round(self.height * scale)
+        x = (width - scaled_width) // 2
+        y = (height - scaled_height) // 2
+
+        gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, self.framebuffer)
+        gl.glBindFramebuffer(gl.GL_DRAW_FRAMEBUFFER, 0)
+        gl.glBlitFramebuffer(
+            0, 0, self.width, self.height,
+            x, y, x + scaled_width, y + scaled_height,
+            gl.GL_COLOR_BUFFER_BIT, gl.GL_NEAREST
+        )
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+
+    def delete(self):
+        """ Frees the framebuffer and its buffers. """
+        gl.glDeleteFramebuffers(1, byref(self.framebuffer))
+        gl.glDeleteRenderbuffers(1, byref(self.colour))
+        gl.glDeleteRenderbuffers(1, byref(self.depth))
@@ -0,0 +1,235 @@
+""" Recording and playing back a game's input, tick by tick.
+
+Classes:
+
+    Replay
+"""
+
+from __future__ import annotations  # NOTE: This is necessary below Python 3.10
+
+from pyglet.window import key
+
+import struct
+from typing import (
+    List, Mapping, Optional, Sequence, Tuple, TYPE_CHECKING
+)
+
+# Only import the game manager for type hints, as it imports this module
+if TYPE_CHECKING:
+    from .game_manager import GameManager
+
+# The keys whose state is recorded every tick: every key the player reads
+TRACKED_KEYS = (key.W, key.A, key.S, key.D, key.SPACE)
+
+
+class Replay:
+    """ The input of every tick of a game, plus regular digests of the game's
+    state to check a playback against.
+
+    Each tick records which tracked keys were held (as a bitmask) and which
+    were pressed. Held keys rarely change from one tick to the next, so they
+    are stored as runs of identical ticks, and presses are stored separately
+    as (tick, key) pairs. An hour at 60 ticks per second is usually only a
+    few kilobytes.
+
+    Recording has to start on the game's first tick, as playback always
+    starts from a new game.
+
+    File layout (little-endian), see `save`:
+
+        Header: magic, version, timestep, tick count, digest interval
+        Keys: count, then each tracked key's symbol
+        Held keys: run count, then each run's (bitmask, length)
+        Presses: count, then each press's (tick, key index)
+        Digests: count, then each digest
+    """
+
+    MAGIC = b"NEAR"
+    VERSION = 1
+
+    # Record a digest of the game's state every this many ticks
+    DEFAULT_DIGEST_INTERVAL = 60
+    # The number of bytes of each digest to keep
+    DIGEST_SIZE = 8
+
+    # Formats of each part of the file, see `struct`
+    _HEADER = struct.Struct("<4sHdII")
+    _COUNT = struct.Struct("<I")
+    _KEY = struct.Struct("<I")
+    _RUN = struct.Struct("<BH")
+    _PRESS = struct.Struct("<IB")
+
+    def __init__(
+        self,
+        timestep: float,
+        keys: Sequence[int] = TRACKED_KEYS,
+        digest_interval: int = DEFAULT_DIGEST_INTERVAL
+    ):
+        """ Initialise an empty replay of a game with the given timestep. """
+        self.timestep = timestep
+        self.keys = tuple(keys)
+        # Held keys are stored in a single byte per run
+        if len(self.keys) > 8:
+            raise ValueError("A replay can track at most 8 keys")
+        self.digest_interval = digest_interval
+
+        # The bitmask of held keys for every tick
+        self.held: List[int] = []
+        # Every key press: (tick, index into `keys`)
+        self.presses: List[Tuple[int, int]] = []
+        # A digest of the game's state after every `digest_interval` ticks
+        self.digests: List[bytes] = []
+
+    @property
+    def length(self) -> int:
+        """ The number of ticks recorded. """
+        return len(self.held)
+
+    # Recording
+
+    def record_input(
+        self,
+        tick: int,
+        keys: Mapping[int, bool],
+        presses: Sequence[Tuple[int, int]]
+    ):
+        """ Records a tick's held keys and key presses (symbol, modifiers),
+        called by the game at the start of each tick. Untracked keys are
+        ignored.
+        """
+        if tick != len(self.held):
+            raise ValueError(
+                f"Recording must start on tick 0 (got tick {tick} for "
+                f"a replay of {len(self.held)} ticks)"
+            )
+
+        bitmask = 0
+        for i, symbol in enumerate(self.keys):
+            if keys[symbol]:
+                bitmask |= 1 << i
+        self.held.append(bitmask)
+
+        for symbol, _ in presses:
+            if symbol in self.keys:
+                self.presses.append((tick, self.keys.index(symbol)))
+
+    def record_digest(self, game: GameManager):
+        """ Records a digest of the game's state if one is due, called by the
+        game at the end of each tick.
+        """
+        if game.tick % self.digest_interval == 0:
+            self.digests.append(game.get_state_digest()[:self.DIGEST_SIZE])
+
+    # Playback
+
+    def play(
+        self,
+        game: GameManager,
+        verify: bool = True
+    ) -> Optional[int]:
+        """ Plays the replay back into a new game, as fast as possible.
+
+        If `verify` is set, the game's state is checked against each recorded
+        digest. Returns the tick at which the game first differed from the
+        recording, or None if it never did.
+        """
+        if game.tick != 0:
+            raise ValueError("Replays can only be played into a new game")
+
+        # Group the presses by tick
+        presses: List[List[int]] = [[] for _ in range(self.length)]
+        for tick, index in self.presses:
+            presses[tick].append(self.keys[index])
+
+        for tick, bitmask in enumerate(self.held):
+            # Send the input exactly as the window would
+            for i, symbol in enumerate(self.keys):
+                game.keys[symbol] = bool(bitmask & (1 << i))
+            for symbol in presses[tick]:
+                game.on_key_press(symbol, 0)
+
+            game.step(self.timestep)
+
+            if verify and game.tick % self.digest_interval == 0:
+                index = game.tick // self.digest_interval - 1
+                if index < len(self.digests) and (
+                    game.get_state_digest()[:self.DIGEST_SIZE]
+                    != self.digests[index]
+                ):
+                    return game.tick
+
+        return None
+
+    # Saving and loading
+
+    def save(self, path: str):
+        """ Writes the replay to a binary file. """
+        parts = [self._HEADER.pack(
+            self.MAGIC, self.VERSION,
+            self.timestep, self.length, self.digest_interval
+        )]
+
+        parts.append(self._COUNT.pack(len(self.keys)))
+        parts.extend(self._KEY.pack(symbol) for symbol in self.keys)
+
+        # Group identical ticks into runs, each no longer than fits in the
+        # run's length field
+        runs: List[Tuple[int, int]] = []
+        for bitmask in self.held:
+            if runs and runs[-1][0] == bitmask and runs[-1][1] < 0xFFFF:
+                runs[-1] = (bitmask, runs[-1][1] + 1)
+            else:
+                runs.append((bitmask, 1))
+        parts.append(self._COUNT.pack(len(runs)))
+        parts.extend(self._RUN.pack(*run) for run in runs)
+
+        parts.append(self._COUNT.pack(len(self.presses)))
+        parts.extend(self._PRESS.pack(*press) for press in self.presses)
+
+        parts.append(self._COUNT.pack(len(self.digests)))
+        parts.extend(self.digests)
+
+        with open(path, "wb") as file:
+            file.write(b"".join(parts))
+
+    @classmethod
+    def load(cls, path: str) -> Replay:
+        """ Reads a replay from a binary file. """
+        with open(path, "rb") as file:
+            data = file.read()
+        offset = 0
+
+        def read(layout: struct.Struct) -> tuple:
+            """ Unpacks the next part of the file. """
+            nonlocal offset
+            values = layout.unpack_from(data, offset)
+            offset += layout.size
+            return values
+
+        magic, version, timestep, length, digest_interval = read(cls._HEADER)
+        if magic != cls.MAGIC:
+            raise ValueError(f"{path} is not a replay file")
+        if version != cls.VERSION:
+            raise ValueError(
+                f"{path} is a version {version} replay, "
+                f"expected version {cls.VERSION}"
+            )
+
+        keys = [read(cls._KEY)[0] for _ in range(read(cls._COUNT)[0])]
+        replay = cls(timestep, keys, digest_interval)
+
+        for _ in range(read(cls._COUNT)[0]):
+            bitmask, run_length = read(cls._RUN)
+            replay.held.extend([bitmask] * run_length)
+        if replay.length != length:
+            raise ValueError(f"{path} is corrupted")
+
+        replay.presses = [
+            read(cls._PRESS) for _ in range(read(cls._COUNT)[0])
+        ]
+
+        for _ in range(read(cls._COUNT)[0]):
+            replay.digests.append(data[offset:offset + cls.DIGEST_SIZE])
+            offset += cls.DIGEST_SIZE
+
+        return replay
@@ -0,0 +1,130 @@
+""" A registry of the game's resources (images, animations and the like),
+each loaded on first use rather than on import.
+
+Loading a resource usually needs a GL context, and can be slow, so modules
+only register how to load their resources when imported. A resource is then
+loaded the first time it is used, or ahead of time by `preload`, which loads
+as many as it can in a time budget so it can be called each frame while a
+menu is shown. Headless games never use them, so never load them.
+
+Classes:
+
+    Resource
+
+Functions:
+
+    register
+    get
+    is_loaded
+    get_loaded
+    get_pending
+    preload
+    unload
+"""
+
+from __future__ import annotations  # NOTE: This is necessary below Python 3.10
+
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional
+
+# How to load each resource, by name, in the order they were registered
+_loaders: Dict[str, Callable[[], Any]] = {}
+# Every resource loaded so far, by name
+_loaded: Dict[str, Any] = {}
+
+
+def register(
+    name: str,
+    loader: Optional[Callable[[], Any]] = None
+) -> Callable:
+    """ Registers how to load a resource, replacing any loader with the same
+    name. The loader is called with no arguments, and can use other
+    resources with `get`. Can also be used as a decorator:
+
+        @resources.register("player/sheet")
+        def load_player_sheet():
+            ...
+    """
+    def decorator(loader: Callable[[], Any]) -> Callable[[], Any]:
+        _loaders[name] = loader
+        return loader
+
+    if loader is None:
+        return decorator
+    return decorator(loader)
+
+
+def get(name: str) -> Any:
+    """ Gets a resource, loading it if this is its first use. """
+    try:
+        return _loaded[name]
+    except KeyError:
+        pass
+    try:
+        loader = _loaders[name]
+    except KeyError:
+        raise KeyError(f"No resource registered as {name!r}") from None
+    resource = _loaded[name] = loader()
+    return resource
+
+
+def is_loaded(name: str) -> bool:
+    """ Checks whether a resource has been loaded yet. """
+    return name in _loaded
+
+
+def get_loaded() -> List[str]:
+    """ Gets the names of every resource loaded so far. """
+    return list(_loaded)
+
+
+def get_pending() -> List[str]:
+    """ Gets the names of every registered resource not loaded yet, in the
+    order they were registered.
+    """
+    return [name for name in _loaders if name not in _loaded]
+
+
+def preload(budget: Optional[float] = None) -> bool:
+    """ Loads resources not loaded yet, in the order they were registered,
+    until the budget (in seconds) has been used. Without a budget, every
+    resource is loaded. Returns whether every resource is now loaded.
+
+    At least one resource is loaded per call, so something is always done,
+    but a slow resource can still overrun the budget.
+    """
+    start = perf_counter()
+    for name in get_pending():
+        get(name)
+        if budget is not None and perf_counter() - start >= budget:
+            break
+    return not get_pending()
+
+
+def unload(name: Optional[str] = None):
+    """ Forgets a loaded resource, or every one if no name is given, so it
+    is loaded again on its next use.
+    """
+    if name is None:
+        _loaded.clear()
+    else:
+        _loaded.pop(name, None)
+
+
+class Resource:
+    """ A class attribute standing in for a resource, which gets it (loading
+    it if needed) whenever it is accessed:
+
+        class Player(Body):
+            IDLE = Resource("player/idle")
+    """
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        """ Creates an attribute for the resource with the given name. """
+        self.name = name
+
+    def __get__(self, instance, owner=None) -> Any:
+        """ Gets the resource, from the class or any instance. """
+        return get(self.name)
@@ -0,0 +1,69 @@
+""" Scripted keyboard input, for driving headless games without a window.
+
+Classes:
+
+    ScriptedInput
+"""
+
+from __future__ import annotations  # NOTE: This is necessary below Python 3.10
+
+from typing import Dict, List, Tuple, TYPE_CHECKING
+
+# Only import the game manager for type hints, as it is not needed otherwise
+if TYPE_CHECKING:
+    from .game_manager import GameManager
+
+# A key event: the key's symbol, and whether it was pressed or released
+KeyEvent = Tuple[int, bool]
+
+
+class ScriptedInput:
+    """ A script of key presses and releases, each happening on a given tick.
+
+    Before each step, `apply` presses and releases the keys scripted for the
+    game's current tick, exactly as the window would: held keys are written
+    into the game's key handler, and presses are sent to `on_key_press`.
+    """
+
+    def __init__(self):
+        """ Initialise an empty script. """
+        # Map each tick to the key events that happen on it, in order
+        self.events: Dict[int, List[KeyEvent]] = {}
+
+    def press(self, tick: int, symbol: int) -> ScriptedInput:
+        """ Presses a key on the given tick, returns the script so calls can
+        be chained.
+        """
+        self.events.setdefault(tick, []).append((symbol, True))
+        return self
+
+    def release(self, tick: int, symbol: int) -> ScriptedInput:
+        """ Releases a key on the given tick. """
+        self.events.setdefault(tick, []).append((symbol, False))
+        return self
+
+    def hold(self, start: int, end: int, symbol: int) -> ScriptedInput:
+        """ Presses a key on the `start` tick, and releases it on the `end`
+        tick.
+        """
+        return self.press(start, symbol).release(end, symbol)
+
+    def apply(self, game: GameManager):
+        """ Sends the key events for the game's current tick to the game. """
+        for symbol, pressed in self.events.get(game.tick, ()):
+            game.keys[symbol] = pressed
+            if pressed:
+                game.on_key_press(symbol, 0)
+
+    def run(self, game: GameManager, ticks: int):
+        """ Steps the game for a number of ticks, applying the script before
+        each one.
+        """
+        for _ in range(ticks):
+            self.apply(game)
+            game.step()
+
+    @property
+    def length(self) -> int:
+        """ The number of ticks until the last scripted event has happened. """
+        return max(self.events, default=-1) + 1
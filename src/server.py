@@ -0,0 +1,354 @@
+""" A dedicated server, running a headless game for clients connecting over
+UDP, all on a single asyncio event loop.
+
+Classes:
+
+    ServerMetrics
+    ClientConnection
+    Server
+
+Functions:
+
+    serve
+"""
+
+from __future__ import annotations  # NOTE: This is necessary below Python 3.10
+
+from . import network
+from .fixed_timestep import FixedTimestep
+from .game_manager import GameManager
+from .interest import InterestManager
+from .snapshot import NO_BASELINE, SnapshotSender
+
+from pyglet.math import Vec2
+from pyglet.window import key
+
+import asyncio
+from collections import deque
+import random
+from time import perf_counter
+from typing import Deque, Dict, List, Optional, Tuple
+
+# A client's address: (host, port)
+Address = Tuple[str, int]
+
+
+class ServerMetrics:
+    """ Counts what the server does between reports: how long each tick
+    takes, and how much data is sent and received.
+    """
+
+    def __init__(self):
+        """ Initialise with nothing counted. """
+        self.reset(perf_counter())
+
+    def reset(self, now: float):
+        """ Starts counting again from the given time. """
+        self.start = now
+        self.tick_times: List[float] = []
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.snapshots = 0
+        self.entities_sent = 0
+        self.packets_in = 0
+        self.packets_out = 0
+
+    def report(self, clients: int) -> Dict[str, float]:
+        """ Gets the metrics since the last report, then starts counting
+        again.
+        """
+        now = perf_counter()
+        elapsed = max(now - self.start, 1e-9)
+        times = sorted(self.tick_times)
+        report = {
+            "clients": clients,
+            "ticks_per_sec": len(times) / elapsed,
+            "tick_mean_ms": sum(times) / max(len(times), 1) * 1000,
+            "tick_p99_ms": (
+                times[int(len(times) * 0.99)] * 1000 if times else 0.0
+            ),
+            "tick_max_ms": times[-1] * 1000 if times else 0.0,
+            "kbytes_in_per_sec": self.bytes_in / elapsed / 1000,
+            "kbytes_out_per_sec": self.bytes_out / elapsed / 1000,
+            "packets_in_per_sec": self.packets_in / elapsed,
+            "packets_out_per_sec": self.packets_out / elapsed,
+            "entities_per_snapshot": (
+                self.entities_sent / max(self.snapshots, 1)
+            ),
+        }
+        self.reset(now)
+        return report
+
+
+class ClientConnection:
+    """ A connected client: its address, its player, and the snapshots and
+    inputs on their way to and from it.
+    """
+
+    def __init__(self, address: Address, entity_id: int):
+        """ Initialise a newly connected client, with no input yet. """
+        self.address = address
+        self.entity_id = entity_id
+        # The keys held by the client's player, as of the last input used
+        self.keys = key.KeyStateHandler()
+        self.sender = SnapshotSender()
+        # Inputs received but not simulated yet, oldest first
+        self.inputs: Deque[network.InputMessage] = deque()
+        # The sequence number of the last input simulated, and received
+        self.last_simulated = network.NO_SEQUENCE
+        self.last_received = network.NO_SEQUENCE
+        # When we last heard from the client, in event loop time
+        self.last_heard = 0.0
+
+    @property
+    def welcomed(self) -> bool:
+        """ Whether the client has acknowledged a snapshot, and so has been
+        welcomed.
+        """
+        return self.sender.baseline is not None
+
+
+class Server(asyncio.DatagramProtocol):
+    """ Runs a headless `GameManager` on a steady fixed timestep, with a
+    remote player for every client.
+
+    Clients connect by sending their first input. Each tick, every client's
+    oldest waiting input is simulated (keeping the last one held if none
+    has arrived), then every client is sent the last input simulated and a
+    snapshot delta-encoded against the last one it acknowledged. Snapshots
+    only hold the entities in the client's interest set, and every
+    `MINIMAP_INTERVAL` ticks every client is sent where every player is, for
+    the mini-map. Clients that go quiet for `CLIENT_TIMEOUT` seconds are
+    dropped.
+    """
+
+    TIMESTEP = GameManager.FIXED_UPDATE_TIMESTEP
+    # The most ticks to run at once if the server falls behind
+    MAX_TICKS_PER_WAKE = GameManager.MAX_FIXED_UPDATES_PER_FRAME
+    # Seconds without hearing from a client before it is dropped
+    CLIENT_TIMEOUT = 5.0
+    # The most inputs to queue per client, so latency can not build up
+    MAX_QUEUED_INPUTS = 4
+    # Entity ids are sent as 16-bit numbers, and 0 is the local player
+    MAX_CLIENTS = 0xFFFF
+    # Ticks between each mini-map summary
+    MINIMAP_INTERVAL = 30
+
+    transport: Optional[asyncio.DatagramTransport] = None
+
+    def __init__(
+        self,
+        game: Optional[GameManager] = None,
+        spawn_spread: float = 0.0
+    ):
+        """ Initialise with a game (by default, a new headless one without a
+        local player). Players spawn at the origin, or spread over a square
+        `spawn_spread` pixels wide (used by load tests, until rooms have
+        spawn points).
+        """
+        if game is None:
+            game = GameManager(local_player=False)
+        self.game = game
+        self.spawn_spread = spawn_spread
+        self._spawn_random = random.Random(0)
+        self.clients: Dict[Address, ClientConnection] = {}
+        self.interest = InterestManager(game.space)
+        self.metrics = ServerMetrics()
+        self.fixed_timestep = FixedTimestep(
+            self.tick, self.TIMESTEP, self.MAX_TICKS_PER_WAKE
+        )
+        self._next_entity_id = 1
+
+    # Networking
+
+    def connection_made(self, transport: asyncio.BaseTransport):
+        """ Called once the socket is open. """
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, address: Address):
+        """ Called for every datagram received. """
+        self.metrics.bytes_in += len(data)
+        self.metrics.packets_in += 1
+        try:
+            message = network.decode_input(data)
+        except ValueError:
+            return  # Not for us
+
+        client = self.clients.get(address)
+        if client is None:
+            client = self.connect(address)
+            if client is None:
+                return
+        client.last_heard = asyncio.get_running_loop().time()
+
+        if message.ack != NO_BASELINE:
+            client.sender.acknowledge(message.ack)
+        # Inputs are resent until simulated, so queue any we missed.
+        # Datagrams can arrive out of order, and old inputs are no use.
+        for tick_input in message.expand():
+            if (
+                client.last_received != network.NO_SEQUENCE
+                and tick_input.sequence <= client.last_received
+            ):
+                continue
+            client.last_received = tick_input.sequence
+            client.inputs.append(tick_input)
+        while len(client.inputs) > self.MAX_QUEUED_INPUTS:
+            client.inputs.popleft()
+
+    def error_received(self, error: Exception):
+        """ Called when a send or receive fails, e.g. when a client's port
+        has closed. The client will time out.
+        """
+
+    def send(self, data: bytes, address: Address):
+        """ Sends a datagram to a client. """
+        self.metrics.bytes_out += len(data)
+        self.metrics.packets_out += 1
+        self.transport.sendto(data, address)
+
+    def connect(self, address: Address) -> Optional[ClientConnection]:
+        """ Adds a client and its player, None if the server is full. """
+        if len(self.clients) >= self.MAX_CLIENTS:
+            return None
+        while (
+            self._next_entity_id == 0
+            or self._next_entity_id in self.game.remote_players
+        ):
+            self._next_entity_id = (self._next_entity_id + 1) % 0x10000
+        client = ClientConnection(address, self._next_entity_id)
+        self._next_entity_id = (self._next_entity_id + 1) % 0x10000
+
+        position = Vec2(0, 0)
+        if self.spawn_spread:
+            half = self.spawn_spread / 2
+            position = Vec2(
+                round(self._spawn_random.uniform(-half, half)),
+                round(self._spawn_random.uniform(-half, half))
+            )
+        self.game.add_remote_player(client.entity_id, client.keys, position)
+        self.clients[address] = client
+        return client
+
+    def disconnect(self, address: Address):
+        """ Removes a client and its player. """
+        client = self.clients.pop(address)
+        self.game.remove_remote_player(client.entity_id)
+        self.interest.forget(client.entity_id)
+
+    # Simulation
+
+    def tick(self, dt: float):
+        """ Runs one tick: applies every client's input, steps the game and
+        sends every client a snapshot.
+        """
+        start = perf_counter()
+
+        for client in self.clients.values():
+            if not client.inputs:
+                continue  # Keep holding the same keys
+            message = client.inputs.popleft()
+            held = network.from_bitmask(message.held)
+            for symbol in network.INPUT_KEYS:
+                client.keys[symbol] = symbol in held
+            player = self.game.remote_players[client.entity_id]
+            for symbol in network.from_bitmask(message.pressed):
+                player.on_key_press(symbol, 0)
+            client.last_simulated = message.sequence
+
+        self.game.step(dt)
+
+        players = self.game.get_players()
+        snapshot = self.game.get_snapshot()
+        entities = {player: entity_id for entity_id, player in players.items()}
+        for client in self.clients.values():
+            if not client.welcomed:
+                self.send(
+                    network.encode_welcome(client.entity_id, self.TIMESTEP),
+                    client.address
+                )
+            interest = self.interest.update(
+                client.entity_id, players[client.entity_id], entities
+            )
+            self.send(
+                network.encode_update(
+                    client.last_simulated,
+                    client.sender.encode(snapshot.filter(interest))
+                ),
+                client.address
+            )
+            self.metrics.snapshots += 1
+            self.metrics.entities_sent += len(interest)
+
+        if self.game.tick % self.MINIMAP_INTERVAL == 0 and self.clients:
+            minimap = network.encode_minimap(self.game.tick, (
+                (entity.id, entity.x, entity.y)
+                for entity in snapshot.entities.values()
+            ))
+            for client in self.clients.values():
+                self.send(minimap, client.address)
+
+        self.metrics.tick_times.append(perf_counter() - start)
+
+    def drop_quiet_clients(self, now: float):
+        """ Disconnects every client not heard from in `CLIENT_TIMEOUT`. """
+        for address, client in list(self.clients.items()):
+            if now - client.last_heard > self.CLIENT_TIMEOUT:
+                self.disconnect(address)
+
+    async def run(self):
+        """ Ticks the game on a steady schedule, until cancelled. """
+        loop = asyncio.get_running_loop()
+        last = loop.time()
+        while True:
+            now = loop.time()
+            self.fixed_timestep.advance(now - last)
+            last = now
+            self.drop_quiet_clients(now)
+            # Sleep until the next tick is due
+            await asyncio.sleep(
+                self.fixed_timestep.timestep - self.fixed_timestep.accumulator
+            )
+
+
+async def serve(
+    host: str = "0.0.0.0",
+    port: int = 7777,
+    metrics_interval: float = 5.0,
+    server: Optional[Server] = None
+):
+    """ Runs a server on the given address until cancelled, printing its
+    metrics every `metrics_interval` seconds (never if 0).
+    """
+    if server is None:
+        server = Server()
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: server, local_addr=(host, port)
+    )
+    print(f"Serving on {host}:{port}")
+
+    async def report_metrics():
+        while True:
+            await asyncio.sleep(metrics_interval)
+            report = server.metrics.report(len(server.clients))
+            print(
+                f"clients: {report['clients']}, "
+                f"ticks/s: {report['ticks_per_sec']:.1f}, "
+                f"tick: {report['tick_mean_ms']:.2f} ms "
+                f"(p99 {report['tick_p99_ms']:.2f}, "
+                f"max {report['tick_max_ms']:.2f}), "
+                f"in: {report['kbytes_in_per_sec']:.1f} kB/s, "
+                f"out: {report['kbytes_out_per_sec']:.1f} kB/s, "
+                f"entities/snapshot: {report['entities_per_snapshot']:.1f}"
+            )
+
+    tasks = [asyncio.ensure_future(server.run())]
+    if metrics_interval > 0:
+        tasks.append(asyncio.ensure_future(report_metrics()))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        transport.close()
@@ -0,0 +1,386 @@
+""" Binary snapshots of the game's entities, delta-encoded for sending to
+clients.
+
+Classes:
+
+    EntityState
+    Snapshot
+    SnapshotSender
+    SnapshotReceiver
+
+Functions:
+
+    capture_body
+    capture_player
+    encode_ack
+    decode_ack
+"""
+
+from __future__ import annotations  # NOTE: This is necessary below Python 3.10
+
+from .body import Body
+
+from pyglet.math import Vec2
+
+import struct
+from typing import (
+    Dict, Iterable, List, NamedTuple, Optional, Tuple, TYPE_CHECKING
+)
+
+# Only import the player for type hints
+if TYPE_CHECKING:
+    from .player import Player
+
+# The baseline tick of a snapshot encoded against nothing
+NO_BASELINE = 0xFFFFFFFF
+
+# Each field that can change, as (index into `EntityState`, struct format).
+# Positions are whole pixels, and velocities whole pixels per tick.
+FIELDS = (
+    (1, "i"),  # x
+    (2, "i"),  # y
+    (3, "h"),  # vx
+    (4, "h"),  # vy
+    (5, "B"),  # state
+)
+# The field mask with every field set
+ALL_FIELDS = (1 << len(FIELDS)) - 1
+# The smallest and largest values of the position and velocity fields
+POSITION_LIMITS = (-(1 << 31), (1 << 31) - 1)
+VELOCITY_LIMITS = (-(1 << 15), (1 << 15) - 1)
+
+ZERO = Vec2(0, 0)
+
+
+class EntityState(NamedTuple):
+    """ The state of an entity on a tick, quantised to the pixel grid. """
+    id: int
+    x: int
+    y: int
+    vx: int
+    vy: int
+    state: int
+
+
+def capture_body(
+    entity_id: int,
+    body: Body,
+    velocity: Vec2 = ZERO,
+    state: int = 0
+) -> EntityState:
+    """ Captures a body's state, given its velocity in pixels per tick.
+    Positions and velocities too big for their fields (e.g. a teleport seen
+    as one tick's movement) are clamped, so every state can be encoded.
+    """
+    return EntityState(
+        entity_id,
+        _clamp(body.global_x, POSITION_LIMITS),
+        _clamp(body.global_y, POSITION_LIMITS),
+        _clamp(velocity.x, VELOCITY_LIMITS),
+        _clamp(velocity.y, VELOCITY_LIMITS),
+        state,
+    )
+
+
+def _clamp(value: float, limits: Tuple[int, int]) -> int:
+    """ Rounds a value to the pixel grid, within the limits of a field. """
+    low, high = limits
+    return min(max(round(value), low), high)
+
+
+def capture_player(entity_id: int, player: Player) -> EntityState:
+    """ Captures a player's state. Its velocity is how far it moved on the
+    last tick.
+    """
+    return capture_body(
+        entity_id,
+        player,
+        player.global_position - player.previous_position,
+        player.state.value
+    )
+
+
+class Snapshot:
+    """ The state of every entity on a tick.
+
+    Snapshots are encoded against a baseline, the last snapshot the receiver
+    acknowledged: only the entities that changed since then are sent, each
+    as its id, a bitmask of the changed fields and then each changed field,
+    followed by the ids of the entities removed since then. Entities which
+    did not change are not sent at all. Without a baseline, every field of
+    every entity is sent.
+
+    Layout (little-endian), see `encode`:
+
+        Header: magic, version, tick, baseline tick, changed count, removed
+                count
+        Changed: each entity's id and field mask, then each field in the mask
+                 (x, y: int32, vx, vy: int16, state: uint8)
+        Removed: each entity's id
+    """
+
+    MAGIC = b"NS"
+    VERSION = 1
+
+    # Formats of each part, see `struct`
+    _HEADER = struct.Struct("<2sBIIHH")
+    _ID = struct.Struct("<H")
+
+    # The format of a changed entity with each field mask, created on use
+    _CHANGED: Dict[int, struct.Struct] = {}
+
+    __slots__ = ("tick", "entities")
+
+    def __init__(self, tick: int, entities: Dict[int, EntityState]):
+        """ Initialise with the tick and every entity, by id. """
+        self.tick = tick
+        self.entities = entities
+
+    @classmethod
+    def from_entities(cls, tick: int, entities: List[EntityState]) -> Snapshot:
+        """ Creates a snapshot of a list of entities. """
+        return cls(tick, {entity.id: entity for entity in entities})
+
+    def filter(self, entity_ids: Iterable[int]) -> Snapshot:
+        """ Gets a snapshot of only the given entities (those present). """
+        entities = self.entities
+        return Snapshot(self.tick, {
+            entity_id: entities[entity_id]
+            for entity_id in entity_ids if entity_id in entities
+        })
+
+    @classmethod
+    def _get_changed_struct(cls, mask: int) -> struct.Struct:
+        """ Gets the format of a changed entity with the given field mask. """
+        changed = cls._CHANGED.get(mask)
+        if changed is None:
+            formats = "".join(
+                fmt for bit, (_, fmt) in enumerate(FIELDS) if mask & 1 << bit
+            )
+            changed = cls._CHANGED[mask] = struct.Struct("<HB" + formats)
+        return changed
+
+    def encode(self, baseline: Optional[Snapshot] = None) -> bytes:
+        """ Encodes the snapshot, against a baseline if given. """
+        old_entities = baseline.entities if baseline is not None else {}
+
+        parts = [b""]  # Room for the header
+        for entity_id, entity in self.entities.items():
+            old = old_entities.get(entity_id)
+            if old is None:
+                mask = ALL_FIELDS
+            elif old == entity:
+                continue
+            else:
+                mask = 0
+                for bit, (index, _) in enumerate(FIELDS):
+                    if entity[index] != old[index]:
+                        mask |= 1 << bit
+            parts.append(self._get_changed_struct(mask).pack(
+                entity_id, mask,
+                *(
+                    entity[index] for bit, (index, _) in enumerate(FIELDS)
+                    if mask & 1 << bit
+                )
+            ))
+        changed = len(parts) - 1
+
+        removed = [
+            entity_id for entity_id in old_entities
+            if entity_id not in self.entities
+        ]
+        parts.extend(self._ID.pack(entity_id) for entity_id in removed)
+
+        parts[0] = self._HEADER.pack(
+            self.MAGIC, self.VERSION,
+            self.tick,
+            baseline.tick if baseline is not None else NO_BASELINE,
+            changed, len(removed)
+        )
+        return b"".join(parts)
+
+    @classmethod
+    def read_header(cls, data: bytes) -> Tuple[int, int]:
+        """ Reads the tick and baseline tick of an encoded snapshot, raising
+        `ValueError` if it is not a snapshot.
+        """
+        if len(data) < cls._HEADER.size:
+            raise ValueError("Snapshot is too short")
+        magic, version, tick, baseline_tick, _, _ = cls._HEADER.unpack_from(
+            data
+        )
+        if magic != cls.MAGIC:
+            raise ValueError("Not a snapshot")
+        if version != cls.VERSION:
+            raise ValueError(f"Unsupported snapshot version {version}")
+        return tick, baseline_tick
+
+    @classmethod
+    def decode(
+        cls,
+        data: bytes,
+        baseline: Optional[Snapshot] = None
+    ) -> Snapshot:
+        """ Decodes a snapshot, which must have been encoded against the
+        given baseline. Raises `ValueError` if it is damaged or was encoded
+        against a different baseline.
+        """
+        tick, baseline_tick = cls.read_header(data)
+        expected = baseline.tick if baseline is not None else NO_BASELINE
+        if baseline_tick != expected:
+            raise ValueError(
+                f"Snapshot {tick} needs baseline {baseline_tick}, "
+                f"not {expected}"
+            )
+        _, _, _, _, changed, removed = cls._HEADER.unpack_from(data)
+
+        entities = dict(baseline.entities) if baseline is not None else {}
+        offset = cls._HEADER.size
+        try:
+            for _ in range(changed):
+                entity_id, mask = cls._get_changed_struct(0).unpack_from(
+                    data, offset
+                )
+                changed_struct = cls._get_changed_struct(mask)
+                values = changed_struct.unpack_from(data, offset)[2:]
+                offset += changed_struct.size
+
+                old = entities.get(entity_id)
+                if old is None:
+                    if mask != ALL_FIELDS:
+                        raise ValueError(
+                            f"Entity {entity_id} is new, but not every "
+                            "field was sent"
+                        )
+                    fields = [entity_id, *values]
+                else:
+                    fields = list(old)
+                    value = iter(values)
+                    for bit, (index, _) in enumerate(FIELDS):
+                        if mask & 1 << bit:
+                            fields[index] = next(value)
+                entities[entity_id] = EntityState(*fields)
+
+            for _ in range(removed):
+                entity_id, = cls._ID.unpack_from(data, offset)
+                offset += cls._ID.size
+                entities.pop(entity_id, None)
+        except struct.error as error:
+            raise ValueError(f"Snapshot is damaged: {error}") from None
+
+        return cls(tick, entities)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Snapshot):
+            return NotImplemented
+        return self.tick == other.tick and self.entities == other.entities
+
+    def __repr__(self) -> str:
+        return f"Snapshot({self.tick}, {len(self.entities)} entities)"
+
+
+class SnapshotSender:
+    """ Encodes the snapshots sent to one client, each against the latest
+    snapshot the client has acknowledged.
+
+    The last `history` snapshots sent are kept, so an acknowledgement of any
+    of them can be used as the next baseline. Until the first one is
+    acknowledged (or if acknowledgements stop arriving for too long),
+    snapshots are sent in full.
+    """
+
+    # The default number of snapshots to keep
+    DEFAULT_HISTORY = 64
+
+    def __init__(self, history: int = DEFAULT_HISTORY):
+        """ Initialise with nothing sent yet. """
+        self.history = history
+        # The snapshots sent, by tick, oldest first
+        self.sent: Dict[int, Snapshot] = {}
+        # The latest snapshot acknowledged, None until one is
+        self.baseline: Optional[Snapshot] = None
+
+    def encode(self, snapshot: Snapshot) -> bytes:
+        """ Encodes the next snapshot to send. """
+        # Don't use a baseline the client may have forgotten
+        if (
+            self.baseline is not None
+            and snapshot.tick - self.baseline.tick >= self.history
+        ):
+            self.baseline = None
+        data = snapshot.encode(self.baseline)
+
+        self.sent[snapshot.tick] = snapshot
+        while len(self.sent) > self.history:
+            del self.sent[next(iter(self.sent))]
+        return data
+
+    def acknowledge(self, tick: int):
+        """ Called when the client acknowledges the snapshot of a tick. Older
+        (or unknown) acknowledgements are ignored.
+        """
+        snapshot = self.sent.get(tick)
+        if snapshot is None:
+            return
+        if self.baseline is None or tick > self.baseline.tick:
+            self.baseline = snapshot
+
+
+class SnapshotReceiver:
+    """ Decodes the snapshots received from the server, keeping the last
+    `history` of them as baselines for later snapshots.
+    """
+
+    DEFAULT_HISTORY = SnapshotSender.DEFAULT_HISTORY
+
+    def __init__(self, history: int = DEFAULT_HISTORY):
+        """ Initialise with nothing received yet. """
+        self.history = history
+        # The snapshots received, by tick, oldest first
+        self.received: Dict[int, Snapshot] = {}
+        # The newest snapshot received, None until one is
+        self.latest: Optional[Snapshot] = None
+
+    def receive(self, data: bytes) -> Optional[Snapshot]:
+        """ Decodes a received snapshot. Returns None if it is older than the
+        latest one (datagrams can arrive out of order), or if its baseline
+        has been forgotten. Raises `ValueError` if it is damaged.
+        """
+        tick, baseline_tick = Snapshot.read_header(data)
+        if self.latest is not None and tick <= self.latest.tick:
+            return None
+
+        baseline = None
+        if baseline_tick != NO_BASELINE:
+            baseline = self.received.get(baseline_tick)
+            if baseline is None:
+                return None
+
+        snapshot = Snapshot.decode(data, baseline)
+        self.received[tick] = snapshot
+        while len(self.received) > self.history:
+            del self.received[next(iter(self.received))]
+        self.latest = snapshot
+        return snapshot
+
+
+# The format of an acknowledgement: magic, tick
+_ACK = struct.Struct("<2sI")
+ACK_MAGIC = b"NA"
+
+
+def encode_ack(tick: int) -> bytes:
+    """ Encodes an acknowledgement of the snapshot of a tick. """
+    return _ACK.pack(ACK_MAGIC, tick)
+
+
+def decode_ack(data: bytes) -> int:
+    """ Decodes an acknowledgement, returning its tick. Raises `ValueError`
+    if it is not an acknowledgement.
+    """
+    if len(data) != _ACK.size:
+        raise ValueError("Not an acknowledgement")
+    magic, tick = _ACK.unpack(data)
+    if magic != ACK_MAGIC:
+        raise ValueError("Not an acknowledgement")
+    return tick
@@ -1,16 +1,507 @@
-""" Contains type definition for Space.
+""" The physics space, a collection of bounding boxes split into static
+geometry and dynamic bodies.
 
 Classes:
 
+    SpatialHash
+    StaticIndex
     Space
 """
 
+from __future__ import annotations  # NOTE: This is necessary below Python 3.10
+
 # Import the Axis-Aligned Bounding Box class, defined `aabb.py`
 from .aabb import AABB
+from .sweep_and_prune import SweepAndPrune
+
+# `floor` is used to find which grid cell a coordinate falls into
+from math import floor, inf
+from typing import (
+    Dict, Iterable, Iterator, List, Optional, Tuple, TYPE_CHECKING, Union
+)
+
+# Only import the physics world for type hints, as it imports this module
+if TYPE_CHECKING:
+    from .physics_world import PhysicsWorld
+
+# A cell is identified by its column and row in the grid
+Cell = Tuple[int, int]
+# A range of cells: (first column, first row, last column, last row)
+CellRange = Tuple[int, int, int, int]
+
+# The default width and height of each grid cell, in pixels
+DEFAULT_CELL_SIZE = 32
+
+
+def get_cell_range(
+    cell_size: float,
+    x: float, y: float, w: float, h: float
+) -> CellRange:
+    """ Gets the range of cells overlapped by the given rectangle. """
+    return (
+        floor(x / cell_size),
+        floor(y / cell_size),
+        floor((x + w) / cell_size),
+        floor((y + h) / cell_size),
+    )
+
+
+class SpatialHash:
+    """ A collection of bounding boxes, stored in a uniform-grid spatial hash.
+
+    The world is split into square cells of `cell_size`, and each box is
+    filed under every cell it overlaps. A broad-phase query only needs to
+    look at the cells overlapping the queried rectangle, rather than every
+    box in the space.
+
+    Boxes are filed using their global position, so a box must be re-filed
+    with `move` after it (or its parent) has moved.
+    """
+
+    def __init__(self, cell_size: float = DEFAULT_CELL_SIZE):
+        """ Initialise an empty hash with the given cell size. """
+        self.cell_size = cell_size
+
+        # Map each cell to the boxes inside it.
+        # NOTE: We use dictionaries with `None` values instead of sets
+        #       because dictionaries remember their insertion order, which
+        #       keeps queries (and so the physics) deterministic.
+        self._cells: Dict[Cell, Dict[AABB, None]] = {}
+        # Map each box to the range of cells it is currently filed under
+        self._boxes: Dict[AABB, CellRange] = {}
+
+    def _get_box_cell_range(self, box: AABB) -> CellRange:
+        """ Gets the range of cells overlapped by a box in global space. """
+        return get_cell_range(
+            self.cell_size,
+            box.global_x, box.global_y, box.w, box.h
+        )
+
+    def _insert(self, box: AABB, cell_range: CellRange):
+        """ Files the box under every cell in the range. """
+        x1, y1, x2, y2 = cell_range
+        for cx in range(x1, x2 + 1):
+            for cy in range(y1, y2 + 1):
+                # Create the cell if this is the first box in it
+                self._cells.setdefault((cx, cy), {})[box] = None
+        self._boxes[box] = cell_range
+
+    def _erase(self, box: AABB, cell_range: CellRange):
+        """ Removes the box from every cell in the range. """
+        x1, y1, x2, y2 = cell_range
+        for cx in range(x1, x2 + 1):
+            for cy in range(y1, y2 + 1):
+                cell = self._cells[(cx, cy)]
+                del cell[box]
+                # Drop empty cells so the hash does not grow forever
+                if not cell:
+                    del self._cells[(cx, cy)]
+        del self._boxes[box]
+
+    def add(self, box: AABB):
+        """ Adds a box to the hash, does nothing if it is already present. """
+        if box not in self._boxes:
+            self._insert(box, self._get_box_cell_range(box))
+
+    def remove(self, box: AABB):
+        """ Removes a box from the hash, raises `KeyError` if it is not
+        present.
+        """
+        self._erase(box, self._boxes[box])
+
+    def discard(self, box: AABB):
+        """ Removes a box from the hash if it is present. """
+        if box in self._boxes:
+            self.remove(box)
+
+    def move(self, box: AABB):
+        """ Re-files a box that has moved since it was added. Only touches the
+        hash if the box has crossed into a different range of cells.
+        """
+        old_range = self._boxes[box]
+        new_range = self._get_box_cell_range(box)
+        if new_range != old_range:
+            self._erase(box, old_range)
+            self._insert(box, new_range)
+
+    def query_rect(self, x: float, y: float, w: float, h: float) -> List[AABB]:
+        """ Broad-phase query: returns every box filed under a cell that
+        overlaps the given rectangle, in global space.
+
+        The result may contain boxes that do not actually overlap the
+        rectangle, so a narrow-phase check is still needed.
+        """
+        x1, y1, x2, y2 = get_cell_range(self.cell_size, x, y, w, h)
+        cells = self._cells
+
+        # Use a dictionary to remove duplicates, since large boxes will be
+        # filed under more than one cell.
+        found: Dict[AABB, None] = {}
+        for cx in range(x1, x2 + 1):
+            for cy in range(y1, y2 + 1):
+                cell = cells.get((cx, cy))
+                if cell is not None:
+                    found.update(cell)
+        return list(found)
+
+    def query(self, box: AABB) -> List[AABB]:
+        """ Broad-phase query using the global area of a box. """
+        return self.query_rect(box.global_x, box.global_y, box.w, box.h)
+
+    def get_pairs(self) -> List[Tuple[AABB, AABB]]:
+        """ Gets every pair of boxes in the hash that currently overlap.
+        Each pair is ordered by when its boxes were added.
+        """
+        pairs: List[Tuple[AABB, AABB]] = []
+        # Boxes we have already found every pair for
+        done: Dict[AABB, None] = {}
+        for box in self._boxes:
+            for other in self.query(box):
+                if (
+                    other is not box
+                    and other not in done
+                    and box.is_colliding_aabb(other)
+                ):
+                    pairs.append((box, other))
+            done[box] = None
+        return pairs
+
+    def get_overlapping(self, box: AABB) -> List[AABB]:
+        """ Gets every other box in the hash that currently overlaps the
+        given box.
+        """
+        return [
+            other for other in self.query(box)
+            if other is not box and box.is_colliding_aabb(other)
+        ]
+
+    def __iter__(self) -> Iterator[AABB]:
+        """ Iterates over every box in the hash. """
+        return iter(self._boxes)
+
+    def __contains__(self, box: object) -> bool:
+        """ Checks if a box is in the hash. """
+        return box in self._boxes
+
+    def __len__(self) -> int:
+        """ The number of boxes in the hash. """
+        return len(self._boxes)
+
+
+class StaticIndex:
+    """ An immutable, query-optimised index of boxes that never move.
+
+    The boxes are bucketed by grid cell once when the index is built, and
+    each bucket is frozen into a tuple. Nothing is ever re-filed, so building
+    a new index is the only way to change it (e.g. when a room loads).
+    """
+
+    def __init__(
+        self,
+        boxes: Iterable[AABB] = (),
+        cell_size: float = DEFAULT_CELL_SIZE
+    ):
+        """ Bake the given boxes into the index. """
+        self.cell_size = cell_size
+
+        # Keep the boxes in the order they were given, for deterministic
+        # queries.
+        self._boxes: Tuple[AABB, ...] = tuple(dict.fromkeys(boxes))
+
+        # Bucket the boxes using a temporary list per cell...
+        buckets: Dict[Cell, List[AABB]] = {}
+        for box in self._boxes:
+            x1, y1, x2, y2 = get_cell_range(
+                cell_size,
+                box.global_x, box.global_y, box.w, box.h
+            )
+            for cx in range(x1, x2 + 1):
+                for cy in range(y1, y2 + 1):
+                    buckets.setdefault((cx, cy), []).append(box)
+        # ...then freeze every bucket into a tuple.
+        self._cells: Dict[Cell, Tuple[AABB, ...]] = {
+            cell: tuple(bucket) for cell, bucket in buckets.items()
+        }
+        # Most boxes sit in a single cell, so remember if any do not: if none
+        # do, queries do not need to remove duplicates.
+        filed = sum(len(bucket) for bucket in self._cells.values())
+        self._has_large_boxes = filed > len(self._boxes)
+
+    def query_rect(self, x: float, y: float, w: float, h: float) -> List[AABB]:
+        """ Broad-phase query, see `SpatialHash.query_rect`. """
+        x1, y1, x2, y2 = get_cell_range(self.cell_size, x, y, w, h)
+        cells = self._cells
+
+        found: List[AABB] = []
+        for cx in range(x1, x2 + 1):
+            for cy in range(y1, y2 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is not None:
+                    found.extend(bucket)
+
+        if self._has_large_boxes:
+            # Remove duplicates, keeping the order
+            return list(dict.fromkeys(found))
+        return found
+
+    def query(self, box: AABB) -> List[AABB]:
+        """ Broad-phase query using the global area of a box. """
+        return self.query_rect(box.global_x, box.global_y, box.w, box.h)
+
+    def __iter__(self) -> Iterator[AABB]:
+        """ Iterates over every box in the index. """
+        return iter(self._boxes)
+
+    def __contains__(self, box: object) -> bool:
+        """ Checks if a box is in the index. """
+        return box in self._boxes
+
+    def __len__(self) -> int:
+        """ The number of boxes in the index. """
+        return len(self._boxes)
+
+
+# The collections `Space` can store its dynamic boxes in
+DynamicBoxes = Union[SpatialHash, SweepAndPrune]
+
+
+class Space:
+    """ The physics space: every bounding box that can be collided with.
+
+    Boxes are kept in two groups:
+    - Static boxes (walls, tiles) never move. They are baked into a
+      `StaticIndex` once, and only rebuilt when the static geometry changes
+      (e.g. when a room loads).
+    - Dynamic boxes (bodies) move every tick. They live in a `SpatialHash`
+      (or a `SweepAndPrune`, if one is given) and must be re-filed with
+      `move` after moving.
+
+    Queries test against the baked index plus the (small) dynamic set.
+
+    A `PhysicsWorld` can also be attached, in which case its bodies are
+    included in query results, but are not members of the space itself.
+    """
+
+    def __init__(
+        self,
+        cell_size: float = DEFAULT_CELL_SIZE,
+        dynamic: Optional[DynamicBoxes] = None
+    ):
+        """ Initialise an empty space with the given cell size. The dynamic
+        boxes are stored in a new `SpatialHash`, unless another (empty)
+        collection such as a `SweepAndPrune` is given.
+        """
+        self.cell_size = cell_size
+
+        # Dynamic boxes
+        if dynamic is None:
+            dynamic = SpatialHash(cell_size)
+        self._dynamic: DynamicBoxes = dynamic
+
+        # Static boxes waiting to be baked, and the index they were baked to.
+        self._static: Dict[AABB, None] = {}
+        self._static_index = StaticIndex((), cell_size)
+        # Whether `_static` has changed since the index was last baked
+        self._static_dirty = False
+
+        # Physics worlds whose bodies are included in queries
+        self.worlds: List[PhysicsWorld] = []
+
+    def add(self, box: AABB):
+        """ Adds a dynamic box to the space. """
+        self._dynamic.add(box)
+
+    def add_static(self, box: AABB):
+        """ Adds a static box to the space. The static index is re-baked
+        before the next query.
+        """
+        if box not in self._static:
+            self._static[box] = None
+            self._static_dirty = True
+
+    def load_static(self, boxes: Iterable[AABB]):
+        """ Replaces all static boxes in the space and bakes them straight
+        away, call this when a room loads.
+        """
+        self._static = dict.fromkeys(boxes)
+        self.bake()
+
+    def bake(self):
+        """ Rebuilds the static index from the current static boxes. """
+        self._static_index = StaticIndex(self._static, self.cell_size)
+        self._static_dirty = False
+
+    def remove(self, box: AABB):
+        """ Removes a static or dynamic box from the space, raises `KeyError`
+        if it is not present.
+        """
+        if box in self._dynamic:
+            self._dynamic.remove(box)
+        else:
+            del self._static[box]
+            self._static_dirty = True
+
+    def discard(self, box: AABB):
+        """ Removes a box from the space if it is present. """
+        if box in self:
+            self.remove(box)
+
+    def move(self, box: AABB):
+        """ Re-files a dynamic box that has moved since it was added. """
+        self._dynamic.move(box)
+
+    def attach_world(self, world: PhysicsWorld):
+        """ Includes a physics world's bodies in this space's queries. """
+        if world not in self.worlds:
+            self.worlds.append(world)
+
+    @property
+    def static_index(self) -> StaticIndex:
+        """ The baked index of static boxes, re-baked first if needed. """
+        if self._static_dirty:
+            self.bake()
+        return self._static_index
+
+    @property
+    def dynamic(self) -> DynamicBoxes:
+        """ The collection of dynamic boxes. """
+        return self._dynamic
+
+    def is_static(self, box: AABB) -> bool:
+        """ Checks if a box is one of the space's static boxes. """
+        return box in self._static
+
+    def query_rect(self, x: float, y: float, w: float, h: float) -> List[AABB]:
+        """ Broad-phase query: returns every static and dynamic box that may
+        overlap the given rectangle, in global space.
+        """
+        found = self.static_index.query_rect(x, y, w, h)
+        found.extend(self._dynamic.query_rect(x, y, w, h))
+        for world in self.worlds:
+            found.extend(world.query_rect(x, y, w, h))
+        return found
+
+    def query(self, box: AABB) -> List[AABB]:
+        """ Broad-phase query using the global area of a box. """
+        return self.query_rect(box.global_x, box.global_y, box.w, box.h)
+
+    def get_overlapping_pairs(self) -> List[Tuple[AABB, AABB]]:
+        """ Gets every pair of boxes that overlap this tick, where at least
+        one of them is dynamic (static boxes never move, so are not paired
+        with each other). Dynamic pairs come first, then each dynamic box
+        paired with the static boxes it overlaps.
+
+        Layers are not checked, so the caller can decide which pairs matter,
+        e.g. a door trigger only cares about pairs containing the player.
+        """
+        pairs = self._dynamic.get_pairs()
+        static_index = self.static_index
+        for box in self._dynamic:
+            for other in static_index.query(box):
+                if box.is_colliding_aabb(other):
+                    pairs.append((box, other))
+        return pairs
+
+    def get_overlapping(self, box: AABB) -> List[AABB]:
+        """ Gets every static or dynamic box overlapping a dynamic box this
+        tick, not including the box itself.
+        """
+        found = [
+            other for other in self.static_index.query(box)
+            if box.is_colliding_aabb(other)
+        ]
+        found.extend(self._dynamic.get_overlapping(box))
+        return found
+
+    def walk_sweep(
+        self,
+        x: float, y: float, w: float, h: float,
+        vx: float, vy: float
+    ) -> Iterator[Tuple[float, float, List[AABB]]]:
+        """ Walks a rect's swept path through the grid cell by cell, in the
+        order it reaches them (a DDA traversal, following the rect's leading
+        corner).
+
+        The path is split into segments wherever the leading corner crosses
+        a cell boundary. For each segment, this yields its start and end time
+        (from 0 to 1 across the whole path) and any boxes near that part of
+        the path which were not yielded by an earlier segment. A box first
+        yielded by a segment cannot be reached before that segment's start
+        time, so a caller can stop walking as soon as it has found a
+        collision that happens before the end of the current segment. The
+        cost is then proportional to the distance travelled, rather than to
+        the size of the whole path's broad-phase.
+        """
+        size = self.cell_size
+
+        # For each axis, find the time the leading corner reaches its first
+        # cell boundary (`next_x`), and the time it takes to cross a whole
+        # cell (`delta_x`).
+        if vx > 0:
+            lead_x = x + w
+            next_x = ((floor(lead_x / size) + 1) * size - lead_x) / vx
+            delta_x = size / vx
+        elif vx < 0:
+            lead_x = x
+            next_x = (floor(lead_x / size) * size - lead_x) / vx
+            delta_x = size / -vx
+        else:
+            next_x = delta_x = inf
+
+        if vy > 0:
+            lead_y = y + h
+            next_y = ((floor(lead_y / size) + 1) * size - lead_y) / vy
+            delta_y = size / vy
+        elif vy < 0:
+            lead_y = y
+            next_y = (floor(lead_y / size) * size - lead_y) / vy
+            delta_y = size / -vy
+        else:
+            next_y = delta_y = inf
+
+        seen: Dict[AABB, None] = {}
+        start = 0.0
+        while True:
+            end = min(next_x, next_y, 1.0)
+
+            # The broad-phase of just this segment of the path
+            segment_x = x + vx * start
+            segment_y = y + vy * start
+            segment_vx = vx * (end - start)
+            segment_vy = vy * (end - start)
+            found = self.query_rect(
+                min(segment_x, segment_x + segment_vx),
+                min(segment_y, segment_y + segment_vy),
+                w + abs(segment_vx),
+                h + abs(segment_vy),
+            )
+
+            # Only yield the boxes we have not seen yet
+            new = [box for box in found if box not in seen]
+            seen.update(dict.fromkeys(new))
+            yield start, end, new
+
+            if end >= 1.0:
+                break
+
+            # Step into the next cell on whichever axis crossed a boundary
+            if next_x == end:
+                next_x += delta_x
+            if next_y == end:
+                next_y += delta_y
+            start = end
+
+    # The following methods let the space be used like the `Set` it replaced,
+    # so `for box in space`, `box in space` and `len(space)` still work.
+    def __iter__(self) -> Iterator[AABB]:
+        """ Iterates over every static box, then every dynamic box. """
+        yield from self._static
+        yield from self._dynamic
 
-# Use a `Set`, as it is faster than a `List` and the space does not need to be
-# sorted in any particular order.
-from typing import Set
+    def __contains__(self, box: object) -> bool:
+        """ Checks if a box is in the space. """
+        return box in self._dynamic or box in self._static
 
-# Define as type hint
-Space = Set[AABB]
+    def __len__(self) -> int:
+        """ The number of boxes in the space. """
+        return len(self._static) + len(self._dynamic)
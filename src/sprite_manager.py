@@ -0,0 +1,202 @@
+""" Array-backed vertex updates for many `ZSprite`s at once.
+
+Classes:
+
+    ZSpriteManager
+"""
+
+from __future__ import annotations  # NOTE: This is necessary below Python 3.10
+
+import numpy as np
+
+from typing import Dict, List, Tuple, TYPE_CHECKING
+
+# Only import the sprite class for type hints, as it imports this module
+if TYPE_CHECKING:
+    from .zsprite import ZSprite
+
+# The columns of `ZSpriteManager.states`
+X, Y, Z, SCALE_X, SCALE_Y, ROTATION = range(6)
+ANCHOR_X, ANCHOR_Y, WIDTH, HEIGHT, VISIBLE = range(6, 11)
+COLUMNS = 11
+
+
+class ZSpriteManager:
+    """ Stores the position, Z, scale, rotation, image size and visibility of
+    every managed sprite in a numpy array, one row per sprite.
+
+    Changing a managed sprite only marks it as dirty, so a sprite changed
+    several times in a frame (moved, flipped and rotated) is only updated
+    once. Once per frame, `flush` gathers every dirty sprite's values into
+    its row, works out the corners of every dirty quad in one vectorised
+    pass, and writes them straight into the batch's vertex buffers, one
+    write per buffer.
+    """
+
+    # How many sprites to make room for when the manager is created
+    INITIAL_CAPACITY = 64
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        """ Initialise an empty manager. """
+        self.states = np.zeros((capacity, COLUMNS))
+        # The sprite in each row
+        self.sprites: List[ZSprite] = []
+        # The rows changed since the last flush
+        self.dirty: Dict[int, None] = {}
+
+    def _grow(self):
+        """ Doubles the capacity of the array. """
+        states = np.zeros((len(self.states) * 2, COLUMNS))
+        states[:len(self.sprites)] = self.states[:len(self.sprites)]
+        self.states = states
+
+    def add(self, sprite: ZSprite) -> int:
+        """ Adds a row for the sprite, returning its index. """
+        if len(self.sprites) == len(self.states):
+            self._grow()
+        index = len(self.sprites)
+        self.sprites.append(sprite)
+        return index
+
+    def remove(self, sprite: ZSprite):
+        """ Removes a sprite. The last row is moved into the removed sprite's
+        row to keep the arrays contiguous.
+        """
+        index = sprite._manager_index
+        last = len(self.sprites) - 1
+        self.dirty.pop(index, None)
+        if index != last:
+            moved = self.sprites[last]
+            self.states[index] = self.states[last]
+            self.sprites[index] = moved
+            moved._manager_index = index
+            if self.dirty.pop(last, 0) is None:
+                self.dirty[index] = None
+        self.sprites.pop()
+
+    def update(self, sprite: ZSprite):
+        """ Marks a sprite as changed, to be redrawn by the next `flush`. """
+        self.dirty[sprite._manager_index] = None
+
+    def get_vertices(self, rows: np.ndarray) -> np.ndarray:
+        """ Works out the four corners of each row's quad, with the same
+        operations in the same order as `ZSprite._update_position`, so the
+        results are identical.
+
+        Returns:
+
+            Array of (x, y, z) for each corner, shape (N, 4, 3).
+
+            np.ndarray
+        """
+        states = self.states[rows]
+        scale_x = states[:, SCALE_X, None]
+        scale_y = states[:, SCALE_Y, None]
+        anchor_x = states[:, ANCHOR_X, None]
+        anchor_y = states[:, ANCHOR_Y, None]
+        width = states[:, WIDTH, None]
+        height = states[:, HEIGHT, None]
+        x = states[:, X, None]
+        y = states[:, Y, None]
+
+        # Unrotated sprites are offset from their position...
+        # NOTE: A scale of 1 leaves the anchor and size unchanged, so this
+        #       also matches the unscaled case.
+        x1 = x - anchor_x * scale_x
+        y1 = y - anchor_y * scale_y
+        x2 = x1 + width * scale_x
+        y2 = y1 + height * scale_y
+        corners_x = np.concatenate((x1, x2, x2, x1), axis=1)
+        corners_y = np.concatenate((y1, y1, y2, y2), axis=1)
+
+        # ...and rotated sprites are rotated clockwise about it
+        rotated = states[:, ROTATION] != 0
+        if rotated.any():
+            r = -np.radians(states[rotated, ROTATION])[:, None]
+            cr = np.cos(r)
+            sr = np.sin(r)
+            x1 = -anchor_x[rotated] * scale_x[rotated]
+            y1 = -anchor_y[rotated] * scale_y[rotated]
+            x2 = x1 + width[rotated] * scale_x[rotated]
+            y2 = y1 + height[rotated] * scale_y[rotated]
+            local_x = np.concatenate((x1, x2, x2, x1), axis=1)
+            local_y = np.concatenate((y1, y1, y2, y2), axis=1)
+            corners_x[rotated] = local_x * cr - local_y * sr + x[rotated]
+            corners_y[rotated] = local_x * sr + local_y * cr + y[rotated]
+
+        vertices = np.empty((len(rows), 4, 3))
+        vertices[:, :, 0] = corners_x
+        vertices[:, :, 1] = corners_y
+        vertices[:, :, 2] = states[:, Z, None]
+
+        # Invisible sprites are collapsed to a point
+        vertices[states[:, VISIBLE] == 0] = 0
+        return vertices
+
+    def flush(self):
+        """ Writes the vertices of every dirty sprite into its vertex list.
+        Call once per frame, before drawing.
+        """
+        if not self.dirty:
+            return
+        rows = np.fromiter(self.dirty, dtype=np.int64, count=len(self.dirty))
+        self.dirty.clear()
+        self._write(rows)
+
+    def write(self, sprite: ZSprite):
+        """ Writes a sprite's vertices straight away, rather than at the next
+        `flush`. Used when its vertex list has just been created, and so has
+        no vertices yet.
+        """
+        index = sprite._manager_index
+        self.dirty.pop(index, None)
+        self._write(np.array([index], dtype=np.int64))
+
+    def _write(self, rows: np.ndarray):
+        """ Writes the vertices of each row's sprite into its vertex list. """
+        # Gather the sprites' values into their rows
+        sprites = self.sprites
+        self.states[rows] = [
+            (
+                sprite._x, sprite._y, sprite._z,
+                sprite._scale * sprite._scale_x,
+                sprite._scale * sprite._scale_y,
+                sprite._rotation,
+                sprite._texture.anchor_x, sprite._texture.anchor_y,
+                sprite._texture.width, sprite._texture.height,
+                sprite._visible,
+            )
+            for sprite in map(sprites.__getitem__, rows.tolist())
+        ]
+        vertices = self.get_vertices(rows).reshape(len(rows), 12)
+
+        # Group the rows by the vertex domain (and so buffer) they live in.
+        # NOTE: Vertex lists can move when a sprite's image or group changes,
+        #       so look them up every time.
+        domains: Dict[int, Tuple[object, List[int], List[int]]] = {}
+        for i, row in enumerate(rows.tolist()):
+            vertex_list = sprites[row]._vertex_list
+            domain = vertex_list.domain
+            entry = domains.get(id(domain))
+            if entry is None:
+                entry = domains[id(domain)] = (domain, [], [])
+            entry[1].append(i)
+            entry[2].append(vertex_list.start)
+
+        for domain, indices, starts in domains.values():
+            attribute = domain.attribute_names["vertices"]
+            starts = np.array(starts)
+            first = int(starts.min())
+            count = int(starts.max()) + 4 - first
+
+            # Map the smallest region of the buffer holding every quad, then
+            # scatter each quad's 12 values into it
+            region = attribute.get_region(attribute.buffer, first, count)
+            array = np.ctypeslib.as_array(region.array)
+            targets = (starts - first)[:, None] * 3 + np.arange(12)
+            values = vertices[indices]
+            if array.dtype.kind == "i":
+                # Not subpixel: truncate like `int()`
+                values = np.trunc(values)
+            array[targets] = values
+            region.invalidate()
@@ -0,0 +1,248 @@
+""" Sweep-and-prune broad-phase, an alternative to the spatial hash for
+storing dynamic boxes in a `Space`.
+
+Classes:
+
+    Endpoint
+    SweepAndPrune
+"""
+
+from __future__ import annotations  # NOTE: This is necessary below Python 3.10
+
+from .aabb import AABB
+
+# `bisect` finds positions in sorted lists using a binary search
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterator, List, Tuple
+
+
+class Endpoint:
+    """ One end (min or max) of a box's extent along one axis. """
+
+    __slots__ = ("value", "box", "is_min")
+
+    def __init__(self, value: float, box: AABB, is_min: bool):
+        """ Initialise with fields. """
+        self.value = value
+        self.box = box
+        self.is_min = is_min
+
+    def comes_after(self, other: Endpoint) -> bool:
+        """ Checks if this endpoint should be sorted after the other one.
+        When the values are equal, max endpoints are sorted before min
+        endpoints, so that boxes that are only touching are not counted as
+        overlapping.
+        """
+        return self.value > other.value or (
+            self.value == other.value and self.is_min and not other.is_min
+        )
+
+
+class SweepAndPrune:
+    """ A collection of bounding boxes, stored as sorted lists of their
+    endpoints along the X and Y axes.
+
+    Dynamic bodies usually move only a pixel or two per tick, so the lists
+    stay almost sorted between ticks and an insertion sort fixes them in
+    close to linear time. Every time two endpoints swap places, the pair of
+    boxes they belong to may have started or stopped overlapping, so the set
+    of overlapping pairs is kept up to date for almost nothing.
+
+    Moved boxes are only re-sorted when the pairs or a query are next needed.
+    """
+
+    def __init__(self):
+        """ Initialise an empty collection. """
+        # The endpoints along each axis, kept sorted
+        self._x_endpoints: List[Endpoint] = []
+        self._y_endpoints: List[Endpoint] = []
+        # The (min x, max x, min y, max y) endpoints of every box
+        self._boxes: Dict[AABB, Tuple[Endpoint, ...]] = {}
+        # A number for each box, counting up as boxes are added, used to
+        # order the two boxes within each pair
+        self._order: Dict[AABB, int] = {}
+        self._next_order = 0
+        # Every overlapping pair, and the boxes overlapping each box
+        self._pairs: Dict[Tuple[AABB, AABB], None] = {}
+        self._partners: Dict[AABB, Dict[AABB, None]] = {}
+
+        # Boxes which have moved since the lists were last sorted
+        self._moved: Dict[AABB, None] = {}
+        # The X endpoint values, and the widest box, for binary searches in
+        # `query_rect`. Rebuilt whenever the lists are sorted.
+        self._x_values: List[float] = []
+        self._max_width = 0.0
+
+    @staticmethod
+    def _get_bounds(box: AABB) -> Tuple[float, float, float, float]:
+        """ Gets the box's (min x, max x, min y, max y) in global space. """
+        global_x = box.global_x
+        global_y = box.global_y
+        return (global_x, global_x + box.w, global_y, global_y + box.h)
+
+    def _is_overlapping(self, a: AABB, b: AABB) -> bool:
+        """ Checks if two boxes overlap, using their endpoint values. """
+        a_min_x, a_max_x, a_min_y, a_max_y = self._boxes[a]
+        b_min_x, b_max_x, b_min_y, b_max_y = self._boxes[b]
+        return (
+            a_min_x.value < b_max_x.value
+            and b_min_x.value < a_max_x.value
+            and a_min_y.value < b_max_y.value
+            and b_min_y.value < a_max_y.value
+        )
+
+    def _update_pair(self, a: AABB, b: AABB):
+        """ Adds or removes the pair, depending on whether they overlap. """
+        # Order the pair by when the boxes were added, so each pair of boxes
+        # only has one key.
+        key = (a, b) if self._order[a] < self._order[b] else (b, a)
+        if self._is_overlapping(a, b):
+            if key not in self._pairs:
+                self._pairs[key] = None
+                self._partners[a][b] = None
+                self._partners[b][a] = None
+        elif key in self._pairs:
+            del self._pairs[key]
+            del self._partners[a][b]
+            del self._partners[b][a]
+
+    def _sort(self, endpoints: List[Endpoint]):
+        """ Insertion sorts an almost-sorted list of endpoints, updating the
+        pairs whenever a min and a max endpoint swap places.
+        """
+        for i in range(1, len(endpoints)):
+            endpoint = endpoints[i]
+            j = i - 1
+            while j >= 0 and endpoints[j].comes_after(endpoint):
+                other = endpoints[j]
+                # A min passing a max (or the other way round) means the
+                # boxes may have started or stopped overlapping
+                if (
+                    other.is_min != endpoint.is_min
+                    and other.box is not endpoint.box
+                ):
+                    self._update_pair(endpoint.box, other.box)
+                endpoints[j + 1] = other
+                j -= 1
+            endpoints[j + 1] = endpoint
+
+    def update(self):
+        """ Re-reads the bounds of every moved box, and fixes the sorted
+        lists and the overlapping pairs. Called automatically before any
+        query.
+        """
+        if not self._moved:
+            return
+
+        for box in self._moved:
+            min_x, max_x, min_y, max_y = self._boxes[box]
+            (
+                min_x.value, max_x.value, min_y.value, max_y.value
+            ) = self._get_bounds(box)
+            self._max_width = max(self._max_width, box.w)
+        self._moved.clear()
+
+        self._sort(self._x_endpoints)
+        self._sort(self._y_endpoints)
+        self._x_values = [endpoint.value for endpoint in self._x_endpoints]
+
+    def add(self, box: AABB):
+        """ Adds a box, does nothing if it is already present. """
+        if box in self._boxes:
+            return
+
+        min_x, max_x, min_y, max_y = self._get_bounds(box)
+        endpoints = (
+            Endpoint(min_x, box, True), Endpoint(max_x, box, False),
+            Endpoint(min_y, box, True), Endpoint(max_y, box, False),
+        )
+        self._boxes[box] = endpoints
+        self._partners[box] = {}
+        self._order[box] = self._next_order
+        self._next_order += 1
+
+        # Add the new endpoints to the end of each list, they will be sorted
+        # into place (finding the new box's pairs) by the next update.
+        self._x_endpoints.extend(endpoints[:2])
+        self._y_endpoints.extend(endpoints[2:])
+        self._moved[box] = None
+
+    def remove(self, box: AABB):
+        """ Removes a box, raises `KeyError` if it is not present. """
+        endpoints = self._boxes[box]
+
+        # Forget every pair the box was part of
+        for other in self._partners.pop(box):
+            del self._partners[other][box]
+            if (box, other) in self._pairs:
+                del self._pairs[(box, other)]
+            else:
+                del self._pairs[(other, box)]
+
+        self._x_endpoints.remove(endpoints[0])
+        self._x_endpoints.remove(endpoints[1])
+        self._y_endpoints.remove(endpoints[2])
+        self._y_endpoints.remove(endpoints[3])
+        self._x_values = [endpoint.value for endpoint in self._x_endpoints]
+
+        del self._boxes[box]
+        del self._order[box]
+        self._moved.pop(box, None)
+
+    def discard(self, box: AABB):
+        """ Removes a box if it is present. """
+        if box in self._boxes:
+            self.remove(box)
+
+    def move(self, box: AABB):
+        """ Marks a box as moved, so it is re-sorted by the next update. """
+        if box not in self._boxes:
+            raise KeyError(box)
+        self._moved[box] = None
+
+    def get_pairs(self) -> List[Tuple[AABB, AABB]]:
+        """ Gets every pair of boxes that currently overlap. """
+        self.update()
+        return list(self._pairs)
+
+    def get_overlapping(self, box: AABB) -> List[AABB]:
+        """ Gets every box that currently overlaps the given box. """
+        self.update()
+        return list(self._partners[box])
+
+    def query_rect(self, x: float, y: float, w: float, h: float) -> List[AABB]:
+        """ Broad-phase query: returns every box overlapping the given
+        rectangle in global space.
+        """
+        self.update()
+
+        # Any box overlapping the rect must have its min X endpoint before
+        # the rect's right edge, and no further left than the widest box.
+        endpoints = self._x_endpoints
+        first = bisect_right(self._x_values, x - self._max_width)
+        last = bisect_left(self._x_values, x + w)
+
+        found = []
+        for endpoint in endpoints[first:last]:
+            if not endpoint.is_min:
+                continue
+            min_x, max_x, min_y, max_y = self._boxes[endpoint.box]
+            if (
+                max_x.value > x
+                and min_y.value < y + h
+                and max_y.value > y
+            ):
+                found.append(endpoint.box)
+        return found
+
+    def __iter__(self) -> Iterator[AABB]:
+        """ Iterates over every box. """
+        return iter(self._boxes)
+
+    def __contains__(self, box: object) -> bool:
+        """ Checks if a box is present. """
+        return box in self._boxes
+
+    def __len__(self) -> int:
+        """ The number of boxes. """
+        return len(self._boxes)
@@ -0,0 +1,146 @@
+""" Turning grids of solid tiles into collision boxes.
+
+Functions:
+
+    tiles_to_aabbs
+    merge_tiles
+"""
+
+from __future__ import annotations  # NOTE: This is necessary below Python 3.10
+
+from .aabb import AABB
+
+from typing import Dict, Iterable, List, Tuple
+
+# A tile is identified by its column and row in the room
+Tile = Tuple[int, int]
+# A horizontal run of tiles in a single row: (first column, length)
+Run = Tuple[int, int]
+
+
+def tiles_to_aabbs(
+    tiles: Iterable[Tile],
+    tile_size: float,
+    x: float = 0,
+    y: float = 0,
+    layer: int = AABB.DEFAULT_LAYER
+) -> List[AABB]:
+    """ Creates one bounding box per tile, without any merging.
+
+    Parameters:
+
+        tiles: Iterable[Tile] - The column and row of every solid tile.
+        tile_size: float - The width and height of each tile.
+        x: float - The X position of the tile grid's origin.
+        y: float - The Y position of the tile grid's origin.
+        layer: int - The physics layer of the created boxes.
+
+    Returns:
+
+        List of bounding boxes, one per tile.
+
+        List[AABB]
+    """
+    return [
+        AABB(
+            x + column * tile_size, y + row * tile_size,
+            tile_size, tile_size,
+            layer
+        )
+        for column, row in sorted(set(tiles))
+    ]
+
+
+def get_runs(columns: Iterable[int]) -> List[Run]:
+    """ Groups the solid columns of a single row into horizontal runs. """
+    runs: List[Run] = []
+    for column in sorted(columns):
+        if runs and runs[-1][0] + runs[-1][1] == column:
+            # This tile continues the previous run
+            start, length = runs[-1]
+            runs[-1] = (start, length + 1)
+        else:
+            # This tile starts a new run
+            runs.append((column, 1))
+    return runs
+
+
+def merge_tiles(
+    tiles: Iterable[Tile],
+    tile_size: float,
+    x: float = 0,
+    y: float = 0,
+    layer: int = AABB.DEFAULT_LAYER
+) -> List[AABB]:
+    """ Merges solid tiles into as few bounding boxes as practical.
+
+    First each row is split into horizontal runs of touching tiles, then any
+    run sitting directly on top of an identical run in the row below is
+    merged into it, growing a rectangle upwards. Straight walls become a
+    single box, and solid blocks become a handful of rectangles, so the
+    number of boxes grows with the outline of the walls rather than with the
+    number of tiles. It also removes the seams between tiles that bodies
+    could otherwise snag on.
+
+    Parameters:
+
+        tiles: Iterable[Tile] - The column and row of every solid tile.
+        tile_size: float - The width and height of each tile.
+        x: float - The X position of the tile grid's origin.
+        y: float - The Y position of the tile grid's origin.
+        layer: int - The physics layer of the created boxes.
+
+    Returns:
+
+        List of merged bounding boxes.
+
+        List[AABB]
+    """
+    # Group the solid columns by row
+    rows: Dict[int, List[int]] = {}
+    for column, row in set(tiles):
+        rows.setdefault(row, []).append(column)
+
+    # Finished rectangles: (column, row, width, height), in tiles
+    rects: List[Tuple[int, int, int, int]] = []
+    # Rectangles that could still grow upwards, keyed by their run. Each
+    # value is the (first row, height) of the rectangle.
+    open_rects: Dict[Run, Tuple[int, int]] = {}
+    previous_row = None
+
+    for row in sorted(rows):
+        runs = get_runs(rows[row])
+        next_open: Dict[Run, Tuple[int, int]] = {}
+
+        for run in runs:
+            if previous_row == row - 1 and run in open_rects:
+                # Identical run directly below, grow that rectangle
+                first_row, height = open_rects.pop(run)
+                next_open[run] = (first_row, height + 1)
+            else:
+                # Start a new rectangle
+                next_open[run] = (row, 1)
+
+        # Anything that did not grow this row is finished
+        for (column, width), (first_row, height) in open_rects.items():
+            rects.append((column, first_row, width, height))
+
+        open_rects = next_open
+        previous_row = row
+
+    # Close the rectangles still open after the last row
+    for (column, width), (first_row, height) in open_rects.items():
+        rects.append((column, first_row, width, height))
+
+    # Sort by row, then column, so the output order is stable
+    rects.sort(key=lambda rect: (rect[1], rect[0]))
+
+    # Convert from tiles into bounding boxes
+    return [
+        AABB(
+            x + column * tile_size, y + row * tile_size,
+            width * tile_size, height * tile_size,
+            layer
+        )
+        for column, row, width, height in rects
+    ]
@@ -10,10 +10,12 @@ Classes:
 from dataclasses import dataclass
 # For weapon types
 from enum import auto, Enum
+from typing import Optional
 
 import pyglet
 
 from .object2d import Object2D
+from .sprite_manager import ZSpriteManager
 from .zsprite import ZSprite
 
 
@@ -37,24 +39,36 @@ class MeleeWeaponStats(WeaponStats):
 
 
 class Weapon(Object2D):
-    """ Template for a weapon. """
+    """ Template for a weapon. If no batch is given, the weapon is headless
+    and has no sprite.
+    """
     TYPE: WeaponType
     STATS: WeaponStats
-    # Animations for each state
+    # Images for each state, set by each weapon (usually as a `Resource`,
+    # loaded on first use as they need a GL context)
     IDLE: pyglet.image.AbstractImage
     USE: pyglet.image.AbstractImage
 
     ROTATION_AMOUNT = 30.0
 
+    # The weapon's sprite, None if headless
+    sprite: Optional[ZSprite] = None
+
     def __init__(
         self,
-        batch: pyglet.graphics.Batch,
-        group: pyglet.graphics.Group,
-        parent=Object2D
+        batch: Optional[pyglet.graphics.Batch],
+        group: Optional[pyglet.graphics.Group],
+        parent=Object2D,
+        sprites: Optional[ZSpriteManager] = None
     ):
-        """ Initializes the weapon. """
+        """ Initializes the weapon, its sprite updated by the sprite manager
+        if given.
+        """
         super().__init__(0, 0, parent)
 
+        if batch is None:
+            return
+
         # Set up the sprite
         self.sprite = ZSprite(
             self.IDLE,
@@ -65,12 +79,15 @@ class Weapon(Object2D):
             batch=batch,
             group=group,
             # Allows us to use float valus for the Z
-            subpixel=True
+            subpixel=True,
+            manager=sprites
         )
         self.sprite.rotation = self.ROTATION_AMOUNT
 
     def set_flipped(self, flipped: bool):
         """ Sets the sprite's flipped state. """
+        if self.sprite is None:
+            return
         if flipped:
             self.sprite.scale_x = 1  # Unflip the sprite
             self.sprite.rotation = self.ROTATION_AMOUNT
@@ -79,9 +96,16 @@ class Weapon(Object2D):
             self.sprite.rotation = -self.ROTATION_AMOUNT
 
     def on_fixed_update(self, dt: float):
-        """ Updates the weapon's sprite. """
-        self.sprite.update(
-            self.global_x,
-            self.global_y,
-            -self.global_y+10
-        )
+        """ Called every physics update. Weapons have no physics yet, their
+        sprite is moved by `update_sprite` when drawing.
+        """
+
+    def update_sprite(self, offset_x: float = 0, offset_y: float = 0):
+        """ Moves the weapon's sprite to our global position plus an offset,
+        used to follow the holder's interpolated position.
+        """
+        if self.sprite is None:
+            return
+        x = self.global_x + offset_x
+        y = self.global_y + offset_y
+        self.sprite.update(x, y, -y+10)
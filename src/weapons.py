@@ -3,10 +3,15 @@
 Classes:
 
     Sword
+
+Functions:
+
+    load_sword_image
 """
 
 # Import weapon templates
-from . import weapon
+from . import atlas, resources, weapon
+from .resources import Resource
 
 import pyglet
 
@@ -20,10 +25,16 @@ class Sword(weapon.Weapon):
         speed=1/2,
         range=32.0,
     )
-    IDLE = pyglet.resource.image("sprites/sword.png")
-    USE = pyglet.resource.image("sprites/sword.png")
+    IDLE = Resource("sword/image")
+    USE = Resource("sword/image")
+
 
+@resources.register("sword/image")
+def load_sword_image() -> pyglet.image.AbstractImage:
+    """ Loads the sword's image. """
+    image = atlas.load_image("sprites/sword.png")
 
-# Set the sprite anchor points
-Sword.IDLE.anchor_x = 8
-Sword.IDLE.anchor_y = 5
+    # Set the sprite anchor points
+    image.anchor_x = 8
+    image.anchor_y = 5
+    return image
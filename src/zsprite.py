@@ -14,12 +14,33 @@ import pyglet
 from pyglet.gl import *
 
 import math
+import weakref
 
 pyglet.image.Texture.default_mag_filter = pyglet.gl.GL_NEAREST
 pyglet.image.Texture.default_min_filter = pyglet.gl.GL_NEAREST
 
 
 class ZSpriteGroup(pyglet.graphics.Group):
+    """ Texture, blending and depth state for sprites.
+
+    Use `ZSpriteGroup.get` rather than creating groups directly: it hands out
+    one shared group per (texture, blend, parent) combination, so every
+    sprite drawn from the same atlas shares a single state change.
+    """
+
+    # Interned groups, dropped once no sprite uses them. Groups keep their
+    # parent alive, so the parent's id in the key can not be reused.
+    _cache = weakref.WeakValueDictionary()
+
+    @classmethod
+    def get(cls, texture, blend_src, blend_dest, parent=None):
+        key = (cls, texture.target, texture.id, blend_src, blend_dest,
+               id(parent))
+        group = cls._cache.get(key)
+        if group is None:
+            group = cls._cache[key] = cls(texture, blend_src, blend_dest,
+                                          parent)
+        return group
 
     def __init__(self, texture, blend_src, blend_dest, parent=None):
         super().__init__(parent)
@@ -56,7 +77,8 @@ class ZSpriteGroup(pyglet.graphics.Group):
                 self.texture.target == other.texture.target and
                 self.texture.id == other.texture.id and
                 self.blend_src == other.blend_src and
-                self.blend_dest == other.blend_dest)
+                self.blend_dest == other.blend_dest and
+                self.parent is other.parent)
 
     def __hash__(self):
         return hash((id(self.parent), self.texture.id, self.texture.target,
@@ -64,7 +86,14 @@ class ZSpriteGroup(pyglet.graphics.Group):
 
 
 class ZSprite(pyglet.sprite.Sprite):
-    """ Supports Z layer """
+    """ Supports Z layer.
+
+    If a `ZSpriteManager` is given, vertex updates are deferred to the
+    manager's next `flush` instead of being computed straight away.
+    """
+
+    _manager = None
+    _manager_index = -1
 
     def __init__(self,
                  img, x=0, y=0, z=0,
@@ -73,7 +102,8 @@ class ZSprite(pyglet.sprite.Sprite):
                  batch=None,
                  group=None,
                  usage='dynamic',
-                 subpixel=False):
+                 subpixel=False,
+                 manager=None):
         if batch is not None:
             self._batch = batch
 
@@ -90,11 +120,23 @@ class ZSprite(pyglet.sprite.Sprite):
         else:
             self._texture = img.get_texture()
 
-        self._group = ZSpriteGroup(self._texture, blend_src, blend_dest, group)
+        self._group = ZSpriteGroup.get(self._texture, blend_src, blend_dest,
+                                       group)
         self._usage = usage
         self._subpixel = subpixel
         self._create_vertex_list()
 
+        if manager is not None:
+            self._manager = manager
+            self._manager_index = manager.add(self)
+            self._update_position()
+
+    def delete(self):
+        if self._manager is not None:
+            self._manager.remove(self)
+            self._manager = None
+        super().delete()
+
     @property
     def group(self):
         return self._group.parent
@@ -103,14 +145,31 @@ class ZSprite(pyglet.sprite.Sprite):
     def group(self, group):
         if self._group.parent == group:
             return
-        self._group = self._group.__class__(self._texture,
-                                            self._group.blend_src,
-                                            self._group.blend_dest,
-                                            group)
+        self._group = self._group.get(self._texture,
+                                      self._group.blend_src,
+                                      self._group.blend_dest,
+                                      group)
         if self._batch is not None:
             self._batch.migrate(self._vertex_list, GL_QUADS, self._group,
                                 self._batch)
 
+    def _set_texture(self, texture):
+        # Same as `Sprite._set_texture`, but keeps a (shared) ZSpriteGroup
+        if texture.id is not self._texture.id:
+            self._group = self._group.get(texture,
+                                          self._group.blend_src,
+                                          self._group.blend_dest,
+                                          self._group.parent)
+            if self._batch is None:
+                self._vertex_list.tex_coords[:] = texture.tex_coords
+            else:
+                self._vertex_list.delete()
+                self._texture = texture
+                self._create_vertex_list()
+        else:
+            self._vertex_list.tex_coords[:] = texture.tex_coords
+        self._texture = texture
+
     def _create_vertex_list(self):
         if self._subpixel:
             vertex_format = 'v3f/%s' % self._usage
@@ -123,10 +182,19 @@ class ZSprite(pyglet.sprite.Sprite):
             self._vertex_list = self._batch.add(4, GL_QUADS, self._group,
                                                 vertex_format, 'c4B', ('t3f', self._texture.tex_coords))
 
-        self._update_position()
+        if self._manager is not None:
+            # The new vertex list has no vertices, and this frame's flush
+            # may already have happened
+            self._manager.write(self)
+        else:
+            self._update_position()
         self._update_color()
 
     def _update_position(self):
+        if self._manager is not None:
+            self._manager.update(self)
+            return
+
         img = self._texture
         scale_x = self._scale * self.scale_x
         scale_y = self._scale * self.scale_y